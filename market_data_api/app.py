@@ -46,6 +46,16 @@ DB_CONFIG = {
     'password': 'postgres'
 }
 
+# Origen de las barras mensuales: la tabla stock_prices_monthly (carga mensual, por defecto)
+# o el agregado continuo stock_prices_monthly_rollup (carga diaria con --interval 1d).
+# Ambos identifican el símbolo por symbols.symbol_id. El analizador y la API leen el mismo
+# valor de la variable de entorno MONTHLY_PRICES_SOURCE, así que el cambio no toca código
+MONTHLY_PRICES_SOURCES = ('stock_prices_monthly', 'stock_prices_monthly_rollup')
+MONTHLY_PRICES_TABLE = os.environ.get('MONTHLY_PRICES_SOURCE', 'stock_prices_monthly')
+if MONTHLY_PRICES_TABLE not in MONTHLY_PRICES_SOURCES:
+    raise ValueError(f"MONTHLY_PRICES_SOURCE no válido: {MONTHLY_PRICES_TABLE} "
+                     f"(use {' o '.join(MONTHLY_PRICES_SOURCES)})")
+
 # Motor de base de datos global
 engine = None
 
@@ -78,7 +88,7 @@ def health_check():
         
         # Probar conexión a la base de datos
         with engine.connect() as conn:
-            result = conn.execute(text("SELECT COUNT(*) as count FROM stock_prices_monthly LIMIT 1"))
+            result = conn.execute(text(f"SELECT COUNT(*) as count FROM {MONTHLY_PRICES_TABLE} LIMIT 1"))
             count = result.fetchone()[0]
         
         return jsonify({
@@ -100,14 +110,22 @@ def get_symbols():
     """Obtiene la lista de todos los símbolos disponibles."""
     try:
         with engine.connect() as conn:
-            query = text("""
-                SELECT DISTINCT symbol, 
-                       COUNT(*) as data_points,
-                       MIN(date) as first_date,
-                       MAX(date) as last_date
-                FROM stock_prices_monthly 
-                GROUP BY symbol 
-                ORDER BY symbol
+            # Agregar por symbol_id y resolver el nombre solo una vez por símbolo
+            query = text(f"""
+                SELECT s.symbol,
+                       p.data_points,
+                       p.first_date,
+                       p.last_date
+                FROM (
+                    SELECT symbol_id,
+                           COUNT(*) as data_points,
+                           MIN(date) as first_date,
+                           MAX(date) as last_date
+                    FROM {MONTHLY_PRICES_TABLE}
+                    GROUP BY symbol_id
+                ) p
+                JOIN symbols s ON s.symbol_id = p.symbol_id
+                ORDER BY s.symbol
             """)
             result = conn.execute(query)
             
@@ -140,8 +158,8 @@ def get_symbol_data(symbol):
         # Construir consulta base
         query_parts = [
             "SELECT date, open, high, low, close, volume",
-            "FROM stock_prices_monthly",
-            "WHERE symbol = :symbol"
+            f"FROM {MONTHLY_PRICES_TABLE}",
+            "WHERE symbol_id = (SELECT symbol_id FROM symbols WHERE symbol = :symbol)"
         ]
         
         params = {'symbol': symbol.upper()}
@@ -198,10 +216,10 @@ def get_symbol_data(symbol):
 def get_latest_price(symbol):
     """Obtiene el último precio disponible para un símbolo."""
     try:
-        query = text("""
+        query = text(f"""
             SELECT date, open, high, low, close, volume
-            FROM stock_prices_monthly
-            WHERE symbol = :symbol
+            FROM {MONTHLY_PRICES_TABLE}
+            WHERE symbol_id = (SELECT symbol_id FROM symbols WHERE symbol = :symbol)
             ORDER BY date DESC
             LIMIT 1
         """)
@@ -236,14 +254,15 @@ def get_latest_price(symbol):
 def search_symbols(query):
     """Busca símbolos que coincidan con la consulta."""
     try:
-        search_query = text("""
-            SELECT DISTINCT symbol,
+        search_query = text(f"""
+            SELECT s.symbol,
                    COUNT(*) as data_points,
-                   MAX(date) as last_date
-            FROM stock_prices_monthly 
-            WHERE symbol ILIKE :query
-            GROUP BY symbol 
-            ORDER BY symbol
+                   MAX(p.date) as last_date
+            FROM symbols s
+            JOIN {MONTHLY_PRICES_TABLE} p ON p.symbol_id = s.symbol_id
+            WHERE s.symbol ILIKE :query
+            GROUP BY s.symbol
+            ORDER BY s.symbol
             LIMIT 50
         """)
         
@@ -276,7 +295,7 @@ def get_recommended_symbols():
         limit = request.args.get('limit', 50, type=int)
         max_distance = request.args.get('max_distance', 5.0, type=float)
         
-        recommended_query = text("""
+        recommended_query = text(f"""
             SELECT 
                 sc.symbol,
                 sc.historical_high,
@@ -290,10 +309,10 @@ def get_recommended_symbols():
                 COUNT(spm.date) as data_points,
                 MAX(spm.date) as last_data_date
             FROM strategy_candidates sc
-            LEFT JOIN stock_prices_monthly spm ON sc.symbol = spm.symbol
+            LEFT JOIN {MONTHLY_PRICES_TABLE} spm ON spm.symbol_id = sc.symbol_id
             WHERE sc.is_valid = true 
                 AND sc.resistance_distance_percent <= :max_distance
-            GROUP BY sc.symbol, sc.historical_high, sc.current_price, 
+            GROUP BY sc.symbol_id, sc.symbol, sc.historical_high, sc.current_price, 
                      sc.resistance_distance_percent, sc.historical_high_date,
                      sc.subsequent_low, sc.subsequent_low_date, sc.years_of_data,
                      sc.last_review_date
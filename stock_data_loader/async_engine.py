@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Async Download Engine
+=====================
+
+Motor de descarga asíncrono para StockDataLoader.
+
+Características:
+- Cientos de peticiones en vuelo sobre un único cliente HTTP con conexiones keep-alive
+- Cookie y crumb de Yahoo compartidos por todos los símbolos (un solo handshake)
+- Integración con el limitador adaptativo compartido del cargador
+- URL base configurable para poder probarlo contra un endpoint de chart local
+
+Autor: TradeStrategy Team
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import aiohttp
+import pandas as pd
+
+from negative_cache import FAILURE_EMPTY, FAILURE_NOT_FOUND, FAILURE_PARSE
+
+logger = logging.getLogger('StockDataLoader.AsyncEngine')
+
+YAHOO_BASE_URL = "https://query2.finance.yahoo.com"  # Endpoint de chart y crumb
+YAHOO_COOKIE_URL = "https://fc.yahoo.com"  # Devuelve la cookie de sesión necesaria para el crumb
+ASYNC_MAX_CONCURRENCY = 200  # Máximo de peticiones en vuelo
+ASYNC_CONNECTION_LIMIT = 50  # Conexiones keep-alive en el pool del cliente HTTP
+ASYNC_REQUEST_TIMEOUT = 30  # Timeout total por petición (segundos)
+ASYNC_RETRY_ATTEMPTS = 3  # Intentos por símbolo ante 429, 5xx o timeout
+ASYNC_RETRY_BACKOFF = 4.0  # Espera base entre reintentos (segundos, exponencial)
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+class ThrottledError(Exception):
+    """Yahoo respondió con rate limit (HTTP 429) o la petición expiró."""
+
+
+def parse_chart_response(payload):
+    """Convierte la respuesta JSON de /v8/finance/chart en un DataFrame como Ticker.history.
+
+    Aplica el mismo ajuste que ``auto_adjust=True`` en yfinance (OHLC escalados
+    por adjclose / close) y normaliza las fechas a medianoche en la zona horaria
+    de la bolsa. Retorna None si la respuesta no contiene datos.
+    """
+    chart = payload.get('chart') or {}
+    results = chart.get('result') or []
+    if not results:
+        return None
+
+    result = results[0]
+    timestamps = result.get('timestamp') or []
+    quotes = (result.get('indicators', {}).get('quote') or [{}])[0]
+    if not timestamps or not quotes:
+        return None
+
+    timezone = result.get('meta', {}).get('exchangeTimezoneName') or 'UTC'
+    index = pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(timezone).normalize()
+    index.name = 'Date'
+
+    df = pd.DataFrame({
+        'Open': quotes.get('open'),
+        'High': quotes.get('high'),
+        'Low': quotes.get('low'),
+        'Close': quotes.get('close'),
+        'Volume': quotes.get('volume')
+    }, index=index, dtype='float64')
+
+    adjclose = (result.get('indicators', {}).get('adjclose') or [{}])[0].get('adjclose')
+    if adjclose is not None:
+        ratio = pd.Series(adjclose, index=index, dtype='float64') / df['Close']
+        for column in ('Open', 'High', 'Low'):
+            df[column] = df[column] * ratio
+        df['Close'] = pd.Series(adjclose, index=index, dtype='float64')
+
+    df = df.dropna(how='all', subset=['Open', 'High', 'Low', 'Close'])
+    # Yahoo puede repetir el periodo en curso con la cotización en vivo
+    df = df[~df.index.duplicated(keep='last')]
+    return df if not df.empty else None
+
+
+class AsyncDownloadEngine:
+    """Descarga históricos de Yahoo con asyncio sobre un cliente HTTP compartido."""
+
+    def __init__(self, rate_limiter=None, base_url=YAHOO_BASE_URL, cookie_url=YAHOO_COOKIE_URL,
+                 max_concurrency=ASYNC_MAX_CONCURRENCY, retry_backoff=ASYNC_RETRY_BACKOFF, deadline=None):
+        """Inicializa el motor.
+
+        Args:
+            rate_limiter: Limitador compartido (AdaptiveRateLimiter); se usa su
+                tasa mediante reserve() y se le informa de cada resultado.
+            base_url: URL base del endpoint de chart y crumb.
+            cookie_url: URL que entrega la cookie de sesión de Yahoo.
+            max_concurrency: Máximo de peticiones en vuelo.
+            retry_backoff: Espera base entre reintentos.
+            deadline: Instante (time.monotonic) a partir del cual no se lanzan
+                peticiones nuevas; las tareas restantes se cuentan como omitidas.
+        """
+        self.rate_limiter = rate_limiter
+        self.base_url = base_url.rstrip('/')
+        self.cookie_url = cookie_url
+        self.max_concurrency = max_concurrency
+        self.retry_backoff = retry_backoff
+        self.deadline = deadline
+        self.crumb = None
+        self._crumb_lock = None
+        # Por símbolo: segundos desde la primera petición hasta el resultado y motivo del fallo
+        self.durations = {}
+        self.errors = {}
+        # Por símbolo: clase de fallo para la caché negativa (404, sin datos o respuesta ilegible)
+        self.failures = {}
+        # Peticiones en curso (medidor en vivo de las métricas del cargador)
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "throttled": 0,
+            "crumb_refreshes": 0,
+            "empty": 0,
+            "errors": 0,
+            "skipped": 0
+        }
+
+    async def refresh_crumb(self, session):
+        """Obtiene cookie y crumb una sola vez para toda la sesión."""
+        async with self._crumb_lock:
+            try:
+                # fc.yahoo.com responde 404 pero establece la cookie de sesión
+                async with session.get(self.cookie_url, allow_redirects=True) as response:
+                    await response.read()
+            except aiohttp.ClientError as e:
+                logger.debug(f"No se pudo obtener la cookie de Yahoo: {e}")
+
+            async with session.get(f"{self.base_url}/v1/test/getcrumb") as response:
+                crumb = (await response.text()).strip()
+                self.crumb = crumb if response.status == 200 and crumb else None
+
+            self.stats["crumb_refreshes"] += 1
+            logger.info(f"Crumb de Yahoo {'obtenido' if self.crumb else 'no disponible'}")
+
+    async def wait_for_rate(self):
+        """Respeta la tasa del limitador compartido sin bloquear el event loop."""
+        if self.rate_limiter is None:
+            return
+        delay = self.rate_limiter.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def request_chart(self, session, symbol, start_date, interval):
+        """Lanza una petición de chart y retorna el JSON, None si el símbolo no existe."""
+        params = {
+            'period1': int(pd.Timestamp(start_date).timestamp()),
+            'period2': int(time.time()),
+            'interval': interval,
+            'includeAdjustedClose': 'true',
+            'events': 'div,splits'
+        }
+        if self.crumb:
+            params['crumb'] = self.crumb
+
+        async with session.get(f"{self.base_url}/v8/finance/chart/{symbol}", params=params) as response:
+            if response.status == 429 or response.status >= 500:
+                raise ThrottledError(f"HTTP {response.status}")
+            if response.status == 401:
+                # Crumb caducado: renovarlo y reintentar
+                await self.refresh_crumb(session)
+                raise ThrottledError("HTTP 401")
+            if response.status == 404:
+                self.failures[symbol] = FAILURE_NOT_FOUND
+                return None
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def fetch_history(self, session, symbol, start_date, interval="1mo"):
+        """Descarga el histórico de un símbolo con reintentos. Retorna (símbolo, DataFrame o None)."""
+        for attempt in range(1, ASYNC_RETRY_ATTEMPTS + 1):
+            await self.wait_for_rate()
+            self.stats["requests"] += 1
+            try:
+                payload = await self.request_chart(session, symbol, start_date, interval)
+            except (ThrottledError, asyncio.TimeoutError) as e:
+                self.stats["throttled"] += 1
+                if self.rate_limiter is not None:
+                    self.rate_limiter.record(throttled=True)
+                if attempt == ASYNC_RETRY_ATTEMPTS:
+                    logger.error(f"Error descargando datos para {symbol}: {e or 'timeout'}")
+                    self.errors[symbol] = str(e) or "timeout"
+                    return symbol, None
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                continue
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error descargando datos para {symbol}: {e}")
+                self.errors[symbol] = str(e)
+                return symbol, None
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.record(throttled=False)
+
+            try:
+                df = parse_chart_response(payload) if payload else None
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Respuesta no válida para {symbol}: {e}")
+                self.errors[symbol] = str(e)
+                self.failures[symbol] = FAILURE_PARSE
+                return symbol, None
+            if df is None:
+                self.stats["empty"] += 1
+                self.failures.setdefault(symbol, FAILURE_EMPTY)
+                logger.warning(f"No se encontraron datos para {symbol}")
+            return symbol, df
+
+        return symbol, None
+
+    async def download_all(self, tasks, on_result, interval="1mo"):
+        """Descarga todas las tareas {'symbol', 'start_date'} y llama a on_result(símbolo, DataFrame o None).
+
+        on_result se ejecuta en un hilo aparte, de modo que puede bloquearse
+        (por ejemplo en una cola llena) sin detener el event loop. Cada tarea
+        mantiene su hueco de concurrencia hasta entregar el resultado, así que
+        nunca hay más de max_concurrency DataFrames pendientes en memoria.
+        """
+        self._crumb_lock = asyncio.Lock()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=ASYNC_CONNECTION_LIMIT, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=ASYNC_REQUEST_TIMEOUT)
+
+        # unsafe=True acepta cookies de hosts por IP (endpoints locales de prueba)
+        cookie_jar = aiohttp.CookieJar(unsafe=True)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, cookie_jar=cookie_jar,
+                                         headers={'User-Agent': USER_AGENT}) as session:
+            await self.refresh_crumb(session)
+
+            async def process(task):
+                async with semaphore:
+                    if self.deadline is not None and time.monotonic() >= self.deadline:
+                        self.stats["skipped"] += 1
+                        return
+                    started = time.perf_counter()
+                    self.in_flight += 1
+                    try:
+                        symbol, df = await self.fetch_history(session, task['symbol'], task['start_date'], interval)
+                    finally:
+                        self.in_flight -= 1
+                    self.durations[symbol] = time.perf_counter() - started
+                    await asyncio.to_thread(on_result, symbol, df)
+
+            await asyncio.gather(*(process(task) for task in tasks))
+
+    def run(self, tasks, on_result, interval="1mo"):
+        """Ejecuta download_all en un event loop propio."""
+        started = datetime.now()
+        asyncio.run(self.download_all(tasks, on_result, interval))
+        logger.info(
+            f"Motor asíncrono completado en {(datetime.now() - started).total_seconds():.1f}s: "
+            f"{self.stats['requests']} peticiones, {self.stats['retries']} reintentos"
+        )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Bar Buffer
+==========
+
+Buffer columnar de barras pendientes de escribir para StockDataLoader.
+
+Características:
+- Arrays NumPy preasignados de capacidad fija (una columna por campo), sin concat de DataFrames
+- Símbolos internados como enteros locales; el symbol_id de la base de datos se resuelve una vez por volcado
+- Los DataFrames descargados se copian una sola vez al buffer y se pueden liberar en seguida
+- Eliminación de duplicados (símbolo, fecha) con NumPy sobre el contenido del buffer
+- Registro de los símbolos completos (con su última fila en el buffer) para confirmarlos solo en su último volcado
+- La memoria queda acotada por la capacidad del buffer, no por el tamaño del lote ni del histórico
+
+Autor: TradeStrategy Team
+"""
+
+import numpy as np
+import pandas as pd
+
+BAR_BUFFER_ROWS = 5000  # Capacidad por defecto (filas) de un buffer de barras
+PRICE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class BarBuffer:
+    """Columnas preasignadas de barras (símbolo, fecha, OHLCV) pendientes de escribir."""
+
+    def __init__(self, capacity=BAR_BUFFER_ROWS):
+        self.capacity = max(1, int(capacity))
+        self.codes = np.empty(self.capacity, dtype=np.int32)
+        # Fechas en nanosegundos desde epoch, en UTC sin zona horaria (lo que guarda la DB)
+        self.dates = np.empty(self.capacity, dtype=np.int64)
+        # El volumen se guarda en float64 para representar los valores ausentes como NaN
+        self.values = {field: np.empty(self.capacity, dtype=np.float64) for field in PRICE_FIELDS}
+        self.size = 0
+        # Código local -> símbolo y símbolo -> código local
+        self.symbols = []
+        self._codes = {}
+        # Símbolos cuya última fila está en el buffer: los demás continúan en el siguiente volcado
+        self.completed = set()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def full(self):
+        return self.size >= self.capacity
+
+    def clear(self):
+        """Vacía el buffer conservando los arrays."""
+        self.size = 0
+        self.symbols = []
+        self._codes = {}
+        self.completed = set()
+
+    def intern(self, symbol):
+        """Código local de un símbolo dentro del buffer."""
+        code = self._codes.get(symbol)
+        if code is None:
+            code = self._codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return code
+
+    def add(self, df, start=0):
+        """Copia las filas de ``df`` desde ``start`` hasta llenar el buffer.
+
+        ``df`` tiene el formato de format_history (symbol, date, open, high,
+        low, close, volume). Retorna la posición de la primera fila que no
+        cabe (len(df) si se copiaron todas).
+        """
+        count = min(len(df) - start, self.capacity - self.size)
+        if count <= 0:
+            return start
+        stop = start + count
+        target = slice(self.size, self.size + count)
+
+        symbols = df['symbol'].to_numpy()[start:stop]
+        if (symbols == symbols[0]).all():
+            uniques = symbols[:1]
+            self.codes[target] = self.intern(symbols[0])
+        else:
+            codes, uniques = pd.factorize(symbols)
+            self.codes[target] = np.array([self.intern(symbol) for symbol in uniques], dtype=np.int32)[codes]
+        rest = set(df['symbol'].to_numpy()[stop:])
+        self.completed.update(symbol for symbol in uniques if symbol not in rest)
+
+        dates = pd.to_datetime(df['date'].iloc[start:stop], utc=True)
+        self.dates[target] = dates.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        for field in PRICE_FIELDS:
+            self.values[field][target] = df[field].to_numpy(dtype=np.float64, na_value=np.nan)[start:stop]
+
+        self.size += count
+        return stop
+
+    def extend(self, df, on_full):
+        """Añade ``df`` completo llamando a ``on_full(buffer)`` cada vez que el buffer se llena.
+
+        ``on_full`` debe vaciar el buffer (normalmente escribiéndolo en la DB).
+        Si ``df`` no cabe en el buffer, un mismo símbolo puede repartirse
+        entre varios volcados: antes se eliminan sus duplicados (símbolo,
+        fecha) conservando la primera aparición, como hace unique_rows
+        dentro de un volcado, y el símbolo solo figura en ``completed`` en el
+        volcado con su última fila.
+        """
+        if self.size + len(df) > self.capacity:
+            df = df.drop_duplicates(subset=['symbol', 'date'])
+        start = 0
+        while start < len(df):
+            start = self.add(df, start)
+            if self.full:
+                on_full(self)
+
+    def unique_rows(self):
+        """Índices de las filas sin duplicados (símbolo, fecha), ordenadas por símbolo y fecha.
+
+        Ante duplicados se conserva la primera aparición, como drop_duplicates.
+        """
+        codes = self.codes[:self.size]
+        dates = self.dates[:self.size]
+        # lexsort es estable: entre duplicados queda primero el que se añadió antes
+        order = np.lexsort((dates, codes))
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (codes[order][1:] != codes[order][:-1]) | (dates[order][1:] != dates[order][:-1])
+        return order[keep]
+
+    def to_frame(self, symbol_ids):
+        """DataFrame sin duplicados para las rutas de escritura, con el symbol_id de cada fila.
+
+        Args:
+            symbol_ids: Diccionario símbolo -> symbol_id de la base de datos
+                con todos los símbolos del buffer.
+        """
+        rows = self.unique_rows()
+        ids = np.array([symbol_ids[symbol] for symbol in self.symbols], dtype=np.int64)
+        frame = {
+            'symbol_id': ids[self.codes[rows]],
+            'date': self.dates[rows].view('datetime64[ns]')
+        }
+        for field in PRICE_FIELDS:
+            frame[field] = self.values[field][rows]
+        return pd.DataFrame(frame)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Loader Benchmark
+================
+
+Benchmark de la ruta de escritura y de la planificación de StockDataLoader
+sobre un universo sintético de N símbolos × M meses.
+
+El universo se genera con el proveedor sintético e incluye huecos (barras
+eliminadas) y duplicados (barras repetidas en la entrada), como los datos
+reales. Sobre él se miden las etapas:
+
+- generate: generación del universo en memoria
+- write_initial: carga inicial con save_to_db (volcados de WRITER_FLUSH_ROWS)
+- write_overlap: reescritura de las últimas barras de cada símbolo, como una carga incremental
+  (barras idénticas a las guardadas: deben quedar todas sin cambios)
+- load_last_dates: consulta agrupada de la última fecha de cada símbolo
+- plan: planificación completa de la siguiente ejecución
+
+Para cada etapa se registran los segundos, las filas por segundo y el pico
+de memoria (RSS) alcanzado, y el resultado se guarda en JSON para comparar
+ejecuciones. Se usa una base de datos PostgreSQL/TimescaleDB dedicada
+(BENCHMARK_DATABASE, que se vacía en cada ejecución) o, si no está
+disponible, un SQLite temporal.
+
+Uso:
+    python benchmark_loader.py
+    python benchmark_loader.py --symbols 2000 --months 300 --write-mode upsert copy
+    python benchmark_loader.py --sqlite
+
+Autor: TradeStrategy Team
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import create_engine, text
+
+# Añadir el directorio actual al path para importar el cargador
+sys.path.append(str(Path(__file__).parent))
+
+from stock_data_loader import DB_CONFIG, WRITE_MODES, Symbol, StockPrice, StockDataLoader
+from providers import SyntheticProvider
+
+logger = logging.getLogger('StockDataLoader.Benchmark')
+
+BENCHMARK_SYMBOLS = 500  # Símbolos del universo sintético
+BENCHMARK_MONTHS = 240  # Barras mensuales por símbolo (antes de aplicar huecos y duplicados)
+BENCHMARK_GAP_RATE = 0.02  # Fracción de barras eliminadas (huecos en el histórico)
+BENCHMARK_DUPLICATE_RATE = 0.01  # Fracción de barras repetidas en la entrada
+BENCHMARK_OVERLAP_MONTHS = 3  # Últimas barras de cada símbolo que se reescriben en write_overlap
+BENCHMARK_DATABASE = "stockdata_bench"  # Base de datos PostgreSQL dedicada (se vacía en cada ejecución)
+BENCHMARK_SEED = 7  # Semilla de huecos y duplicados
+
+
+def generate_universe(symbols=BENCHMARK_SYMBOLS, months=BENCHMARK_MONTHS, gap_rate=BENCHMARK_GAP_RATE,
+                      duplicate_rate=BENCHMARK_DUPLICATE_RATE, seed=BENCHMARK_SEED, current_date=None):
+    """Genera un DataFrame por símbolo en el formato de format_history.
+
+    Las series terminan en el mes actual. Cada barra se elimina con
+    probabilidad ``gap_rate`` (salvo la primera y la última) y se repite con
+    probabilidad ``duplicate_rate``.
+    """
+    end = pd.Timestamp(current_date or datetime.now()).normalize().replace(day=1)
+    start = end - relativedelta(months=months - 1)
+    provider = SyntheticProvider(start_date=start.strftime("%Y-%m-%d"), current_date=end)
+    rng = np.random.default_rng(seed)
+
+    frames = []
+    for i in range(symbols):
+        symbol = f"SYN{i:05d}"
+        df = StockDataLoader.format_history(symbol, provider.generate(symbol, "1mo"))
+
+        keep = rng.random(len(df)) >= gap_rate
+        keep[[0, -1]] = True
+        df = df[keep]
+        duplicates = df[rng.random(len(df)) < duplicate_rate]
+        frames.append(pd.concat([df, duplicates]).sort_values('date', kind='stable').reset_index(drop=True))
+
+    return frames
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def postgres_url(database=BENCHMARK_DATABASE):
+    """URL de la base de datos de benchmark en el servidor de DB_CONFIG."""
+    return f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{database}"
+
+
+def ensure_postgres_database(database=BENCHMARK_DATABASE):
+    """Crea la base de datos de benchmark si no existe."""
+    engine = create_engine(postgres_url("postgres"), isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as conn:
+            exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": database}).fetchone()
+            if not exists:
+                conn.execute(text(f'CREATE DATABASE "{database}"'))
+                logger.info(f"Base de datos {database} creada")
+    finally:
+        engine.dispose()
+
+
+def reset_tables(db_url):
+    """Elimina las tablas de precios y símbolos para empezar cada ejecución en vacío."""
+    engine = create_engine(db_url)
+    try:
+        with engine.begin() as conn:
+            StockPrice.__table__.drop(conn, checkfirst=True)
+            Symbol.__table__.drop(conn, checkfirst=True)
+    finally:
+        engine.dispose()
+
+
+def run_stage(stages, name, func, rows=None):
+    """Ejecuta una etapa y registra su tiempo, filas por segundo y pico de memoria."""
+    stage_start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - stage_start
+
+    stage = {"seconds": round(seconds, 3)}
+    if rows is not None:
+        stage["rows"] = rows(result) if callable(rows) else rows
+        stage["rows_per_second"] = round(stage["rows"] / seconds, 1) if seconds > 0 else 0.0
+    stage["peak_rss_mb"] = peak_rss_mb()
+    stages[name] = stage
+    logger.info(f"{name}: {stage}")
+    return result
+
+
+def run_benchmark(db_url, write_mode, symbols=BENCHMARK_SYMBOLS, months=BENCHMARK_MONTHS,
+                  gap_rate=BENCHMARK_GAP_RATE, duplicate_rate=BENCHMARK_DUPLICATE_RATE,
+                  overlap_months=BENCHMARK_OVERLAP_MONTHS):
+    """Ejecuta todas las etapas con un modo de escritura y retorna sus resultados."""
+    reset_tables(db_url)
+    loader = StockDataLoader(write_mode=write_mode, run_journal=False, provider="synthetic")
+    if not loader.connect_db(db_url):
+        raise RuntimeError(f"No se pudo conectar a {loader.engine.url if loader.engine else db_url}")
+
+    stages = {}
+    frames = run_stage(stages, "generate",
+                       lambda: generate_universe(symbols, months, gap_rate, duplicate_rate),
+                       rows=lambda result: sum(len(df) for df in result))
+    input_rows = stages["generate"]["rows"]
+
+    counters = ("total_records", "db_write_seconds", "rows_inserted", "rows_updated", "rows_unchanged")
+
+    def write(batch):
+        before = {key: loader.stats[key] for key in counters}
+        loader.write_frames(batch)
+        return {key: loader.stats[key] - before[key] for key in counters}
+
+    for name, batch in (("write_initial", frames),
+                        ("write_overlap", [df.tail(overlap_months) for df in frames])):
+        result = run_stage(stages, name, lambda batch=batch: write(batch),
+                           rows=lambda result: result["total_records"])
+        stages[name]["db_seconds"] = round(result["db_write_seconds"], 3)
+        for outcome in ("inserted", "updated", "unchanged"):
+            stages[name][outcome] = result[f"rows_{outcome}"]
+
+    universe = [df['symbol'].iloc[0] for df in frames]
+    run_stage(stages, "load_last_dates", loader.load_last_dates, rows=len)
+    run_stage(stages, "plan", lambda: loader.plan_downloads(universe), rows=len(universe))
+
+    with loader.engine.connect() as conn:
+        stored_rows = conn.execute(text(f"SELECT count(*) FROM {loader.price_table}")).scalar()
+    loader.engine.dispose()
+
+    return {
+        "write_mode": write_mode,
+        "input_rows": input_rows,
+        "unique_rows": sum(len(df.drop_duplicates(subset=['date'])) for df in frames),
+        "written_rows": stages["write_initial"]["rows"],
+        "stored_rows": stored_rows,
+        "stages": stages,
+        "metrics": loader.metrics.snapshot()
+    }
+
+
+def parse_args(argv=None):
+    """Procesa los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Benchmark de escritura y planificación de StockDataLoader")
+    parser.add_argument("--symbols", type=int, default=BENCHMARK_SYMBOLS, help="Símbolos del universo sintético")
+    parser.add_argument("--months", type=int, default=BENCHMARK_MONTHS, help="Meses de histórico por símbolo")
+    parser.add_argument("--gap-rate", type=float, default=BENCHMARK_GAP_RATE, help="Fracción de barras eliminadas")
+    parser.add_argument("--duplicate-rate", type=float, default=BENCHMARK_DUPLICATE_RATE,
+                        help="Fracción de barras duplicadas")
+    parser.add_argument("--write-mode", nargs="+", choices=WRITE_MODES, default=list(WRITE_MODES),
+                        help="Modos de escritura a medir")
+    parser.add_argument("--db-url", help=f"URL de SQLAlchemy de la base de datos (por defecto {BENCHMARK_DATABASE} en DB_CONFIG)")
+    parser.add_argument("--sqlite", action="store_true", help="Usar un SQLite temporal en lugar de PostgreSQL")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto benchmark_loader_<fecha>.json)")
+    return parser.parse_args(argv)
+
+
+def resolve_database(args, sqlite_dir):
+    """Retorna la URL a usar: la indicada, la de PostgreSQL si responde o un SQLite temporal."""
+    if args.db_url:
+        return args.db_url
+    if not args.sqlite:
+        try:
+            ensure_postgres_database()
+            return postgres_url()
+        except Exception as e:
+            logger.warning(f"PostgreSQL no disponible, se usará SQLite: {e}")
+    return f"sqlite:///{os.path.join(sqlite_dir, 'benchmark.db')}"
+
+
+def main():
+    """Función principal."""
+    args = parse_args()
+    # Los logs INFO por volcado del cargador distorsionan los tiempos
+    logging.getLogger('StockDataLoader').setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as sqlite_dir:
+        db_url = resolve_database(args, sqlite_dir)
+        dialect = create_engine(db_url).dialect.name
+
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "database": dialect,
+            "universe": {
+                "symbols": args.symbols,
+                "months": args.months,
+                "gap_rate": args.gap_rate,
+                "duplicate_rate": args.duplicate_rate
+            },
+            "runs": []
+        }
+
+        for write_mode in args.write_mode:
+            if write_mode == "copy" and dialect != "postgresql":
+                logger.warning("El modo copy requiere PostgreSQL: se omite")
+                continue
+            results["runs"].append(run_benchmark(
+                db_url, write_mode, args.symbols, args.months, args.gap_rate, args.duplicate_rate
+            ))
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    output = args.output or f"benchmark_loader_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 60)
+    print(f"BENCHMARK DEL CARGADOR ({dialect}, {args.symbols} símbolos × {args.months} meses)")
+    print("=" * 60)
+    for run in results["runs"]:
+        print(f"\nModo {run['write_mode']}: {run['input_rows']:,} filas de entrada, {run['stored_rows']:,} guardadas")
+        for name, stage in run["stages"].items():
+            rate = f", {stage['rows_per_second']:,.0f} filas/s" if "rows_per_second" in stage else ""
+            print(f"  {name}: {stage['seconds']:.2f}s{rate}, pico RSS {stage['peak_rss_mb']:,.0f} MB")
+            if "inserted" in stage:
+                print(f"    {stage['inserted']:,} nuevas, {stage['updated']:,} actualizadas, "
+                      f"{stage['unchanged']:,} sin cambios")
+    print(f"\nResultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+History Cache
+=============
+
+Caché persistente en disco de los históricos OHLCV descargados por
+StockDataLoader.
+
+Características:
+- Un archivo Parquet por símbolo e intervalo, en el mismo formato que se escribe en la DB
+- Índice JSON con la cobertura de cada entrada (primera y última fecha, filas, tamaño)
+- Expiración por TTL y desalojo LRU cuando la caché supera el tamaño máximo
+- Iteración sobre todas las entradas para reconstruir la base de datos sin red
+
+Autor: TradeStrategy Team
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger('StockDataLoader.HistoryCache')
+
+CACHE_DIR = Path(__file__).parent.resolve().joinpath('history_cache')  # Directorio raíz de la caché
+CACHE_TTL_DAYS = 30  # Días tras la última descarga en los que una entrada sigue siendo válida
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # Tamaño máximo de la caché en disco (2 GB)
+INDEX_SAVE_EVERY = 200  # Escrituras entre guardados del índice (se guarda siempre al cerrar)
+
+
+class HistoryCache:
+    """Caché de históricos por símbolo e intervalo con TTL y límite de tamaño."""
+
+    def __init__(self, root=CACHE_DIR, ttl_days=CACHE_TTL_DAYS, max_bytes=CACHE_MAX_BYTES):
+        """Abre (o crea) la caché en ``root`` y aplica la política de expiración."""
+        self.root = Path(root)
+        self.ttl = timedelta(days=ttl_days)
+        self.max_bytes = max_bytes
+        self.index_file = self.root.joinpath('index.json')
+        self.entries = {}
+        self.stats = {"hits": 0, "partial_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._lock = threading.RLock()
+        self._pending_writes = 0
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Índice de caché ilegible, se empieza de cero: {e}")
+                self.entries = {}
+
+        self.evict()
+
+    @staticmethod
+    def entry_key(symbol, interval):
+        """Clave del índice para un símbolo e intervalo."""
+        return f"{interval}/{symbol}"
+
+    def entry_path(self, symbol, interval):
+        """Ruta del Parquet de un símbolo (los caracteres no seguros se sustituyen)."""
+        safe_symbol = re.sub(r'[^A-Za-z0-9._=^-]', '_', symbol)
+        return self.root.joinpath(interval, f"{safe_symbol}.parquet")
+
+    def is_expired(self, entry, now=None):
+        """Indica si una entrada superó el TTL desde su última descarga."""
+        now = now or datetime.now()
+        return now - datetime.fromisoformat(entry['fetched_at']) > self.ttl
+
+    def coverage(self, symbol, interval):
+        """Retorna la entrada del índice (first_date, last_date, rows...) o None si no hay datos válidos."""
+        with self._lock:
+            entry = self.entries.get(self.entry_key(symbol, interval))
+            if entry is None or self.is_expired(entry):
+                return None
+            return dict(entry)
+
+    def get(self, symbol, interval, after=None):
+        """Lee el histórico cacheado de un símbolo, solo las barras posteriores a ``after``.
+
+        ``after`` se interpreta como en la base de datos: un instante en UTC
+        si no tiene zona horaria.
+        """
+        with self._lock:
+            key = self.entry_key(symbol, interval)
+            entry = self.entries.get(key)
+            if entry is None or self.is_expired(entry):
+                return None
+            entry['accessed_at'] = datetime.now().isoformat()
+
+        try:
+            df = pd.read_parquet(self.root.joinpath(entry['path']))
+        except Exception as e:
+            logger.warning(f"Entrada de caché ilegible para {symbol}, se descarta: {e}")
+            self.remove(symbol, interval)
+            return None
+
+        if after is not None:
+            df = df[df['date'] > _as_comparable(after, df['date'])]
+        return df.reset_index(drop=True)
+
+    def put(self, symbol, interval, df, requested_from=None):
+        """Añade barras descargadas a la entrada del símbolo (las nuevas sustituyen a las existentes).
+
+        ``requested_from`` es la fecha de inicio pedida al proveedor; la entrada
+        guarda la más antigua para saber desde cuándo su cobertura es completa.
+        """
+        if df is None or df.empty:
+            return
+
+        path = self.entry_path(symbol, interval)
+        with self._lock:
+            key = self.entry_key(symbol, interval)
+            existing = None
+            if key in self.entries and path.exists():
+                try:
+                    existing = pd.read_parquet(path)
+                except Exception:
+                    existing = None
+
+            combined = df if existing is None else pd.concat([existing, df], ignore_index=True)
+            combined = combined.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.parquet.tmp')
+            combined.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+            now = datetime.now().isoformat()
+            requested = pd.Timestamp(requested_from if requested_from is not None else combined['date'].iloc[0])
+            requested = _as_utc(requested)
+            if key in self.entries and self.entries[key].get('requested_from'):
+                requested = min(requested, pd.Timestamp(self.entries[key]['requested_from']))
+            self.entries[key] = {
+                'symbol': symbol,
+                'interval': interval,
+                'path': str(path.relative_to(self.root)),
+                'first_date': pd.Timestamp(combined['date'].iloc[0]).isoformat(),
+                'last_date': pd.Timestamp(combined['date'].iloc[-1]).isoformat(),
+                'requested_from': requested.isoformat(),
+                'rows': int(len(combined)),
+                'bytes': path.stat().st_size,
+                'fetched_at': now,
+                'accessed_at': now
+            }
+            self.stats["writes"] += 1
+            self._pending_writes += 1
+            if self._pending_writes >= INDEX_SAVE_EVERY:
+                self.save_index()
+
+    def remove(self, symbol, interval):
+        """Elimina una entrada y su archivo."""
+        with self._lock:
+            entry = self.entries.pop(self.entry_key(symbol, interval), None)
+            if entry is not None:
+                self.root.joinpath(entry['path']).unlink(missing_ok=True)
+                self._pending_writes += 1
+
+    def evict(self):
+        """Elimina las entradas expiradas y, si hace falta, las menos usadas hasta cumplir max_bytes."""
+        with self._lock:
+            now = datetime.now()
+            for key, entry in list(self.entries.items()):
+                if self.is_expired(entry, now):
+                    self.remove(entry['symbol'], entry['interval'])
+                    self.stats["evictions"] += 1
+
+            total_bytes = sum(entry['bytes'] for entry in self.entries.values())
+            if total_bytes > self.max_bytes:
+                for entry in sorted(self.entries.values(), key=lambda e: e['accessed_at']):
+                    if total_bytes <= self.max_bytes:
+                        break
+                    total_bytes -= entry['bytes']
+                    self.remove(entry['symbol'], entry['interval'])
+                    self.stats["evictions"] += 1
+
+    def iter_entries(self, interval):
+        """Itera (símbolo, DataFrame) sobre todas las entradas válidas de un intervalo."""
+        with self._lock:
+            symbols = [entry['symbol'] for entry in self.entries.values() if entry['interval'] == interval]
+        for symbol in sorted(symbols):
+            df = self.get(symbol, interval)
+            if df is not None and not df.empty:
+                yield symbol, df
+
+    def save_index(self):
+        """Guarda el índice de forma atómica."""
+        with self._lock:
+            tmp_file = self.index_file.with_suffix('.json.tmp')
+            with open(tmp_file, "w") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_file, self.index_file)
+            self._pending_writes = 0
+
+    def close(self):
+        """Aplica la política de desalojo y persiste el índice."""
+        self.evict()
+        self.save_index()
+        total_bytes = sum(entry['bytes'] for entry in self.entries.values())
+        logger.info(f"Caché de históricos: {len(self.entries)} entradas, {total_bytes / 1024 ** 2:.1f} MB")
+
+
+def _as_utc(value):
+    """Convierte una fecha a Timestamp UTC sin zona horaria (como se guarda en la DB)."""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
+
+
+def _as_comparable(value, dates):
+    """Convierte ``value`` (UTC si no tiene zona horaria) en un Timestamp comparable con ``dates``."""
+    timestamp = _as_utc(value)
+    if getattr(dates.dt, 'tz', None) is not None:
+        return timestamp.tz_localize('UTC')
+    return timestamp
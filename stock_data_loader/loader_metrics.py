@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Loader Metrics
+==============
+
+Métricas de ejecución de StockDataLoader.
+
+Características:
+- Histogramas de duración por etapa (comprobación de frescura, espera del limitador, HTTP, transformación, escritura en DB)
+- Contadores acumulados (peticiones, reintentos, errores, filas descargadas y escritas)
+- Medidores en vivo (peticiones en vuelo, tasa del limitador, profundidad de la cola del pipeline)
+- Exportación en formato de texto de Prometheus a un archivo (textfile collector de node_exporter) o por HTTP
+- Resumen para el archivo JSON de estadísticas de la ejecución
+
+Autor: TradeStrategy Team
+"""
+
+import os
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+logger = logging.getLogger('StockDataLoader.Metrics')
+
+METRICS_PREFIX = "stock_loader"  # Prefijo de los nombres de métrica de Prometheus
+# Límites superiores (segundos) de los buckets de los histogramas de etapa
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_WRITE_SECONDS = 15.0  # Intervalo de escritura del archivo de métricas durante la ejecución
+
+
+class Histogram:
+    """Histograma de duraciones con buckets fijos."""
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = tuple(buckets)
+        # Un contador por bucket más el de los valores por encima del último límite
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """Registra una observación."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estima el cuantil ``q`` como el límite superior del bucket que lo contiene."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """Resumen del histograma para el JSON de estadísticas."""
+        return {
+            "count": self.count,
+            "total_seconds": round(self.sum, 3),
+            "avg_seconds": round(self.sum / self.count, 4) if self.count else 0.0,
+            "p50_seconds": round(self.quantile(0.5), 4),
+            "p95_seconds": round(self.quantile(0.95), 4),
+            "max_seconds": round(self.max, 4)
+        }
+
+
+class LoaderMetrics:
+    """Registro de métricas compartido por todos los hilos del cargador."""
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        # Medidores cuyo valor se lee en el momento de exportar (p. ej. peticiones en vuelo)
+        self._gauge_callbacks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+        self._server = None
+
+    def observe(self, stage, seconds):
+        """Registra la duración de una ejecución de ``stage``."""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Mide la duración del bloque como una observación de ``stage``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def inc(self, name, value=1):
+        """Incrementa un contador."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Fija el valor actual de un medidor."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def register_gauge(self, name, func):
+        """Registra un medidor cuyo valor se obtiene llamando a ``func`` al exportar."""
+        with self._lock:
+            self._gauge_callbacks[name] = func
+
+    def _read_gauges(self):
+        """Valores actuales de todos los medidores (con el lock tomado)."""
+        gauges = dict(self.gauges)
+        for name, func in self._gauge_callbacks.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                logger.debug(f"No se pudo leer el medidor {name}: {e}")
+        return gauges
+
+    def snapshot(self):
+        """Resumen de todas las métricas para el JSON de estadísticas."""
+        with self._lock:
+            return {
+                "stages": {stage: histogram.snapshot() for stage, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "gauges": dict(sorted(self._read_gauges().items()))
+            }
+
+    def to_prometheus(self):
+        """Exporta las métricas en el formato de texto de Prometheus."""
+        lines = []
+        with self._lock:
+            name = f"{METRICS_PREFIX}_stage_seconds"
+            lines.append(f"# HELP {name} Duración de cada etapa del cargador")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            for counter, value in sorted(self.counters.items()):
+                name = f"{METRICS_PREFIX}_{counter}_total"
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+
+            for gauge, value in sorted(self._read_gauges().items()):
+                name = f"{METRICS_PREFIX}_{gauge}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Escribe las métricas en ``path`` de forma atómica (textfile collector de node_exporter)."""
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def start_textfile_writer(self, path, interval=METRICS_WRITE_SECONDS):
+        """Escribe el archivo de métricas cada ``interval`` segundos hasta llamar a stop()."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.write_textfile(path)
+                except OSError as e:
+                    logger.warning(f"Error al escribir el archivo de métricas {path}: {e}")
+
+        self.write_textfile(path)
+        self._writer = threading.Thread(target=run, args=(), name="MetricsWriter", daemon=True)
+        self._writer.start()
+        logger.info(f"Métricas en formato Prometheus en {path}")
+
+    def start_http_server(self, port, host="0.0.0.0"):
+        """Sirve las métricas en http://host:port/metrics en un hilo aparte."""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+        logger.info(f"Métricas en formato Prometheus en http://{host}:{self._server.server_port}/metrics")
+        return self._server.server_port
+
+    def stop(self, path=None):
+        """Detiene los exportadores y escribe el archivo de métricas final."""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if path is not None:
+            self.write_textfile(path)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
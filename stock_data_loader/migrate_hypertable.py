@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Hypertable Migration
+====================
+
+Script para reorganizar una tabla de precios existente con la configuración
+actual del cargador: intervalo de chunk de CHUNK_TIME_INTERVALS, compresión
+segmentada por símbolo y ordenada por fecha y política de compresión.
+
+El intervalo de chunk de una hypertable solo afecta a los chunks nuevos, así
+que la migración copia los datos a una tabla nueva ya configurada, comprime
+los chunks antiguos y la intercambia con la original en una transacción. La
+tabla original se conserva como <tabla>_old salvo que se indique --drop-old.
+
+Las tablas del esquema anterior (symbol en texto y precios en FLOAT) se
+convierten al esquema actual: los símbolos se dan de alta en la tabla symbols
+y los precios se copian con su symbol_id. Sin TimescaleDB solo se convierte
+el esquema.
+
+Antes y después de migrar se mide el tamaño de tabla e índices, el número de
+chunks y el tiempo y las páginas que leen las consultas de universo completo
+del analizador y de la API, y el resultado se guarda en un archivo JSON.
+
+Uso:
+    python migrate_hypertable.py --report-only
+    python migrate_hypertable.py --interval 1mo
+    python migrate_hypertable.py --interval 1d --drop-old
+
+Autor: TradeStrategy Team
+"""
+
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, text, inspect, MetaData
+
+# Añadir el directorio actual al path para importar el cargador
+sys.path.append(str(Path(__file__).parent))
+
+from stock_data_loader import (
+    DB_CONFIG, DOWNLOAD_INTERVALS, PRICE_MODELS, COMPRESS_AFTER, DAILY_ROLLUPS, Symbol, configure_hypertable
+)
+
+logger = logging.getLogger('StockDataLoader.Migration')
+
+# Consultas de universo completo cuyo coste se compara antes y después
+BENCHMARK_QUERIES = {
+    "analyzer_symbols": """
+        SELECT s.symbol
+        FROM symbols s
+        WHERE EXISTS (SELECT 1 FROM {table} p WHERE p.symbol_id = s.symbol_id)
+        ORDER BY s.symbol
+    """,
+    "api_symbols": """
+        SELECT s.symbol, p.data_points, p.first_date, p.last_date
+        FROM (
+            SELECT symbol_id, COUNT(*) AS data_points, MIN(date) AS first_date, MAX(date) AS last_date
+            FROM {table}
+            GROUP BY symbol_id
+        ) p
+        JOIN symbols s ON s.symbol_id = p.symbol_id
+        ORDER BY s.symbol
+    """,
+    "latest_bars": """
+        SELECT DISTINCT ON (symbol_id) symbol_id, date, close
+        FROM {table}
+        ORDER BY symbol_id, date DESC
+    """,
+    "symbol_history": """
+        SELECT s.symbol, p.date, p.open, p.high, p.low, p.close, p.volume
+        FROM {table} p
+        JOIN symbols s ON s.symbol_id = p.symbol_id
+        WHERE s.symbol = (SELECT min(symbol) FROM symbols)
+        ORDER BY p.date ASC
+    """
+}
+
+# Las mismas consultas sobre el esquema anterior (symbol en texto en la tabla de precios)
+LEGACY_BENCHMARK_QUERIES = {
+    "analyzer_symbols": "SELECT DISTINCT symbol FROM {table} ORDER BY symbol",
+    "api_symbols": """
+        SELECT symbol, COUNT(*) AS data_points, MIN(date) AS first_date, MAX(date) AS last_date
+        FROM {table}
+        GROUP BY symbol
+        ORDER BY symbol
+    """,
+    "latest_bars": """
+        SELECT DISTINCT ON (symbol) symbol, date, close
+        FROM {table}
+        ORDER BY symbol, date DESC
+    """,
+    "symbol_history": """
+        SELECT symbol, date, open, high, low, close, volume
+        FROM {table}
+        WHERE symbol = (SELECT min(symbol) FROM {table})
+        ORDER BY date ASC
+    """
+}
+
+
+def is_timescale_available(conn):
+    """Indica si la extensión TimescaleDB está instalada."""
+    return conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")).fetchone() is not None
+
+
+def is_legacy_layout(conn, table):
+    """Indica si ``table`` usa el esquema anterior, con el símbolo en texto en lugar de symbol_id."""
+    columns = {column['name'] for column in inspect(conn).get_columns(table)}
+    return 'symbol_id' not in columns
+
+
+def is_hypertable(conn, table):
+    """Indica si ``table`` es una hypertable."""
+    return conn.execute(text(
+        "SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = :table"
+    ), {"table": table}).fetchone() is not None
+
+
+def table_report(conn, table, timescale):
+    """Tamaño, chunks y coste de las consultas de referencia sobre ``table``."""
+    legacy = is_legacy_layout(conn, table)
+    report = {"table": table, "layout": "legacy" if legacy else "symbol_id"}
+
+    if timescale and is_hypertable(conn, table):
+        sizes = conn.execute(text(
+            f"SELECT total_bytes, index_bytes FROM hypertable_detailed_size('{table}')"
+        )).fetchone()
+        report["total_bytes"] = sizes[0]
+        report["index_bytes"] = sizes[1]
+        chunks = conn.execute(text(f"""
+            SELECT count(*), count(*) FILTER (WHERE is_compressed)
+            FROM timescaledb_information.chunks
+            WHERE hypertable_name = '{table}'
+        """)).fetchone()
+        report["chunks"] = chunks[0]
+        report["compressed_chunks"] = chunks[1]
+    else:
+        report["total_bytes"] = conn.execute(text(f"SELECT pg_total_relation_size('{table}')")).scalar()
+        report["index_bytes"] = conn.execute(text(f"SELECT pg_indexes_size('{table}')")).scalar()
+
+    report["rows"] = conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+    report["queries"] = {}
+
+    for name, query in (LEGACY_BENCHMARK_QUERIES if legacy else BENCHMARK_QUERIES).items():
+        plan = conn.execute(text(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.format(table=table)}"
+        )).scalar()
+        plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+        report["queries"][name] = {
+            "execution_ms": round(plan["Execution Time"], 2),
+            "pages": plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0)
+        }
+
+    return report
+
+
+def migrate_table(engine, table, interval, drop_old=False, timescale=True):
+    """Copia ``table`` a una tabla con el esquema y la configuración actuales e intercambia ambas.
+
+    Con TimescaleDB la tabla nueva es una hypertable configurada y sus chunks
+    antiguos se comprimen; sin ella solo se convierte el esquema.
+    """
+    new_table = f"{table}_migrated"
+    old_table = f"{table}_old"
+
+    with engine.connect() as conn:
+        legacy = is_legacy_layout(conn, table)
+
+        if interval == "1d":
+            # Los agregados continuos apuntan a la tabla original: se recrean tras el cambio
+            for view in DAILY_ROLLUPS:
+                conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {view}"))
+            conn.commit()
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {new_table}"))
+        conn.commit()
+        Symbol.__table__.create(conn, checkfirst=True)
+        PRICE_MODELS[interval].__table__.to_metadata(MetaData(), name=new_table).create(conn)
+        conn.commit()
+
+        if timescale and not configure_hypertable(conn, new_table, interval):
+            raise RuntimeError(f"No se pudo crear la hypertable {new_table}")
+
+        logger.info(f"Copiando {table} a {new_table}")
+        if legacy:
+            # Dar de alta los símbolos y copiar los precios con su id y los tipos compactos
+            conn.execute(text(f"""
+                INSERT INTO symbols (symbol)
+                SELECT DISTINCT symbol FROM {table} ORDER BY symbol
+                ON CONFLICT (symbol) DO NOTHING
+            """))
+            conn.execute(text(f"""
+                INSERT INTO {new_table} (symbol_id, date, open, high, low, close, volume)
+                SELECT s.symbol_id, p.date, p.open, p.high, p.low, p.close, round(p.volume)::bigint
+                FROM {table} p
+                JOIN symbols s ON s.symbol = p.symbol
+                ORDER BY p.date, s.symbol_id
+            """))
+        else:
+            conn.execute(text(f"""
+                INSERT INTO {new_table} (symbol_id, date, open, high, low, close, volume)
+                SELECT symbol_id, date, open, high, low, close, volume
+                FROM {table}
+                ORDER BY date, symbol_id
+            """))
+        conn.commit()
+
+        if timescale:
+            # Comprimir ya los chunks que la política comprimiría en su próxima ejecución
+            compressed = conn.execute(text(f"""
+                SELECT count(compress_chunk(chunk, if_not_compressed => TRUE))
+                FROM show_chunks('{new_table}', older_than => INTERVAL '{COMPRESS_AFTER[interval]}') AS chunk
+            """)).scalar()
+            conn.commit()
+            logger.info(f"Comprimidos {compressed} chunks de {new_table}")
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {old_table}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {old_table}"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {old_table}_pkey"))
+        conn.execute(text(f"ALTER TABLE {new_table} RENAME TO {table}"))
+        # Renombrar también la clave primaria para que una migración posterior pueda reutilizar el nombre
+        conn.execute(text(f"ALTER INDEX IF EXISTS {new_table}_pkey RENAME TO {table}_pkey"))
+        if drop_old:
+            conn.execute(text(f"DROP TABLE {old_table}"))
+        conn.commit()
+
+    logger.info(f"Tabla {table} migrada{'' if drop_old else f'; la original se conserva como {old_table}'}")
+    if interval == "1d":
+        logger.info("Ejecute el cargador con --interval 1d para recrear los agregados continuos")
+
+
+def parse_args(argv=None):
+    """Procesa los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Migra una tabla de precios al esquema y la configuración de chunks y compresión actuales")
+    parser.add_argument(
+        "--interval",
+        choices=DOWNLOAD_INTERVALS,
+        default="1mo",
+        help="Tabla a migrar: stock_prices_monthly (1mo) o stock_prices_daily (1d)"
+    )
+    parser.add_argument(
+        "--report-only",
+        action="store_true",
+        help="Solo medir tamaño y tiempos de consulta, sin migrar"
+    )
+    parser.add_argument(
+        "--drop-old",
+        action="store_true",
+        help="Eliminar la tabla original tras la migración en lugar de conservarla como <tabla>_old"
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    """Función principal."""
+    args = parse_args()
+    table = PRICE_MODELS[args.interval].__tablename__
+
+    conn_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+    engine = create_engine(conn_string)
+
+    with engine.connect() as conn:
+        timescale = is_timescale_available(conn)
+        before = table_report(conn, table, timescale)
+
+    results = {"table": table, "interval": args.interval, "before": before}
+
+    if not args.report_only:
+        if not timescale:
+            if before["layout"] != "legacy":
+                print("❌ TimescaleDB no está instalada y la tabla ya usa el esquema actual: nada que migrar")
+                sys.exit(1)
+            print("⚠️  TimescaleDB no está instalada: solo se convertirá el esquema de la tabla")
+        migrate_table(engine, table, args.interval, drop_old=args.drop_old, timescale=timescale)
+        with engine.connect() as conn:
+            results["after"] = table_report(conn, table, timescale)
+
+    report_file = f"migration_report_{table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(report_file, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print("\n" + "=" * 60)
+    print(f"MIGRACIÓN DE {table}")
+    print("=" * 60)
+    for stage in ("before", "after"):
+        if stage not in results:
+            continue
+        report = results[stage]
+        print(f"\n{'Antes' if stage == 'before' else 'Después'}:")
+        print(f"  Esquema: {report['layout']}, filas: {report['rows']:,}")
+        print(f"  Tamaño: {report['total_bytes'] / 1024 ** 2:,.1f} MB ({report['index_bytes'] / 1024 ** 2:,.1f} MB de índices)")
+        if "chunks" in report:
+            print(f"  Chunks: {report['chunks']} ({report['compressed_chunks']} comprimidos)")
+        for name, query in report["queries"].items():
+            print(f"  {name}: {query['execution_ms']:,.1f} ms, {query['pages']:,} páginas")
+    print(f"\nInforme guardado en {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Negative Cache
+==============
+
+Caché negativa persistente de StockDataLoader para los símbolos que no
+devuelven datos.
+
+Características:
+- Una fila por símbolo e intervalo en symbol_negative_cache con la clase de fallo (sin datos, 404, deslistado o error de parseo)
+- Recomprobación con backoff exponencial por clase de fallo: cada fallo consecutivo duplica la espera hasta NEGATIVE_CACHE_MAX_DAYS
+- El planificador omite los símbolos cuya próxima comprobación aún no ha llegado, sin gastar peticiones ni REQUEST_DELAY
+- Un símbolo que vuelve a devolver datos sale de la caché
+- Los errores transitorios (rate limit, timeouts, red) no se cachean
+
+Autor: TradeStrategy Team
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Integer, String, DateTime, select, delete, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.declarative import declarative_base
+
+logger = logging.getLogger('StockDataLoader.NegativeCache')
+
+FAILURE_EMPTY = "empty"  # El proveedor respondió sin barras
+FAILURE_NOT_FOUND = "not_found"  # HTTP 404 o símbolo inexistente
+FAILURE_DELISTED = "delisted"  # El proveedor indica que el símbolo está deslistado
+FAILURE_PARSE = "parse_error"  # Respuesta con un formato que no se puede interpretar
+FAILURE_CLASSES = (FAILURE_EMPTY, FAILURE_NOT_FOUND, FAILURE_DELISTED, FAILURE_PARSE)
+
+# Espera inicial (días) antes de volver a comprobar un símbolo según la clase de su fallo
+NEGATIVE_CACHE_BACKOFF_DAYS = {
+    FAILURE_EMPTY: 1,
+    FAILURE_NOT_FOUND: 7,
+    FAILURE_DELISTED: 14,
+    FAILURE_PARSE: 1
+}
+NEGATIVE_CACHE_MAX_DAYS = 90  # Espera máxima entre comprobaciones de un símbolo en la caché
+# Una respuesta vacía no se cachea si el símbolo tiene barras más recientes que esto (días):
+# suele ser el periodo en curso aún sin publicar, no un símbolo muerto
+NEGATIVE_CACHE_RECENT_DAYS = 31
+
+NegativeCacheBase = declarative_base()
+
+
+class NegativeCacheEntry(NegativeCacheBase):
+    """Modelo para un símbolo sin datos y su próxima comprobación."""
+    __tablename__ = 'symbol_negative_cache'
+
+    symbol = Column(String, primary_key=True)
+    interval = Column(String, primary_key=True)
+    failure_class = Column(String, nullable=False)
+    failures = Column(Integer, nullable=False, default=1)  # Fallos consecutivos
+    first_failed_at = Column(DateTime)
+    last_failed_at = Column(DateTime)
+    next_check_at = Column(DateTime, nullable=False)
+    reason = Column(String)
+
+    def __repr__(self):
+        return (f"<NegativeCacheEntry(symbol='{self.symbol}', interval='{self.interval}', "
+                f"failure_class='{self.failure_class}', next_check_at='{self.next_check_at}')>")
+
+
+def classify_failure(error):
+    """Clase de fallo cacheable de una excepción o mensaje de error, o None si es transitorio."""
+    message = str(error).lower()
+    if "delisted" in message:
+        return FAILURE_DELISTED
+    if "404" in message or "not found" in message:
+        return FAILURE_NOT_FOUND
+    if "429" in message or "timeout" in message or "timed out" in message or "rate limit" in message:
+        return None
+    if isinstance(error, (ValueError, KeyError, TypeError)) or "parse" in message or "json" in message:
+        return FAILURE_PARSE
+    return None
+
+
+def backoff_days(failure_class, failures):
+    """Días hasta la siguiente comprobación tras ``failures`` fallos consecutivos de una clase."""
+    base = NEGATIVE_CACHE_BACKOFF_DAYS.get(failure_class, NEGATIVE_CACHE_BACKOFF_DAYS[FAILURE_EMPTY])
+    return min(NEGATIVE_CACHE_MAX_DAYS, base * 2 ** (max(1, failures) - 1))
+
+
+class NegativeCache:
+    """Registra los símbolos sin datos y decide cuáles omitir en la planificación."""
+
+    def __init__(self, engine, interval):
+        """Crea la tabla de la caché negativa si no existe."""
+        self.engine = engine
+        self.interval = interval
+        # Símbolo -> {'failure_class', 'failures', 'first_failed_at', 'next_check_at'} de la DB
+        self.entries = None
+        self._failures = {}
+        self._cleared = set()
+        self._lock = threading.Lock()
+        self.stats = {
+            "skipped": 0,
+            "rechecked": 0,
+            "recorded": 0,
+            "cleared": 0
+        }
+        NegativeCacheBase.metadata.create_all(engine)
+
+    def load(self):
+        """Carga las entradas del intervalo con una sola consulta (una vez por ejecución)."""
+        table = NegativeCacheEntry.__table__
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.symbol, table.c.failure_class, table.c.failures,
+                       table.c.first_failed_at, table.c.next_check_at)
+                .where(table.c.interval == self.interval)
+            ).fetchall()
+        self.entries = {
+            row.symbol: {
+                'failure_class': row.failure_class,
+                'failures': row.failures,
+                'first_failed_at': row.first_failed_at,
+                'next_check_at': row.next_check_at
+            }
+            for row in rows
+        }
+        logger.info(f"Caché negativa: {len(self.entries)} símbolos sin datos registrados")
+        return self.entries
+
+    def filter(self, symbols, now=None):
+        """Separa los símbolos cuya próxima comprobación aún no ha llegado.
+
+        Retorna (símbolos a planificar, símbolos omitidos). Los símbolos de
+        la caché con la comprobación vencida se planifican de nuevo.
+        """
+        if self.entries is None:
+            self.load()
+        now = now or datetime.now()
+        planned = []
+        skipped = []
+        for symbol in symbols:
+            entry = self.entries.get(symbol)
+            if entry is not None and entry['next_check_at'] > now:
+                skipped.append(symbol)
+                continue
+            if entry is not None:
+                self.stats["rechecked"] += 1
+            planned.append(symbol)
+        self.stats["skipped"] += len(skipped)
+        return planned, skipped
+
+    def record_failure(self, symbol, failure_class, reason=None, last_date=None, now=None):
+        """Registra un fallo cacheable y calcula su próxima comprobación.
+
+        Una respuesta vacía de un símbolo con barras de los últimos
+        NEGATIVE_CACHE_RECENT_DAYS días no se registra. Retorna True si el
+        fallo se registró.
+        """
+        now = now or datetime.now()
+        if self.entries is None:
+            self.load()
+        if (failure_class == FAILURE_EMPTY and last_date is not None
+                and now - last_date < timedelta(days=NEGATIVE_CACHE_RECENT_DAYS)):
+            return False
+
+        with self._lock:
+            previous = self.entries.get(symbol)
+            failures = previous['failures'] + 1 if previous else 1
+            entry = {
+                'failure_class': failure_class,
+                'failures': failures,
+                'first_failed_at': previous['first_failed_at'] if previous else now,
+                'next_check_at': now + timedelta(days=backoff_days(failure_class, failures))
+            }
+            self.entries[symbol] = entry
+            self._cleared.discard(symbol)
+            self._failures[symbol] = dict(entry, last_failed_at=now, reason=str(reason)[:500] if reason else None)
+            self.stats["recorded"] += 1
+        logger.info(f"{symbol} en la caché negativa ({failure_class}, fallo {failures}): "
+                    f"próxima comprobación el {entry['next_check_at']:%Y-%m-%d}")
+        return True
+
+    def record_success(self, symbol):
+        """Saca de la caché un símbolo que ha vuelto a devolver datos."""
+        if self.entries is None:
+            self.load()
+        with self._lock:
+            self._failures.pop(symbol, None)
+            if self.entries.pop(symbol, None) is not None:
+                self._cleared.add(symbol)
+                self.stats["cleared"] += 1
+
+    def flush(self):
+        """Escribe en la DB los fallos y las salidas de la caché pendientes."""
+        with self._lock:
+            failures, self._failures = self._failures, {}
+            cleared, self._cleared = self._cleared, set()
+        if not failures and not cleared:
+            return
+
+        table = NegativeCacheEntry.__table__
+        rows = [dict(values, symbol=symbol, interval=self.interval) for symbol, values in failures.items()]
+        try:
+            with self.engine.begin() as conn:
+                if rows:
+                    dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+                    stmt = dialect.insert(table)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['symbol', 'interval'],
+                        set_={column: stmt.excluded[column] for column in
+                              ('failure_class', 'failures', 'first_failed_at', 'last_failed_at',
+                               'next_check_at', 'reason')}
+                    )
+                    conn.execute(stmt, rows)
+                if cleared:
+                    conn.execute(
+                        delete(table)
+                        .where(table.c.interval == self.interval)
+                        .where(table.c.symbol.in_(bindparam('symbols', expanding=True))),
+                        {'symbols': sorted(cleared)}
+                    )
+        except Exception as e:
+            # La caché negativa nunca debe detener la carga: en el peor caso se repiten peticiones
+            logger.error(f"Error al actualizar la caché negativa: {e}")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Market Data Providers
+=====================
+
+Proveedores de datos históricos OHLCV para StockDataLoader.
+
+Todos los proveedores entregan el mismo formato que ``Ticker.history`` de
+yfinance (índice ``Date`` y columnas Open, High, Low, Close y Volume), de
+modo que el resto del cargador no depende del origen de los datos.
+
+Proveedores disponibles:
+- yahoo: Yahoo Finance mediante yfinance (descargas individuales y por grupos con yf.download)
+- file: Directorio local con un archivo CSV o Parquet por símbolo (p. ej. ficheros masivos de un proveedor)
+- synthetic: Generador determinista de paseos aleatorios, sin red ni disco
+
+Autor: TradeStrategy Team
+"""
+
+import logging
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger('StockDataLoader.Providers')
+
+PROVIDERS = ("yahoo", "file", "synthetic")
+FILE_PROVIDER_FORMATS = (".parquet", ".csv")  # Extensiones buscadas, por orden de preferencia
+SYNTHETIC_START_DATE = "2000-01-01"  # Primera barra que genera el proveedor sintético
+SYNTHETIC_TIMEZONE = "America/New_York"  # Zona horaria de las fechas sintéticas (como Yahoo)
+SYNTHETIC_SEED = 42  # Semilla base; cada símbolo deriva la suya de su nombre
+
+# Frecuencia de pandas para cada intervalo de descarga
+INTERVAL_FREQUENCIES = {
+    "1mo": "MS",
+    "1d": "B"
+}
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class MarketDataProvider:
+    """Interfaz común de los proveedores de históricos."""
+
+    name = None
+    # Si es True, las peticiones pasan por el limitador adaptativo del cargador
+    rate_limited = False
+
+    def fetch_history(self, symbol, start_date, interval):
+        """Retorna el histórico de un símbolo desde start_date, o un DataFrame vacío si no hay datos."""
+        raise NotImplementedError
+
+    def fetch_group(self, symbols, start_date, interval, threads=1):
+        """Retorna un diccionario símbolo -> histórico con los símbolos que tienen datos.
+
+        Por defecto pide cada símbolo por separado; los proveedores con
+        peticiones multi-símbolo lo sustituyen.
+        """
+        frames = {}
+        for symbol in symbols:
+            try:
+                df = self.fetch_history(symbol, start_date, interval)
+            except Exception as e:
+                logger.debug(f"{self.name}: sin datos para {symbol} en la petición de grupo: {e}")
+                continue
+            if df is not None and not df.empty:
+                frames[symbol] = df
+        return frames
+
+    def group_requests(self, symbols):
+        """Retorna cuántas peticiones hace fetch_group para ``symbols`` (una por símbolo por defecto)."""
+        return len(symbols)
+
+
+class YahooProvider(MarketDataProvider):
+    """Yahoo Finance mediante yfinance."""
+
+    name = "yahoo"
+    rate_limited = True
+
+    def fetch_history(self, symbol, start_date, interval):
+        """Descarga el histórico de un símbolo con Ticker.history."""
+        ticker = yf.Ticker(symbol)
+        return ticker.history(start=start_date, interval=interval)
+
+    def fetch_group(self, symbols, start_date, interval, threads=1):
+        """Descarga varios símbolos con yf.download.
+
+        yfinance sigue haciendo una petición de chart por símbolo (hasta
+        ``threads`` a la vez), así que el grupo cuesta len(symbols) peticiones.
+        """
+        frames = {}
+
+        # ignore_tz=False mantiene las mismas fechas que Ticker.history
+        data = yf.download(
+            symbols,
+            start=start_date,
+            interval=interval,
+            group_by="ticker",
+            auto_adjust=True,
+            actions=False,
+            ignore_tz=False,
+            threads=threads,
+            progress=False
+        )
+
+        if data is None or data.empty:
+            return frames
+
+        # Separar el resultado ancho (símbolo, campo) en un DataFrame por símbolo
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                symbol_df = data[symbol]
+            elif len(symbols) == 1:
+                symbol_df = data
+            else:
+                continue
+
+            # Los símbolos sin datos aparecen como columnas completamente vacías
+            symbol_df = symbol_df.dropna(how='all', subset=['Open', 'High', 'Low', 'Close'])
+            if symbol_df.empty:
+                continue
+
+            frames[symbol] = symbol_df
+
+        return frames
+
+
+class FileProvider(MarketDataProvider):
+    """Directorio con un archivo por símbolo: ``<directorio>/<SÍMBOLO>.parquet`` o ``.csv``.
+
+    Los archivos deben tener una columna de fecha y las columnas OHLCV (sin
+    distinguir mayúsculas; se admiten ``date``, ``Date`` o ``timestamp``) en
+    el mismo intervalo que se está cargando.
+    """
+
+    name = "file"
+
+    def __init__(self, directory):
+        """Inicializa el proveedor sobre ``directory``."""
+        if directory is None:
+            raise ValueError("El proveedor de archivos necesita un directorio (--provider-path)")
+        self.directory = Path(directory)
+        if not self.directory.is_dir():
+            raise ValueError(f"Directorio de datos no encontrado: {self.directory}")
+
+    def find_file(self, symbol):
+        """Retorna la ruta del archivo de un símbolo o None si no existe."""
+        for extension in FILE_PROVIDER_FORMATS:
+            path = self.directory.joinpath(f"{symbol}{extension}")
+            if path.exists():
+                return path
+        return None
+
+    def fetch_history(self, symbol, start_date, interval):
+        """Lee el archivo del símbolo y filtra las barras desde start_date."""
+        path = self.find_file(symbol)
+        if path is None:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+        raw = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+        raw.columns = [str(column).strip().lower() for column in raw.columns]
+        date_column = next((column for column in ('date', 'timestamp', 'datetime') if column in raw.columns), None)
+        if date_column is None:
+            raise ValueError(f"{path.name} no tiene columna de fecha")
+
+        df = pd.DataFrame({
+            'Open': raw['open'],
+            'High': raw['high'],
+            'Low': raw['low'],
+            'Close': raw['close'],
+            'Volume': raw['volume'] if 'volume' in raw.columns else np.nan
+        })
+        df.index = pd.DatetimeIndex(pd.to_datetime(raw[date_column]), name='Date')
+        df = filter_from(df.sort_index(), start_date)
+        return df[~df.index.duplicated(keep='last')]
+
+
+class SyntheticProvider(MarketDataProvider):
+    """Generador de históricos sintéticos deterministas.
+
+    Cada símbolo produce siempre la misma serie (paseo aleatorio geométrico
+    con semilla derivada de su nombre), así que dos ejecuciones con el mismo
+    universo escriben exactamente los mismos datos.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed=SYNTHETIC_SEED, start_date=SYNTHETIC_START_DATE, current_date=None):
+        """Inicializa el generador."""
+        self.seed = seed
+        self.start_date = start_date
+        self.current_date = current_date
+
+    def generate(self, symbol, interval):
+        """Genera la serie completa de un símbolo."""
+        end = pd.Timestamp(self.current_date or datetime.now()).normalize()
+        dates = pd.date_range(self.start_date, end, freq=INTERVAL_FREQUENCIES[interval], tz=SYNTHETIC_TIMEZONE)
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+
+        # Rentabilidades por barra y rango intrabarra proporcionales a la volatilidad del intervalo
+        volatility = 0.08 if interval == "1mo" else 0.02
+        returns = rng.normal(0.005 if interval == "1mo" else 0.0003, volatility, len(dates))
+        close = rng.uniform(5, 200) * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[close[0]], close[:-1]]) if len(close) else close
+        spread = np.abs(rng.normal(0, volatility / 2, len(dates)))
+
+        return pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread),
+            'Close': close,
+            'Volume': rng.integers(10_000, 10_000_000, len(dates)).astype(float)
+        }, index=pd.DatetimeIndex(dates, name='Date'))
+
+    def fetch_history(self, symbol, start_date, interval):
+        """Retorna la serie del símbolo desde start_date."""
+        return filter_from(self.generate(symbol, interval), start_date)
+
+
+def filter_from(df, start_date):
+    """Filtra las barras cuyo día (en la hora local de la serie) es igual o posterior a start_date.
+
+    Se compara por día, como hace Yahoo con ``start``: la fecha de inicio
+    calculada desde la DB (un instante UTC) incluye la barra de ese día.
+    """
+    if start_date is None:
+        return df
+    start_day = pd.Timestamp(start_date).tz_localize(None).normalize()
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    return df[index.normalize() >= start_day]
+
+
+def create_provider(name, path=None):
+    """Crea el proveedor ``name`` ("yahoo", "file" o "synthetic")."""
+    if name == "yahoo":
+        return YahooProvider()
+    if name == "file":
+        return FileProvider(path)
+    if name == "synthetic":
+        return SyntheticProvider()
+    raise ValueError(f"Proveedor de datos no válido: {name}")
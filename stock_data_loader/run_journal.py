@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Run Journal
+===========
+
+Diario de ejecución de StockDataLoader persistido en la base de datos.
+
+Características:
+- Una fila por ejecución en loader_runs y una fila por símbolo planificado en loader_run_symbols
+- Estado de cada símbolo: planned, downloaded, written o failed (con motivo y si es permanente)
+- Tiempos exactos por símbolo (descarga y escritura) para su análisis posterior
+- Escrituras en lote para no añadir una consulta por símbolo
+- Reanudación de una ejecución interrumpida con solo el trabajo pendiente
+
+Autor: TradeStrategy Team
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, bindparam, update
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger('StockDataLoader.RunJournal')
+
+JOURNAL_FLUSH_EVERY = 500  # Cambios de estado acumulados antes de escribirlos en la DB
+
+STATE_PLANNED = "planned"
+STATE_DOWNLOADED = "downloaded"
+STATE_WRITTEN = "written"
+STATE_FAILED = "failed"
+
+JournalBase = declarative_base()
+
+
+class LoaderRun(JournalBase):
+    """Modelo para una ejecución del cargador."""
+    __tablename__ = 'loader_runs'
+
+    run_id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, nullable=False)
+    resumed_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    status = Column(String, nullable=False)  # running, completed, failed
+    planned_symbols = Column(Integer, default=0)
+
+    def __repr__(self):
+        return f"<LoaderRun(run_id={self.run_id}, status='{self.status}')>"
+
+
+class LoaderRunSymbol(JournalBase):
+    """Modelo para el estado de un símbolo dentro de una ejecución."""
+    __tablename__ = 'loader_run_symbols'
+
+    run_id = Column(Integer, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    state = Column(String, nullable=False)
+    start_date = Column(DateTime)
+    last_date = Column(DateTime)
+    permanent = Column(Boolean, default=False)
+    reason = Column(String)
+    rows = Column(Integer)
+    planned_at = Column(DateTime)
+    downloaded_at = Column(DateTime)
+    written_at = Column(DateTime)
+    failed_at = Column(DateTime)
+    download_seconds = Column(Float)
+    write_seconds = Column(Float)
+
+    def __repr__(self):
+        return f"<LoaderRunSymbol(run_id={self.run_id}, symbol='{self.symbol}', state='{self.state}')>"
+
+
+class RunJournal:
+    """Registra el progreso de una ejecución del cargador y permite reanudarla."""
+
+    def __init__(self, engine):
+        """Crea las tablas del diario si no existen."""
+        self.engine = engine
+        self.session_maker = sessionmaker(bind=engine)
+        self.run_id = None
+        self.resumed = False
+        # Última ejecución cerrada: finish_run no vuelve a cerrarla
+        self._closed_run_id = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        JournalBase.metadata.create_all(engine)
+
+    def start_run(self, tasks):
+        """Abre una ejecución nueva y registra las tareas planificadas."""
+        now = datetime.now()
+        session = self.session_maker()
+        try:
+            run = LoaderRun(started_at=now, status="running", planned_symbols=len(tasks))
+            session.add(run)
+            session.flush()
+            self.run_id = run.run_id
+            session.bulk_insert_mappings(LoaderRunSymbol, [
+                {
+                    'run_id': self.run_id,
+                    'symbol': task['symbol'],
+                    'state': STATE_PLANNED,
+                    'start_date': _as_datetime(task['start_date']),
+                    'last_date': task['last_date'],
+                    'planned_at': now
+                }
+                for task in tasks
+            ])
+            session.commit()
+        finally:
+            session.close()
+        logger.info(f"Ejecución {self.run_id} registrada con {len(tasks)} símbolos planificados")
+
+    def resume_run(self):
+        """Retoma la última ejecución sin terminar.
+
+        Retorna las tareas {'symbol', 'start_date', 'last_date'} que quedan
+        pendientes: las planificadas, las descargadas pero no escritas y las
+        fallidas por errores transitorios. Los símbolos escritos y los que
+        fallaron de forma permanente se omiten. Retorna None si no hay
+        ninguna ejecución que reanudar.
+        """
+        session = self.session_maker()
+        try:
+            run = session.query(LoaderRun)\
+                    .filter(LoaderRun.status != "completed")\
+                    .order_by(LoaderRun.run_id.desc())\
+                    .first()
+            if run is None:
+                return None
+
+            rows = session.query(LoaderRunSymbol)\
+                    .filter(LoaderRunSymbol.run_id == run.run_id)\
+                    .filter(LoaderRunSymbol.state != STATE_WRITTEN)\
+                    .filter(~((LoaderRunSymbol.state == STATE_FAILED) & LoaderRunSymbol.permanent.is_(True)))\
+                    .order_by(LoaderRunSymbol.symbol)\
+                    .all()
+            tasks = [
+                {'symbol': row.symbol, 'start_date': row.start_date, 'last_date': row.last_date}
+                for row in rows
+            ]
+
+            run.status = "running"
+            run.resumed_at = datetime.now()
+            session.commit()
+            self.run_id = run.run_id
+            self.resumed = True
+        finally:
+            session.close()
+
+        logger.info(f"Reanudando la ejecución {self.run_id}: {len(tasks)} símbolos pendientes")
+        return tasks
+
+    def record(self, symbol, **values):
+        """Acumula un cambio de estado de un símbolo; se escribe en la DB por lotes."""
+        if self.run_id is None:
+            return
+        with self._lock:
+            self._pending.setdefault(symbol, {}).update(values)
+            if len(self._pending) >= JOURNAL_FLUSH_EVERY:
+                self._flush_locked()
+
+    def mark_downloaded(self, symbol, rows, seconds=None):
+        """Registra una descarga correcta."""
+        self.record(symbol, state=STATE_DOWNLOADED, rows=rows, downloaded_at=datetime.now(),
+                    download_seconds=seconds, reason=None)
+
+    def mark_failed(self, symbol, reason, permanent=False, seconds=None, start_date=None):
+        """Registra un fallo; los permanentes no se reintentan al reanudar.
+
+        Con ``start_date`` la tarea se reanuda desde esa fecha en lugar de la
+        planificada (p. ej. la recarga completa de un histórico reajustado).
+        """
+        values = {'state': STATE_FAILED, 'reason': str(reason)[:500], 'permanent': permanent,
+                  'failed_at': datetime.now()}
+        if seconds is not None:
+            values['download_seconds'] = seconds
+        if start_date is not None:
+            values['start_date'] = _as_datetime(start_date)
+        self.record(symbol, **values)
+
+    def mark_written(self, symbols, seconds):
+        """Registra que los datos de varios símbolos se guardaron en la DB en un mismo volcado."""
+        now = datetime.now()
+        for symbol in symbols:
+            self.record(symbol, state=STATE_WRITTEN, written_at=now, write_seconds=seconds)
+
+    def flush(self):
+        """Escribe en la DB los cambios de estado pendientes."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        """Escribe los cambios pendientes con un executemany por combinación de columnas."""
+        if not self._pending:
+            return
+
+        groups = {}
+        for symbol, values in self._pending.items():
+            params = {f"v_{column}": value for column, value in values.items()}
+            groups.setdefault(tuple(sorted(values)), []).append(dict(params, b_symbol=symbol))
+        self._pending = {}
+
+        table = LoaderRunSymbol.__table__
+        try:
+            with self.engine.begin() as conn:
+                for columns, params in groups.items():
+                    stmt = update(table)\
+                        .where(table.c.run_id == self.run_id)\
+                        .where(table.c.symbol == bindparam('b_symbol'))\
+                        .values({column: bindparam(f"v_{column}") for column in columns})
+                    conn.execute(stmt, params)
+        except Exception as e:
+            # El diario nunca debe detener la carga: en el peor caso se repite trabajo al reanudar
+            logger.error(f"Error al actualizar el diario de la ejecución {self.run_id}: {e}")
+
+    def finish_run(self, status):
+        """Cierra la ejecución con el estado indicado ("completed" o "failed").
+
+        Cada ejecución se cierra una sola vez: las llamadas siguientes no
+        cambian su estado.
+        """
+        if self.run_id is None or self.run_id == self._closed_run_id:
+            return
+        self.flush()
+        session = self.session_maker()
+        try:
+            run = session.get(LoaderRun, self.run_id)
+            run.status = status
+            run.finished_at = datetime.now()
+            session.commit()
+        finally:
+            session.close()
+        self._closed_run_id = self.run_id
+        logger.info(f"Ejecución {self.run_id} cerrada con estado {status}")
+
+
+def _as_datetime(value):
+    """Convierte la fecha de inicio de una tarea (texto o datetime) a datetime."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Shard Leases
+============
+
+Reparto del universo de símbolos entre varios procesos de StockDataLoader,
+en una o varias máquinas, mediante leases en la base de datos.
+
+Características:
+- El universo ordenado se divide en shards de SHARD_SIZE símbolos consecutivos (rangos first_symbol..last_symbol)
+- Una fila por shard en loader_shards, identificada por el nombre de la carga (run_name) y el número de shard
+- Cada proceso reclama el siguiente shard libre con SELECT ... FOR UPDATE SKIP LOCKED, sin bloquear a los demás
+- Los leases se renuevan con un latido; si un proceso muere, su lease expira y otro proceso retoma el shard
+- Las estadísticas de cada shard se guardan en su fila para agregarlas entre todos los procesos
+
+Autor: TradeStrategy Team
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, select, update, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.declarative import declarative_base
+
+logger = logging.getLogger('StockDataLoader.ShardLeases')
+
+SHARD_SIZE = 500  # Símbolos consecutivos por shard
+SHARD_LEASE_SECONDS = 300  # Duración de un lease sin renovar; pasado este tiempo el shard se reasigna
+SHARD_HEARTBEAT_SECONDS = 60  # Intervalo de renovación del lease del shard en curso
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+
+ShardBase = declarative_base()
+
+
+class LoaderShard(ShardBase):
+    """Modelo para un shard (rango de símbolos) de una carga repartida."""
+    __tablename__ = 'loader_shards'
+
+    run_name = Column(String, primary_key=True)
+    shard_id = Column(Integer, primary_key=True)
+    first_symbol = Column(String, nullable=False)
+    last_symbol = Column(String, nullable=False)
+    symbols_count = Column(Integer, nullable=False)
+    state = Column(String, nullable=False)
+    worker = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Instantes en UTC sin zona horaria: los procesos de distintas máquinas deben tener el reloj sincronizado
+    created_at = Column(DateTime)
+    first_leased_at = Column(DateTime)
+    leased_at = Column(DateTime)
+    lease_expires_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    stats = Column(Text)  # JSON con los contadores acumulados de todos los intentos
+
+    def __repr__(self):
+        return f"<LoaderShard(run_name='{self.run_name}', shard_id={self.shard_id}, state='{self.state}')>"
+
+
+def default_worker_id():
+    """Identificador del proceso actual: máquina y PID."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def split_shards(symbols, shard_size=SHARD_SIZE):
+    """Divide el universo ordenado en rangos de ``shard_size`` símbolos consecutivos."""
+    ordered = sorted(set(symbols))
+    return [
+        {
+            'shard_id': i // shard_size,
+            'first_symbol': ordered[i],
+            'last_symbol': ordered[min(i + shard_size, len(ordered)) - 1],
+            'symbols_count': len(ordered[i:i + shard_size])
+        }
+        for i in range(0, len(ordered), shard_size)
+    ]
+
+
+def _utcnow():
+    """Instante actual en UTC sin zona horaria."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ShardCoordinator:
+    """Reclama, renueva y cierra los leases de los shards de una carga."""
+
+    def __init__(self, engine, run_name, worker=None, lease_seconds=SHARD_LEASE_SECONDS,
+                 heartbeat_seconds=SHARD_HEARTBEAT_SECONDS):
+        """Crea la tabla de shards si no existe.
+
+        Args:
+            engine: Engine de SQLAlchemy de la base de datos compartida.
+            run_name: Nombre de la carga; todos los procesos que la reparten
+                deben usar el mismo.
+            worker: Identificador de este proceso (por defecto máquina:PID).
+            lease_seconds: Duración de un lease sin renovar.
+            heartbeat_seconds: Intervalo de renovación del lease en curso.
+        """
+        self.engine = engine
+        self.run_name = run_name
+        self.worker = worker or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        ShardBase.metadata.create_all(engine)
+
+    def create_shards(self, symbols, shard_size=SHARD_SIZE):
+        """Registra los shards de la carga si aún no existen.
+
+        Todos los procesos pueden llamarlo a la vez: el primero crea las filas
+        y el resto no modifica nada, de modo que los rangos son los del primer
+        proceso aunque los demás lean un universo ligeramente distinto.
+        """
+        shards = split_shards(symbols, shard_size)
+        if not shards:
+            return 0
+
+        now = _utcnow()
+        rows = [dict(shard, run_name=self.run_name, state=STATE_PENDING, attempts=0, created_at=now)
+                for shard in shards]
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(LoaderShard.__table__).on_conflict_do_nothing(index_elements=['run_name', 'shard_id'])
+        with self.engine.begin() as conn:
+            conn.execute(stmt, rows)
+        logger.info(f"Carga {self.run_name}: {len(shards)} shards de hasta {shard_size} símbolos")
+        return len(shards)
+
+    def claim(self):
+        """Reclama el siguiente shard libre o con el lease expirado.
+
+        Retorna un diccionario {'shard_id', 'first_symbol', 'last_symbol',
+        'symbols_count', 'attempts'} o None si no queda ninguno. Los shards que
+        otro proceso está reclamando en ese momento se saltan (SKIP LOCKED).
+        """
+        table = LoaderShard.__table__
+        now = _utcnow()
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.shard_id, table.c.first_symbol, table.c.last_symbol, table.c.symbols_count,
+                       table.c.attempts, table.c.state, table.c.worker)
+                .where(table.c.run_name == self.run_name)
+                .where((table.c.state == STATE_PENDING) |
+                       ((table.c.state == STATE_LEASED) & (table.c.lease_expires_at < now)))
+                .order_by(table.c.shard_id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row.state == STATE_LEASED:
+                logger.warning(f"El lease del shard {row.shard_id} de {row.worker} ha expirado: se reasigna")
+            conn.execute(
+                update(table)
+                .where(table.c.run_name == self.run_name)
+                .where(table.c.shard_id == row.shard_id)
+                .values(state=STATE_LEASED, worker=self.worker, attempts=table.c.attempts + 1,
+                        first_leased_at=func.coalesce(table.c.first_leased_at, now), leased_at=now,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+
+        shard = {
+            'shard_id': row.shard_id,
+            'first_symbol': row.first_symbol,
+            'last_symbol': row.last_symbol,
+            'symbols_count': row.symbols_count,
+            'attempts': row.attempts + 1
+        }
+        with self._lock:
+            self.current = shard
+        logger.info(f"Shard {shard['shard_id']} reclamado: {shard['first_symbol']}..{shard['last_symbol']} "
+                    f"({shard['symbols_count']} símbolos)")
+        return shard
+
+    def renew(self):
+        """Renueva el lease del shard en curso. Retorna False si otro proceso lo ha reclamado."""
+        with self._lock:
+            shard = self.current
+        if shard is None:
+            return True
+
+        table = LoaderShard.__table__
+        with self.engine.begin() as conn:
+            renewed = conn.execute(
+                update(table)
+                .where(table.c.run_name == self.run_name)
+                .where(table.c.shard_id == shard['shard_id'])
+                .where(table.c.worker == self.worker)
+                .where(table.c.state == STATE_LEASED)
+                .values(lease_expires_at=_utcnow() + timedelta(seconds=self.lease_seconds))
+            ).rowcount
+        if not renewed:
+            # El trabajo es idempotente (upserts): en el peor caso el shard se descarga dos veces
+            logger.warning(f"Lease del shard {shard['shard_id']} perdido: otro proceso lo ha reclamado")
+        return bool(renewed)
+
+    def start_heartbeat(self):
+        """Renueva el lease del shard en curso cada heartbeat_seconds hasta llamar a stop_heartbeat()."""
+        def run():
+            while not self._stop.wait(self.heartbeat_seconds):
+                try:
+                    self.renew()
+                except Exception as e:
+                    logger.warning(f"Error al renovar el lease del shard: {e}")
+
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=run, name="ShardHeartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        """Detiene el latido; el lease en curso, si lo hay, expirará solo."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def complete(self, shard, stats):
+        """Cierra un shard terminado y suma sus estadísticas a las de intentos anteriores.
+
+        Retorna False si el lease se perdió antes de cerrarlo (ver _finish).
+        """
+        if not self._finish(shard, stats, STATE_DONE):
+            return False
+        logger.info(f"Shard {shard['shard_id']} completado")
+        return True
+
+    def release(self, shard, stats):
+        """Devuelve un shard sin terminar (p. ej. por el presupuesto) para que lo retome otro proceso.
+
+        Retorna False si el lease se perdió antes de devolverlo (ver _finish).
+        """
+        if not self._finish(shard, stats, STATE_PENDING):
+            return False
+        logger.info(f"Shard {shard['shard_id']} liberado sin terminar")
+        return True
+
+    def _finish(self, shard, stats, state):
+        """Actualiza estado y estadísticas de un shard reclamado por este proceso.
+
+        Si el lease ya no es de este proceso (expiró durante una pausa o un
+        shard lento y otro lo ha reclamado), el estado no cambia, pero las
+        estadísticas se suman igualmente: las filas ya están escritas.
+        Retorna False en ese caso.
+        """
+        table = LoaderShard.__table__
+        key = (table.c.run_name == self.run_name) & (table.c.shard_id == shard['shard_id'])
+        with self.engine.begin() as conn:
+            # FOR UPDATE: dos procesos que cierran el mismo shard no pierden estadísticas
+            previous = conn.execute(select(table.c.stats).where(key).with_for_update()).scalar()
+            totals = _sum_stats([json.loads(previous)] if previous else [], stats)
+            values = {'state': state, 'stats': json.dumps(totals), 'lease_expires_at': None}
+            if state == STATE_DONE:
+                values['finished_at'] = _utcnow()
+            else:
+                values['worker'] = None
+            owned = conn.execute(update(table).where(key).where(table.c.worker == self.worker).values(**values)).rowcount
+            if not owned:
+                conn.execute(update(table).where(key).values(stats=json.dumps(totals)))
+        with self._lock:
+            self.current = None
+        if not owned:
+            logger.warning(f"Lease del shard {shard['shard_id']} perdido antes de cerrarlo: "
+                           f"sus estadísticas se suman, pero lo cierra el proceso que lo reclamó")
+        return bool(owned)
+
+    def summary(self):
+        """Progreso y estadísticas agregadas de la carga entre todos los procesos."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(LoaderShard.__table__).where(LoaderShard.__table__.c.run_name == self.run_name)
+            ).fetchall()
+
+        states = {STATE_PENDING: 0, STATE_LEASED: 0, STATE_DONE: 0}
+        for row in rows:
+            states[row.state] = states.get(row.state, 0) + 1
+        totals = _sum_stats([json.loads(row.stats) for row in rows if row.stats])
+
+        started = [row.first_leased_at for row in rows if row.first_leased_at is not None]
+        finished = [row.finished_at for row in rows if row.finished_at is not None]
+        wall_seconds = (max(finished) - min(started)).total_seconds() if started and finished else 0.0
+        return {
+            "run_name": self.run_name,
+            "shards": len(rows),
+            "states": states,
+            "workers": len({row.worker for row in rows if row.worker}),
+            "totals": totals,
+            "wall_seconds": round(wall_seconds, 3),
+            "rows_per_second": round(totals.get("total_records", 0) / wall_seconds, 1) if wall_seconds > 0 else 0.0
+        }
+
+
+def _sum_stats(items, extra=None):
+    """Suma diccionarios de contadores numéricos."""
+    totals = {}
+    for item in list(items) + ([extra] if extra else []):
+        for key, value in item.items():
+            totals[key] = round(totals.get(key, 0) + value, 3)
+    return totals
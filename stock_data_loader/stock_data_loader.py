@@ -8,7 +8,7 @@ en TimescaleDB para su análisis posterior.
 
 Características:
 - Lectura de símbolos desde el archivo generado por symbol_fetcher
-- Descarga de datos OHLCV mensuales desde Yahoo Finance
+- Descarga de datos OHLCV mensuales desde Yahoo Finance (o desde archivos locales o un generador sintético)
 - Almacenamiento eficiente en TimescaleDB
 - Procesamiento en paralelo y gestión de errores
 - Registro detallado del proceso
@@ -16,11 +16,18 @@ Características:
 Autor: TradeStrategy Team
 """
 
+import io
 import os
+import re
 import sys
+import math
 import time
 import json
+import queue
 import logging
+import argparse
+import threading
+import multiprocessing
 import traceback
 from datetime import datetime
 from pathlib import Path
@@ -28,9 +35,11 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from dateutil.relativedelta import relativedelta
 import traceback
 
+import zlib
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from sqlalchemy import create_engine, text, Column, String, Float, DateTime, func
+from sqlalchemy import create_engine, text, bindparam, inspect, select, tuple_, or_, literal_column, Column, Integer, BigInteger, String, REAL, DateTime, func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
@@ -38,6 +47,14 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 from tqdm import tqdm
 from dateutil.relativedelta import relativedelta
 
+from data_cache import HistoryCache, CACHE_DIR
+from run_journal import RunJournal
+from negative_cache import NegativeCache, classify_failure, FAILURE_EMPTY
+from bar_buffer import BarBuffer
+from shard_leases import ShardCoordinator
+from loader_metrics import LoaderMetrics
+from providers import PROVIDERS, create_provider
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -60,6 +77,62 @@ REQUEST_DELAY = 1.0  # Tiempo de espera entre solicitudes (en segundos)
 SEQUENTIAL_MODE = False  # Si es True, procesa símbolos secuencialmente sin concurrencia
 TEST_MODE = False  # Si es True, limita el número de símbolos a procesar
 TEST_SYMBOLS_COUNT = 3  # Número de símbolos a procesar en modo prueba
+# Si es True, agrupa los símbolos en llamadas a yf.download. Es solo una agrupación con hilos: yfinance
+# sigue haciendo una petición por símbolo, y cada grupo las lanza todas a la vez tras reservar sus tokens
+BATCH_DOWNLOAD_MODE = False
+DOWNLOAD_GROUP_SIZE = 50  # Número máximo de símbolos por descarga multi-ticker
+WRITE_MODE = "upsert"  # "upsert": INSERT ... ON CONFLICT por lotes; "copy": COPY a tabla staging + merge
+WRITE_MODES = ("upsert", "copy")
+PIPELINE_MODE = False  # Si es True, descarga y escritura se solapan mediante una cola acotada
+DOWNLOAD_ENGINE = "threads"  # "threads": ThreadPoolExecutor + yfinance; "async": asyncio + cliente HTTP compartido
+DOWNLOAD_ENGINES = ("threads", "async")
+DATA_PROVIDER = "yahoo"  # Origen de los históricos: "yahoo", "file" (directorio CSV/Parquet) o "synthetic" (providers.py)
+PIPELINE_QUEUE_SIZE = 20  # Máximo de DataFrames en cola entre descargadores y escritor
+WRITER_FLUSH_ROWS = 5000  # El escritor vuelca a la DB al acumular este número de filas
+WRITER_FLUSH_SECONDS = 10.0  # ... o cuando pasa este tiempo desde el último volcado
+ADAPTIVE_RATE_LIMIT = True  # Si es True, la tasa y la concurrencia se ajustan solas (AIMD)
+INITIAL_REQUEST_RATE = MAX_WORKERS / REQUEST_DELAY  # Tasa inicial (peticiones/s), equivalente al modo fijo
+MIN_REQUEST_RATE = 0.2  # Tasa mínima tras recortes por rate limit (peticiones/s)
+MAX_REQUEST_RATE = 50.0  # Tasa máxima permitida (peticiones/s)
+MAX_CONCURRENCY = 32  # Máximo de peticiones simultáneas que puede alcanzar el limitador
+RATE_INCREASE_STEP = 1.0  # Incremento aditivo de la tasa (peticiones/s) por cada segundo sin errores
+RATE_DECREASE_FACTOR = 0.5  # Factor multiplicativo aplicado a tasa y concurrencia ante 429 o timeout
+RATE_DECREASE_COOLDOWN = 2.0  # Segundos tras un recorte en los que no se aplican nuevos recortes
+DOWNLOAD_INTERVAL = "1mo"  # Intervalo de las barras descargadas: "1mo" (stock_prices_monthly) o "1d" (stock_prices_daily)
+DOWNLOAD_INTERVALS = ("1mo", "1d")
+ROLLUP_REFRESH_START = "3 months"  # Ventana que refresca la política de los agregados continuos
+# Intervalo de chunk de cada tabla de precios: ~130k filas por chunk con 11k símbolos
+CHUNK_TIME_INTERVALS = {
+    "1mo": "1 year",
+    "1d": "1 month"
+}
+# Antigüedad a partir de la que se comprimen los chunks (siempre mayor que el intervalo de chunk)
+COMPRESS_AFTER = {
+    "1mo": "2 years",
+    "1d": "3 months"
+}
+HISTORY_CACHE_ENABLED = False  # Si es True, los históricos se guardan y se leen de la caché en disco (data_cache.py)
+RUN_JOURNAL_ENABLED = True  # Si es True, el estado de cada símbolo se registra en las tablas loader_runs (run_journal.py)
+NEGATIVE_CACHE_ENABLED = True  # Si es True, los símbolos sin datos se omiten hasta su próxima comprobación (negative_cache.py)
+PRIORITY_SCHEDULING = True  # Si es True, se descarga primero lo más valioso (candidatos, antigüedad y volumen) en lugar de por orden alfabético
+LOAD_BUDGET = None  # Presupuesto de la ejecución: tiempo ("30m", "2h") o peticiones ("500req"); None = sin límite
+PRIORITY_MAX_STALE_BARS = 12  # Barras pendientes a partir de las que la antigüedad deja de sumar prioridad
+# Días naturales por barra de cada intervalo, para medir la antigüedad en barras
+BAR_DAYS = {
+    "1mo": 30.4,
+    "1d": 1.4
+}
+METRICS_FILE = None  # Archivo .prom donde se escriben las métricas en formato Prometheus durante la ejecución (loader_metrics.py)
+METRICS_PORT = None  # Puerto en el que se sirven las métricas en /metrics durante la ejecución
+SHARD_PROCESSES = 1  # Procesos cargadores lanzados en esta máquina; con más de uno se reparten el universo por shards (shard_leases.py)
+# Contadores de la ejecución que se guardan por shard y se suman entre todos los procesos
+SHARD_STAT_KEYS = ("total_symbols", "up_to_date_symbols", "negative_cached_symbols", "planned_downloads", "successful_downloads",
+                   "failed_downloads", "history_refetches", "total_records", "rows_inserted", "rows_updated", "rows_unchanged",
+                   "db_write_seconds")
+HISTORY_CHECK_BARS = 3  # Barras almacenadas que se vuelven a descargar para detectar splits y dividendos (0 = sin comprobación)
+HISTORY_CHECK_DIGITS = 6  # Cifras significativas de los cierres comparados (absorbe el ruido de coma flotante)
+# Columnas de valor de las tablas de precios: una fila solo se reescribe si alguna cambia
+VALUE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
 
 # Configuración de conexión a TimescaleDB
 DB_CONFIG = {
@@ -73,46 +146,536 @@ DB_CONFIG = {
 # Definir el modelo SQLAlchemy para los datos de acciones
 Base = declarative_base()
 
-class StockPrice(Base):
-    """Modelo para datos mensuales de acciones."""
-    __tablename__ = 'stock_prices_monthly'
+class Symbol(Base):
+    """Modelo para la dimensión de símbolos: cada ticker se guarda una sola vez con un id entero."""
+    __tablename__ = 'symbols'
+    
+    symbol_id = Column(Integer, primary_key=True, autoincrement=True)
+    symbol = Column(String, nullable=False, unique=True)
+    
+    def __repr__(self):
+        return f"<Symbol(symbol_id={self.symbol_id}, symbol='{self.symbol}')>"
 
+
+class PriceColumns:
+    """Columnas comunes de las tablas de precios OHLCV.
+    
+    La clave primaria (symbol_id, date) es también el índice que sirve la
+    última barra de cada símbolo y las consultas por rango de fechas. Los
+    precios se guardan en REAL (4 bytes, ~7 dígitos significativos) y el
+    volumen en BIGINT.
+    """
+    
     # Columnas de datos
-    symbol = Column(String, primary_key=True)
+    symbol_id = Column(Integer, primary_key=True)  # symbols.symbol_id
     date = Column(DateTime, primary_key=True)  # Será una hypertable en TimescaleDB
-    open = Column(Float)
-    high = Column(Float)
-    low = Column(Float)
-    close = Column(Float)
-    volume = Column(Float)
+    open = Column(REAL)
+    high = Column(REAL)
+    low = Column(REAL)
+    close = Column(REAL)
+    volume = Column(BigInteger)
     
     def __repr__(self):
-        return f"<StockPrice(symbol='{self.symbol}', date='{self.date}')>"
+        return f"<{type(self).__name__}(symbol_id={self.symbol_id}, date='{self.date}')>"
+
+
+class StockPrice(PriceColumns, Base):
+    """Modelo para datos mensuales de acciones."""
+    __tablename__ = 'stock_prices_monthly'
+
+
+class StockPriceDaily(PriceColumns, Base):
+    """Modelo para datos diarios de acciones (origen de los agregados semanal y mensual)."""
+    __tablename__ = 'stock_prices_daily'
+
+
+# Modelo de destino de cada intervalo de descarga
+PRICE_MODELS = {
+    "1mo": StockPrice,
+    "1d": StockPriceDaily
+}
+
+# Agregados continuos calculados a partir de stock_prices_daily: vista -> ancho del bucket
+DAILY_ROLLUPS = {
+    "stock_prices_weekly": "1 week",
+    "stock_prices_monthly_rollup": "1 month"
+}
+
+
+def get_download_window(last_date, current_date=None, interval="1mo"):
+    """Decide si un símbolo necesita descarga a partir de su última fecha almacenada.
+    
+    Con barras mensuales un símbolo está al día si tiene el mes actual o el
+    anterior; con barras diarias, si tiene el último día hábil anterior a hoy.
+    
+    Retorna un diccionario con:
+    - need_update: True si necesita actualizar, False si ya está al día
+    - start_date: La fecha desde la que se deberían descargar nuevos datos
+    - last_date: La última fecha disponible en la base de datos
+    """
+    if last_date is None:
+        # Si no hay datos previos, descargar desde el inicio
+        return {'need_update': True, 'start_date': DEFAULT_START_DATE, 'last_date': None}
+    
+    current_date = current_date or datetime.now()
+    
+    if interval == "1d":
+        previous_business_day = (pd.Timestamp(current_date).normalize() - pd.offsets.BDay(1)).to_pydatetime()
+        if last_date >= previous_business_day:
+            return {'need_update': False, 'start_date': None, 'last_date': last_date}
+        return {'need_update': True, 'start_date': last_date + relativedelta(days=1), 'last_date': last_date}
+    
+    # Verificar si ya tenemos datos actualizados (hasta el mes actual o el anterior)
+    previous_month = current_date.month - 1 if current_date.month > 1 else 12
+    previous_year = current_date.year if current_date.month > 1 else current_date.year - 1
+    
+    if ((last_date.year == current_date.year and last_date.month == current_date.month) or
+        (last_date.year == previous_year and last_date.month == previous_month)):
+        return {'need_update': False, 'start_date': None, 'last_date': last_date}
+    
+    # Si no están actualizados, descargar desde el mes siguiente al último dato
+    return {'need_update': True, 'start_date': last_date + relativedelta(months=1), 'last_date': last_date}
+
+
+def get_history_check_window(last_date, interval="1mo", bars=HISTORY_CHECK_BARS):
+    """Ventana de barras almacenadas [inicio, last_date) que se comprueban al actualizar un símbolo.
+    
+    La última barra almacenada no se compara: puede ser un periodo que aún
+    estaba en curso al escribirla. Retorna None si no hay nada que comprobar.
+    """
+    if last_date is None or bars <= 0:
+        return None
+    if interval == "1d":
+        start = (pd.Timestamp(last_date) - pd.offsets.BDay(bars)).to_pydatetime()
+    else:
+        start = last_date - relativedelta(months=bars)
+    # Desde la medianoche: las barras del mismo día en otra estación (horario de verano) también entran
+    return start.replace(hour=0, minute=0, second=0, microsecond=0), last_date
+
+
+def history_checksum(dates, closes, digits=HISTORY_CHECK_DIGITS):
+    """Suma de control de un tramo de histórico: fechas (día UTC) y cierres redondeados.
+    
+    Los cierres se comparan en REAL (float32), la precisión con la que se
+    guardan, y con ``digits`` cifras significativas, de modo que los datos
+    descargados y los almacenados dan la misma suma si el proveedor no ha
+    reajustado el histórico.
+    """
+    days = pd.to_datetime(pd.Series(dates), utc=True).dt.strftime('%Y-%m-%d')
+    closes = pd.Series(closes, dtype='float64').to_numpy(dtype=np.float32)
+    payload = ";".join(f"{day}={close:.{digits}g}" for day, close in zip(days, closes))
+    return zlib.crc32(payload.encode())
+
+
+def priority_score(last_date, dollar_volume=None, current_date=None, interval="1mo"):
+    """Prioridad de un símbolo pendiente de descarga.
+    
+    Barras de antigüedad (acotadas a PRIORITY_MAX_STALE_BARS; un símbolo sin
+    datos cuenta como el máximo) ponderadas por el orden de magnitud del
+    volumen negociado (close × volume) de su última barra.
+    """
+    current_date = current_date or datetime.now()
+    if last_date is None:
+        stale_bars = PRIORITY_MAX_STALE_BARS
+    else:
+        stale_bars = min(PRIORITY_MAX_STALE_BARS, max(0.0, (current_date - last_date).days / BAR_DAYS[interval]))
+    return stale_bars * (1 + math.log10(1 + max(dollar_volume or 0.0, 0.0)))
+
+
+def parse_budget(value):
+    """Interpreta un presupuesto de ejecución.
+    
+    Acepta tiempo ("45s", "30m", "2h"; sin unidad son segundos) o peticiones
+    ("500req"). Retorna {'seconds': float}, {'requests': int} o None.
+    """
+    if value is None:
+        return None
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*(s|m|h|req)?\s*", str(value).lower())
+    if match is None:
+        raise ValueError(f"Presupuesto no válido: {value} (use p. ej. 30m, 2h o 500req)")
+    amount, unit = float(match.group(1)), match.group(2) or "s"
+    if unit == "req":
+        return {"requests": int(amount)}
+    return {"seconds": amount * {"s": 1, "m": 60, "h": 3600}[unit]}
+
+
+def is_throttle_error(error):
+    """Indica si un error de descarga corresponde a un rate limit (HTTP 429) o un timeout."""
+    if isinstance(error, TimeoutError) or type(error).__name__ in ("YFRateLimitError", "Timeout", "ReadTimeout", "ConnectTimeout"):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ("429", "too many requests", "rate limit", "timed out", "timeout"))
+
+
+def _record_retry(retry_state):
+    """Cuenta en las métricas del cargador cada reintento de tenacity."""
+    retry_state.args[0].metrics.inc("retries")
+
+
+def _give_up_download(retry_state):
+    """Cierra la descarga de un símbolo cuyo último intento falló con un error transitorio."""
+    loader, symbol = retry_state.args[0], retry_state.args[1]
+    error = retry_state.outcome.exception()
+    logger.error(f"Error descargando datos para {symbol} tras {retry_state.attempt_number} intentos: {error}")
+    loader._download_errors[symbol] = str(error)
+    return symbol, loader.complete_download(symbol, None, retry_state.seconds_since_start)
+
+
+def _nullable_column(values, cast=float):
+    """Convierte una columna numérica en una lista de Python con None (NULL) en lugar de NaN."""
+    return [None if value != value else cast(value) for value in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def _datetime_column(dates):
+    """Convierte fechas en UTC sin zona horaria en una lista de datetime de Python."""
+    return np.asarray(dates, dtype='datetime64[us]').astype(object).tolist()
+
+
+def configure_hypertable(conn, table, interval):
+    """Convierte ``table`` en hypertable y configura chunks y compresión según el intervalo de sus barras.
+    
+    - Chunks de CHUNK_TIME_INTERVALS (el valor por defecto de 7 días deja miles
+      de chunks casi vacíos con barras mensuales).
+    - Compresión segmentada por símbolo y ordenada por fecha, de modo que el
+      histórico de un símbolo queda contiguo en pocas páginas.
+    - Política que comprime los chunks más antiguos que COMPRESS_AFTER.
+    
+    Es idempotente: puede ejecutarse en cada conexión. El nuevo intervalo solo
+    afecta a los chunks futuros; para reorganizar una tabla existente está
+    migrate_hypertable.py. Cada paso que falla se registra y se omite.
+    """
+    chunk_interval = CHUNK_TIME_INTERVALS[interval]
+    
+    def run_step(description, sql):
+        try:
+            result = conn.execute(text(sql))
+            conn.commit()
+            return result
+        except SQLAlchemyError as e:
+            logger.warning(f"Error al {description} de {table}: {e}")
+            conn.rollback()
+            return None
+    
+    if run_step("crear la hypertable", f"""
+        SELECT create_hypertable('{table}', 'date',
+                                 chunk_time_interval => INTERVAL '{chunk_interval}',
+                                 if_not_exists => TRUE);
+    """) is None:
+        return False
+    
+    run_step("ajustar el intervalo de chunk", f"SELECT set_chunk_time_interval('{table}', INTERVAL '{chunk_interval}');")
+    
+    # La configuración de compresión no puede cambiarse con chunks ya comprimidos
+    enabled = run_step("consultar la compresión", f"""
+        SELECT compression_enabled FROM timescaledb_information.hypertables
+        WHERE hypertable_name = '{table}';
+    """)
+    if enabled is not None and not enabled.scalar():
+        run_step("activar la compresión", f"""
+            ALTER TABLE {table} SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = 'symbol_id',
+                timescaledb.compress_orderby = 'date'
+            );
+        """)
+    
+    run_step("crear la política de compresión", f"""
+        SELECT add_compression_policy('{table}', INTERVAL '{COMPRESS_AFTER[interval]}', if_not_exists => TRUE);
+    """)
+    return True
+
+
+class AdaptiveRateLimiter:
+    """Token bucket compartido por todos los descargadores con control AIMD.
+    
+    Cada petición consume un token de un bucket que se rellena a ``rate``
+    tokens por segundo y ocupa un hueco de concurrencia. Mientras las
+    peticiones terminan bien, la tasa crece de forma aditiva y la
+    concurrencia aumenta en uno por cada ventana completa de éxitos; ante un
+    429 o un timeout ambas se reducen de forma multiplicativa.
+    """
+    
+    def __init__(self, rate=INITIAL_REQUEST_RATE, concurrency=MAX_WORKERS, adaptive=ADAPTIVE_RATE_LIMIT):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.adaptive = adaptive
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttle_events = 0
+        self._successes_in_window = 0
+        self._last_decrease = None
+        self._last_refill = time.monotonic()
+        self._started = time.monotonic()
+        self._condition = threading.Condition()
+    
+    def _reserve(self, cost):
+        """Consume ``cost`` tokens y retorna los segundos que hay que esperar (con el lock tomado)."""
+        now = time.monotonic()
+        # Capacidad de ráfaga de un segundo a la tasa actual
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        self.tokens -= cost
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+    
+    def reserve(self, cost=1):
+        """Reserva tokens sin bloquear y retorna la espera necesaria en segundos."""
+        with self._condition:
+            self.requests += cost
+            return self._reserve(cost)
+    
+    def acquire(self, cost=1, slots=1):
+        """Bloquea hasta tener ``slots`` huecos de concurrencia y ``cost`` tokens disponibles.
+        
+        ``slots`` se limita a la concurrencia actual. Retorna los huecos
+        ocupados, que deben devolverse con release.
+        """
+        with self._condition:
+            slots = max(1, min(slots, self.concurrency))
+            while self.in_flight + slots > self.concurrency:
+                self._condition.wait()
+                slots = max(1, min(slots, self.concurrency))
+            self.in_flight += slots
+            self.requests += cost
+            delay = self._reserve(cost)
+        if delay > 0:
+            time.sleep(delay)
+        return slots
+    
+    def release(self, throttled=False, slots=1):
+        """Libera los huecos de concurrencia y ajusta tasa y concurrencia según el resultado."""
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - slots)
+            self.record(throttled)
+            self._condition.notify_all()
+    
+    def record(self, throttled=False):
+        """Aplica el ajuste AIMD tras una petición (sin tocar la concurrencia en vuelo)."""
+        with self._condition:
+            if throttled:
+                self.throttle_events += 1
+            if not self.adaptive:
+                return
+            
+            if throttled:
+                # Las peticiones que ya estaban en vuelo al recortar no vuelven a recortar
+                now = time.monotonic()
+                if self._last_decrease is not None and now - self._last_decrease < RATE_DECREASE_COOLDOWN:
+                    return
+                self._last_decrease = now
+                self.rate = max(MIN_REQUEST_RATE, self.rate * RATE_DECREASE_FACTOR)
+                self.concurrency = max(1, int(self.concurrency * RATE_DECREASE_FACTOR))
+                self.tokens = min(self.tokens, 0.0)
+                self._successes_in_window = 0
+                logger.warning(f"Rate limit detectado: tasa reducida a {self.rate:.2f} req/s, concurrencia {self.concurrency}")
+                return
+            
+            # Incremento aditivo: ~RATE_INCREASE_STEP req/s por cada segundo a plena tasa
+            self.rate = min(MAX_REQUEST_RATE, self.rate + RATE_INCREASE_STEP / self.rate)
+            self._successes_in_window += 1
+            if self._successes_in_window >= self.concurrency:
+                self.concurrency = min(MAX_CONCURRENCY, self.concurrency + 1)
+                self._successes_in_window = 0
+            self._condition.notify_all()
+    
+    def snapshot(self):
+        """Retorna la tasa a la que ha convergido el limitador y la tasa efectiva media."""
+        with self._condition:
+            elapsed = time.monotonic() - self._started
+            return {
+                "adaptive": self.adaptive,
+                "final_rate": round(self.rate, 3),
+                "final_concurrency": self.concurrency,
+                "effective_rate": round(self.requests / elapsed, 3) if elapsed > 0 else 0.0,
+                "requests": self.requests,
+                "throttle_events": self.throttle_events
+            }
 
 
 class StockDataLoader:
     """Clase para cargar datos históricos mensuales de acciones en TimescaleDB."""
     
-    def __init__(self):
-        """Inicializa el cargador de datos de acciones."""
+    def __init__(self, batch_download=BATCH_DOWNLOAD_MODE, write_mode=WRITE_MODE, pipeline=PIPELINE_MODE,
+                 adaptive_rate=ADAPTIVE_RATE_LIMIT, download_engine=DOWNLOAD_ENGINE,
+                 history_cache=HISTORY_CACHE_ENABLED, cache_dir=CACHE_DIR,
+                 run_journal=RUN_JOURNAL_ENABLED, resume=False, interval=DOWNLOAD_INTERVAL,
+                 provider=DATA_PROVIDER, provider_path=None, metrics_file=METRICS_FILE,
+                 metrics_port=METRICS_PORT, priority=PRIORITY_SCHEDULING, budget=LOAD_BUDGET,
+                 shard_run=None, db_url=None, symbols_file=SYMBOLS_FILE, negative_cache=NEGATIVE_CACHE_ENABLED,
+                 history_check_bars=HISTORY_CHECK_BARS):
+        """Inicializa el cargador de datos de acciones.
+
+        Args:
+            batch_download: Si es True, descarga los símbolos en grupos con
+                descargas multi-ticker en lugar de uno a uno (mismo número de
+                peticiones, lanzadas a ráfagas por grupo).
+            write_mode: Ruta de escritura en la base de datos, "upsert" o "copy".
+            pipeline: Si es True, los descargadores envían los datos a una cola
+                acotada que un escritor dedicado vuelca a la base de datos.
+            adaptive_rate: Si es True, el limitador compartido ajusta tasa y
+                concurrencia según las respuestas de Yahoo; si es False
+                mantiene la tasa inicial fija.
+            download_engine: "threads" (yfinance en un pool de hilos) o
+                "async" (motor asyncio de async_engine.py, siempre en modo pipeline).
+            history_cache: Si es True, se consulta la caché de históricos antes
+                de descargar y solo se pide a Yahoo el tramo que falta.
+            cache_dir: Directorio de la caché de históricos.
+            run_journal: Si es True, registra el estado de cada símbolo en el
+                diario de ejecución de la base de datos.
+            resume: Si es True, retoma la última ejecución sin terminar del
+                diario en lugar de planificar de nuevo.
+            interval: "1mo" para barras mensuales en stock_prices_monthly o
+                "1d" para barras diarias en stock_prices_daily, con sus
+                agregados continuos semanal y mensual.
+            provider: Origen de los históricos ("yahoo", "file" o "synthetic").
+            provider_path: Directorio de archivos del proveedor "file".
+            metrics_file: Archivo donde se escriben las métricas en formato
+                Prometheus cada METRICS_WRITE_SECONDS y al terminar.
+            metrics_port: Puerto en el que se sirven las métricas por HTTP
+                mientras dura la ejecución.
+            priority: Si es True, las tareas se ordenan por prioridad
+                (candidatos de la estrategia primero, luego antigüedad y
+                volumen) en lugar de alfabéticamente.
+            budget: Presupuesto de la ejecución en tiempo o en peticiones
+                (ver parse_budget). Con un presupuesto de tiempo no se lanzan
+                descargas nuevas una vez agotado; con uno de peticiones solo se
+                planifican las tareas más prioritarias que caben.
+            shard_run: Nombre de una carga repartida entre varios procesos:
+                el universo se procesa por shards reclamados en la tabla
+                loader_shards en lugar de en una sola pasada.
+            db_url: URL de SQLAlchemy alternativa a DB_CONFIG.
+            symbols_file: Archivo con un símbolo por línea.
+            negative_cache: Si es True, los símbolos que no devolvieron datos
+                se registran en symbol_negative_cache y la planificación los
+                omite hasta su próxima comprobación.
+            history_check_bars: Barras almacenadas que se vuelven a descargar
+                al actualizar un símbolo; si el proveedor las devuelve
+                distintas (split o dividendo) el símbolo se recarga completo
+                al final de la ejecución. 0 desactiva la comprobación.
+        """
+        if write_mode not in WRITE_MODES:
+            raise ValueError(f"Modo de escritura no válido: {write_mode}")
+        if download_engine not in DOWNLOAD_ENGINES:
+            raise ValueError(f"Motor de descarga no válido: {download_engine}")
+        if interval not in DOWNLOAD_INTERVALS:
+            raise ValueError(f"Intervalo de descarga no válido: {interval}")
+        if provider not in PROVIDERS:
+            raise ValueError(f"Proveedor de datos no válido: {provider}")
+        if download_engine == "async" and provider != "yahoo":
+            raise ValueError("El motor asíncrono solo está disponible con el proveedor yahoo")
+        if resume and not run_journal:
+            raise ValueError("La reanudación requiere el diario de ejecución")
+        if resume and shard_run:
+            raise ValueError("Una carga repartida se reanuda volviendo a lanzarla con el mismo nombre, sin --resume")
+        
+        self.batch_download = batch_download
+        self.priority = priority
+        self.budget = parse_budget(budget) if isinstance(budget, str) else budget
+        # Instante (time.monotonic) a partir del cual no se lanzan descargas nuevas
+        self.deadline = None
+        self._started = time.monotonic()
+        self.interval = interval
+        self.provider = create_provider(provider, provider_path)
+        self.price_model = PRICE_MODELS[interval]
+        self.price_table = self.price_model.__tablename__
+        self.write_mode = write_mode
+        self.download_engine = download_engine
+        # El motor asíncrono entrega sus resultados a la cola del escritor
+        self.pipeline = pipeline or download_engine == "async"
+        self._pipeline_lock = threading.Lock()
+        self.rate_limiter = AdaptiveRateLimiter(adaptive=adaptive_rate)
+        self.metrics = LoaderMetrics()
+        self.metrics_file = metrics_file
+        self.metrics_port = metrics_port
+        self.metrics.register_gauge("requests_in_flight", lambda: self.rate_limiter.in_flight)
+        self.metrics.register_gauge("request_rate", lambda: round(self.rate_limiter.rate, 3))
+        self.metrics.register_gauge("request_concurrency", lambda: self.rate_limiter.concurrency)
+        self.cache = HistoryCache(cache_dir) if history_cache else None
+        # Símbolo -> {'cached', 'requested_from'} de las descargas que deben pasar por la caché
+        self._cache_pending = {}
+        self.use_journal = run_journal
+        self.resume = resume
+        self.journal = None
+        # Símbolo -> motivo del último error de descarga, para el diario
+        self._download_errors = {}
+        self.use_negative_cache = negative_cache
+        self.negative_cache = None
+        # Símbolo -> clase de fallo cacheable (negative_cache.py) del último error de descarga
+        self._failure_classes = {}
+        # Símbolo -> última fecha almacenada, de la última planificación
+        self.last_dates = {}
+        self.history_check_bars = history_check_bars
+        # Símbolo -> {'from', 'until', 'checksum', 'last_date'} de las barras almacenadas que se comprueban
+        self._history_checks = {}
+        # Recargas completas pendientes de los símbolos cuyo histórico cambió
+        self._refetches = []
+        # Símbolos en recarga completa: al descargarse se borran las barras que el proveedor ya no devuelve
+        self._full_reloads = set()
+        self.db_url = db_url
         self.engine = None
         self.session_maker = None
+        self.symbols_file = Path(symbols_file)
         self.symbols = []
+        self.shard_run = shard_run
+        self.shards = None
+        # Símbolo -> symbols.symbol_id de los símbolos ya resueltos
+        self.symbol_ids = {}
+        self._symbol_ids_lock = threading.Lock()
         self.stats = {
             "total_symbols": 0,
+            "up_to_date_symbols": 0,
+            "negative_cached_symbols": 0,
+            "planned_downloads": 0,
             "successful_downloads": 0,
             "failed_downloads": 0,
+            "history_refetches": 0,
             "total_records": 0,
+            "rows_inserted": 0,
+            "rows_updated": 0,
+            "rows_unchanged": 0,
+            "write_mode": write_mode,
+            "db_write_seconds": 0.0,
+            "rows_per_second": 0.0,
+            "pipeline": {
+                "frames_queued": 0,
+                "max_queue_depth": 0,
+                "avg_queue_depth": 0.0,
+                "producer_wait_seconds": 0.0,
+                "writer_wait_seconds": 0.0,
+                "writer_busy_seconds": 0.0,
+                "flushes": 0
+            },
+            "rate_limiter": {},
+            "cache": {},
+            "negative_cache": {},
+            "run_id": None,
+            "resumed": False,
+            "schedule": {
+                "priority": priority,
+                "budget": self.budget,
+                "candidates": 0,
+                "scheduled": 0,
+                "deferred": 0,
+                "skipped_by_budget": 0
+            },
+            "shards": {},
             "start_time": datetime.now(),
             "end_time": None,
             "duration_seconds": 0
         }
     
-    def connect_db(self):
-        """Establece conexión con TimescaleDB."""
+    def connect_db(self, db_url=None):
+        """Establece conexión con TimescaleDB.
+        
+        Args:
+            db_url: URL de SQLAlchemy alternativa a DB_CONFIG. Con una base de
+                datos distinta de PostgreSQL (p. ej. el SQLite de
+                benchmark_loader.py) solo se crean las tablas, sin la
+                configuración de TimescaleDB.
+        """
         try:
             # Crear cadena de conexión
-            conn_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+            conn_string = db_url or self.db_url or default_db_url()
             
             # Crear engine SQLAlchemy
             self.engine = create_engine(conn_string)
@@ -120,37 +683,44 @@ class StockDataLoader:
             # Crear tablas si no existen
             Base.metadata.create_all(self.engine)
             
+            # Las tablas con la columna symbol en texto son del esquema anterior
+            price_columns = {column['name'] for column in inspect(self.engine).get_columns(self.price_table)}
+            if 'symbol_id' not in price_columns:
+                logger.error(f"La tabla {self.price_table} usa el esquema anterior (symbol en texto); "
+                             f"ejecute migrate_hypertable.py --interval {self.interval} antes de cargar")
+                return False
+            
+            if self.engine.dialect.name != "postgresql":
+                self.session_maker = sessionmaker(bind=self.engine)
+                logger.info(f"Conexión a {self.engine.dialect.name} establecida (sin TimescaleDB)")
+                return True
+            
             # Configurar TimescaleDB hypertable
             with self.engine.connect() as conn:
                 # Verificar si la extensión TimescaleDB está instalada
-                conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE;"))
-                conn.commit()
+                try:
+                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE;"))
+                    conn.commit()
+                    timescale = True
+                except SQLAlchemyError as e:
+                    # PostgreSQL sin la extensión (p. ej. un entorno de desarrollo): tablas normales
+                    logger.warning(f"TimescaleDB no disponible, se usarán tablas PostgreSQL normales: {e}")
+                    conn.rollback()
+                    timescale = False
                 
                 # Crear la tabla si no existe (no borrar los datos existentes)
                 Base.metadata.create_all(self.engine)
                 
-                # Verificar si la tabla es una hypertable y convertirla si no lo es
-                try:
-                    conn.execute(text("""
-                        SELECT create_hypertable('stock_prices_monthly', 'date', 
-                                                if_not_exists => TRUE);
-                    """))
-                    conn.commit()  # Confirmar la creación de la hypertable
-                except SQLAlchemyError as e:
-                    logger.warning(f"Error al crear hypertable: {e}")
-                    conn.rollback()  # Revertir en caso de error
-                
-                # Crear índices para mejorar rendimiento
-                try:
-                    conn.execute(text(
-                        "CREATE INDEX IF NOT EXISTS idx_stock_symbol ON stock_prices_monthly (symbol);"
-                    ))
-                    conn.commit()  # Confirmar la creación de índices
-                except SQLAlchemyError as e:
-                    logger.warning(f"Error al crear índice: {e}")
-                    conn.rollback()  # Revertir en caso de error
+                # Convertir la tabla en hypertable si no lo es y configurar chunks y compresión
+                if timescale:
+                    configure_hypertable(conn, self.price_table, self.interval)
                 
+                # La clave primaria (symbol_id, date) ya sirve las consultas por símbolo:
+                # no se crea un índice aparte sobre symbol_id
                 conn.commit()
+                
+                if timescale and self.interval == "1d":
+                    self.create_daily_rollups(conn)
             
             # Crear session maker
             self.session_maker = sessionmaker(bind=self.engine)
@@ -161,15 +731,62 @@ class StockDataLoader:
             logger.error(f"Error al conectar con TimescaleDB: {e}")
             return False
     
+    def create_daily_rollups(self, conn):
+        """Crea los agregados continuos semanal y mensual sobre stock_prices_daily.
+        
+        Las vistas se materializan de forma incremental: TimescaleDB solo
+        recalcula los buckets con cambios, y la política mantiene al día los
+        últimos ROLLUP_REFRESH_START aunque no se ejecute el cargador.
+        """
+        for view, bucket in DAILY_ROLLUPS.items():
+            try:
+                conn.execute(text(f"""
+                    CREATE MATERIALIZED VIEW IF NOT EXISTS {view}
+                    WITH (timescaledb.continuous) AS
+                    SELECT symbol_id,
+                           time_bucket(INTERVAL '{bucket}', date) AS date,
+                           first(open, date) AS open,
+                           max(high) AS high,
+                           min(low) AS low,
+                           last(close, date) AS close,
+                           sum(volume) AS volume
+                    FROM {self.price_table}
+                    GROUP BY symbol_id, time_bucket(INTERVAL '{bucket}', date)
+                    WITH NO DATA;
+                """))
+                conn.execute(text(f"""
+                    SELECT add_continuous_aggregate_policy('{view}',
+                        start_offset => INTERVAL '{ROLLUP_REFRESH_START}',
+                        end_offset => INTERVAL '1 day',
+                        schedule_interval => INTERVAL '1 day',
+                        if_not_exists => TRUE);
+                """))
+                conn.commit()
+            except SQLAlchemyError as e:
+                logger.warning(f"Error al crear el agregado continuo {view}: {e}")
+                conn.rollback()
+    
+    def refresh_daily_rollups(self):
+        """Materializa en los agregados continuos los buckets modificados por la carga."""
+        # refresh_continuous_aggregate no puede ejecutarse dentro de una transacción
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for view in DAILY_ROLLUPS:
+                try:
+                    refresh_start = time.perf_counter()
+                    conn.execute(text(f"CALL refresh_continuous_aggregate('{view}', NULL, NULL);"))
+                    logger.info(f"Agregado {view} actualizado en {time.perf_counter() - refresh_start:.1f}s")
+                except SQLAlchemyError as e:
+                    logger.warning(f"Error al actualizar el agregado continuo {view}: {e}")
+    
     def load_symbols(self):
         """Carga los símbolos desde el archivo generado por symbol_fetcher."""
         try:
-            if not SYMBOLS_FILE.exists():
-                logger.error(f"Archivo de símbolos no encontrado: {SYMBOLS_FILE}")
+            if not self.symbols_file.exists():
+                logger.error(f"Archivo de símbolos no encontrado: {self.symbols_file}")
                 return False
             
             # Leer símbolos del archivo de texto
-            with open(SYMBOLS_FILE, "r") as f:
+            with open(self.symbols_file, "r") as f:
                 self.symbols = [line.strip() for line in f if line.strip()]
                 
             # Si estamos en modo prueba, limitamos a un pequeño conjunto de símbolos
@@ -177,76 +794,177 @@ class StockDataLoader:
                 self.symbols = self.symbols[:TEST_SYMBOLS_COUNT]
             
             self.stats["total_symbols"] = len(self.symbols)
-            logger.info(f"Cargados {len(self.symbols)} símbolos desde {SYMBOLS_FILE}")
+            logger.info(f"Cargados {len(self.symbols)} símbolos desde {self.symbols_file}")
             return True
         
         except Exception as e:
             logger.error(f"Error al cargar símbolos: {e}")
             return False
     
-    @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_exponential(multiplier=1, min=4, max=60))
-    def download_stock_data(self, symbol):
-        """Descarga datos históricos mensuales para un símbolo."""
+    @retry(stop=stop_after_attempt(RETRY_ATTEMPTS), wait=wait_exponential(multiplier=1, min=4, max=60),
+           before_sleep=_record_retry, retry_error_callback=_give_up_download)
+    def download_stock_data(self, symbol, start_date=None):
+        """Descarga datos históricos mensuales para un símbolo.
+
+        Si no se indica ``start_date`` se consulta la base de datos para
+        decidir desde qué fecha descargar. Con la caché activa, el resultado
+        incluye también las barras cacheadas que faltan en la base de datos.
+        Los errores transitorios (rate limit, timeout, conexión) se reintentan
+        hasta RETRY_ATTEMPTS veces.
+        """
+        download_start = time.perf_counter()
+        symbol, df = self.fetch_history(symbol, start_date)
+        return symbol, self.complete_download(symbol, df, time.perf_counter() - download_start)
+    
+    def fetch_history(self, symbol, start_date=None):
+        """Pide al proveedor el histórico de un símbolo. Retorna (símbolo, DataFrame o None).
+        
+        Los errores transitorios (classify_failure retorna None) se propagan
+        para que download_stock_data los reintente; el resto se registran y
+        retornan None.
+        """
         try:
-            # Obtener la última fecha disponible para este símbolo y si necesita actualización
-            date_info = self.get_last_date_for_symbol(symbol)
-            
-            # Si no necesita actualización, salir rápidamente
-            if not date_info['need_update']:
-                # Ya está registrado el log en get_last_date_for_symbol
-                return symbol, None
-            
-            # Obtener la fecha de inicio para la descarga
-            start_date = date_info['start_date']
-            
-            # Añadir sleep para evitar rate limits
-            time.sleep(REQUEST_DELAY)
-            
-            # Obtener ticker de Yahoo Finance
-            ticker = yf.Ticker(symbol)
+            if start_date is None:
+                # Obtener la última fecha disponible para este símbolo y si necesita actualización
+                with self.metrics.timer("freshness_check"):
+                    date_info = self.get_last_date_for_symbol(symbol)
+                
+                # Si no necesita actualización, salir rápidamente
+                if not date_info['need_update']:
+                    # Ya está registrado el log en get_last_date_for_symbol
+                    return symbol, None
+                
+                # Obtener la fecha de inicio para la descarga
+                start_date = date_info['start_date']
             
-            # Descargar datos mensuales desde la fecha de inicio 
-            df = ticker.history(start=start_date, interval="1mo")
+            # Esperar turno en el limitador compartido para evitar rate limits
+            if self.provider.rate_limited:
+                with self.metrics.timer("rate_limit_wait"):
+                    self.rate_limiter.acquire()
+            throttled = False
+            self.metrics.inc("http_requests")
+            try:
+                # Descargar datos desde la fecha de inicio
+                with self.metrics.timer("http"):
+                    df = self.provider.fetch_history(symbol, start_date, self.interval)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self.metrics.inc("throttled" if throttled else "http_errors")
+                raise
+            finally:
+                if self.provider.rate_limited:
+                    self.rate_limiter.release(throttled=throttled)
             
             # Verificar si hay datos
-            if df.empty:
+            if df is None or df.empty:
                 logger.warning(f"No se encontraron datos para {symbol}")
                 return symbol, None
             
             # Depuración: mostrar columnas disponibles
             logger.info(f"Columnas disponibles para {symbol}: {list(df.columns)}")
             
-            # Resetear el índice para tener la fecha como columna
-            df = df.reset_index()
-            
-            # Añadir columna de símbolo
-            df['Symbol'] = symbol
-            
-            # Renombrar columnas directamente (simplificado)
-            df = df.rename(columns={
-                'Date': 'date',
-                'Open': 'open',
-                'High': 'high',
-                'Low': 'low',
-                'Close': 'close',
-                'Volume': 'volume',
-                'Symbol': 'symbol'
-            })
-            
-            # Seleccionar y ordenar columnas relevantes
-            columns = ['symbol', 'date', 'open', 'high', 'low', 'close', 'volume']
-            df = df[columns].copy()
-            
-            # Ordenar por fecha
-            df = df.sort_values('date')
+            with self.metrics.timer("transform"):
+                df = self.format_history(symbol, df)
             
             logger.debug(f"Descargados {len(df)} registros para {symbol}")
             return symbol, df
         
         except Exception as e:
+            failure_class = classify_failure(e)
+            if failure_class is None:
+                logger.warning(f"Error transitorio descargando datos para {symbol}: {e}")
+                raise
             logger.error(f"Error descargando datos para {symbol}: {e}")
+            self._download_errors[symbol] = str(e)
+            self._failure_classes[symbol] = failure_class
             return symbol, None
     
+    @staticmethod
+    def format_history(symbol, df):
+        """Convierte un histórico en formato Ticker.history al formato de las tablas de precios.
+        
+        El resultado se construye directamente a partir de las columnas del
+        histórico (índice Date y columnas Open, High, Low, Close y Volume), sin
+        copias intermedias, y solo se ordena si las fechas no vienen ordenadas.
+        """
+        formatted = pd.DataFrame({
+            'symbol': symbol,
+            'date': df.index,
+            'open': df['Open'].to_numpy(),
+            'high': df['High'].to_numpy(),
+            'low': df['Low'].to_numpy(),
+            'close': df['Close'].to_numpy(),
+            'volume': df['Volume'].to_numpy()
+        })
+        
+        # Ordenar por fecha
+        if not formatted['date'].is_monotonic_increasing:
+            formatted = formatted.sort_values('date')
+        return formatted
+    
+    def download_group(self, symbols, start_date):
+        """Descarga varios símbolos con la misma fecha de inicio en una descarga multi-ticker.
+        
+        Retorna un diccionario símbolo -> DataFrame solo con los símbolos que
+        devolvieron datos; los ausentes deben reintentarse individualmente.
+        """
+        # El grupo consume un token por cada petición que hace el proveedor y un
+        # hueco de concurrencia por cada petición que lanza en paralelo
+        requests = self.provider.group_requests(symbols)
+        threads = self.rate_limiter.concurrency
+        if self.provider.rate_limited:
+            with self.metrics.timer("rate_limit_wait"):
+                threads = self.rate_limiter.acquire(cost=requests, slots=requests)
+        throttled = False
+        self.metrics.inc("http_group_requests")
+        self.metrics.inc("http_requests", requests)
+        
+        try:
+            with self.metrics.timer("http_group"):
+                frames = self.provider.fetch_group(symbols, start_date, self.interval, threads=threads)
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            self.metrics.inc("throttled" if throttled else "http_errors")
+            logger.error(f"Error en descarga multi-ticker de {len(symbols)} símbolos: {e}")
+            return {}
+        finally:
+            if self.provider.rate_limited:
+                self.rate_limiter.release(throttled=throttled, slots=threads)
+        
+        with self.metrics.timer("transform"):
+            return {symbol: self.format_history(symbol, df) for symbol, df in frames.items()}
+    
+    def download_batch(self, tasks):
+        """Descarga una lista de tareas de plan_downloads agrupándolas por fecha de inicio.
+        
+        Los símbolos que fallan en la descarga multi-ticker se reintentan con
+        download_stock_data. Genera tuplas (símbolo, DataFrame o None) a medida
+        que termina cada grupo, para que el llamador pueda escribirlas y
+        liberarlas sin esperar al resto del lote.
+        """
+        groups = {}
+        
+        # Agrupar por fecha de inicio: cada grupo puede pedirse en una sola petición
+        for task in tasks:
+            groups.setdefault(task['start_date'], []).append(task['symbol'])
+        
+        for start_date, group in groups.items():
+            for i in range(0, len(group), DOWNLOAD_GROUP_SIZE):
+                chunk = group[i:i+DOWNLOAD_GROUP_SIZE]
+                group_start = time.perf_counter()
+                frames = self.download_group(chunk, start_date)
+                group_seconds = time.perf_counter() - group_start
+                logger.info(f"Descarga multi-ticker desde {start_date}: {len(frames)}/{len(chunk)} símbolos con datos")
+                
+                for symbol in chunk:
+                    if symbol in frames:
+                        yield symbol, self.complete_download(symbol, frames.pop(symbol), group_seconds)
+                    else:
+                        # Fallback a la descarga individual para los que fallaron
+                        logger.info(f"Reintentando {symbol} con descarga individual")
+                        self.metrics.inc("group_fallbacks")
+                        yield self.download_stock_data(symbol, start_date)
+    
     def get_last_date_for_symbol(self, symbol):
         """Obtiene la última fecha disponible para un símbolo.
         
@@ -260,33 +978,21 @@ class StockDataLoader:
             session = self.session_maker()
             
             # Consultar la última fecha para este símbolo
-            result = session.query(func.max(StockPrice.date))\
-                    .filter(StockPrice.symbol == symbol)\
+            result = session.query(func.max(self.price_model.date))\
+                    .join(Symbol, Symbol.symbol_id == self.price_model.symbol_id)\
+                    .filter(Symbol.symbol == symbol)\
                     .scalar()
             
-            # Verificar si ya tenemos datos actualizados (hasta el mes actual o el anterior)
-            current_date = datetime.now()
-            current_month_start = datetime(current_date.year, current_date.month, 1)
-            previous_month = current_date.month - 1 if current_date.month > 1 else 12
-            previous_year = current_date.year if current_date.month > 1 else current_date.year - 1
-            previous_month_start = datetime(previous_year, previous_month, 1)
-            
-            # Si hay datos, verificar si están actualizados
-            if result:
-                # Si los datos son del mes actual o anterior, están actualizados
-                if ((result.year == current_date.year and result.month == current_date.month) or
-                    (result.year == previous_year and result.month == previous_month)):
-                    logger.info(f"Datos para {symbol} ya actualizados hasta {result.strftime('%Y-%m-%d')}, no es necesario descargar")
-                    return {'need_update': False, 'start_date': None, 'last_date': result}
-                else:
-                    # Si no están actualizados, descargar desde el mes siguiente al último dato
-                    next_date = result + relativedelta(months=1)
-                    logger.info(f"Datos existentes para {symbol} hasta {result}, continuando desde {next_date}")
-                    return {'need_update': True, 'start_date': next_date, 'last_date': result}
+            date_info = get_download_window(result, interval=self.interval)
+            
+            if not date_info['need_update']:
+                logger.info(f"Datos para {symbol} ya actualizados hasta {result.strftime('%Y-%m-%d')}, no es necesario descargar")
+            elif result:
+                logger.info(f"Datos existentes para {symbol} hasta {result}, continuando desde {date_info['start_date']}")
             else:
-                # Si no hay datos previos, descargar desde el inicio
                 logger.info(f"No hay datos previos para {symbol}, descargando desde el inicio")
-                return {'need_update': True, 'start_date': DEFAULT_START_DATE, 'last_date': None}
+            
+            return date_info
                 
         except Exception as e:
             logger.error(f"Error al obtener la última fecha para {symbol}: {e}")
@@ -294,94 +1000,719 @@ class StockDataLoader:
         finally:
             session.close()
     
+    def load_last_dates(self, symbols=None):
+        """Obtiene la última fecha almacenada de todos los símbolos con una sola consulta agrupada.
+        
+        Con ``symbols`` (los de un shard) la consulta se limita a esos símbolos.
+        """
+        session = self.session_maker()
+        try:
+            freshness_start = time.perf_counter()
+            last_dates = session.query(self.price_model.symbol_id, func.max(self.price_model.date).label('last_date'))
+            if symbols is not None:
+                last_dates = last_dates.filter(self.price_model.symbol_id.in_(
+                    select(Symbol.symbol_id).where(Symbol.symbol.in_(symbols))))
+            last_dates = last_dates.group_by(self.price_model.symbol_id).subquery()
+            rows = session.query(Symbol.symbol, last_dates.c.last_date)\
+                    .join(last_dates, last_dates.c.symbol_id == Symbol.symbol_id)\
+                    .all()
+            self.metrics.observe("freshness_check", time.perf_counter() - freshness_start)
+            return {symbol: last_date for symbol, last_date in rows}
+        finally:
+            session.close()
+    
+    def resolve_symbol_ids(self, symbols):
+        """Retorna el id de cada símbolo, dando de alta en la tabla symbols los que no existen.
+        
+        Los ids se guardan en memoria: cada símbolo se consulta en la DB una
+        sola vez por ejecución.
+        """
+        with self._symbol_ids_lock:
+            missing = [symbol for symbol in symbols if symbol not in self.symbol_ids]
+            if missing:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        text("INSERT INTO symbols (symbol) VALUES (:symbol) ON CONFLICT (symbol) DO NOTHING"),
+                        [{'symbol': symbol} for symbol in missing]
+                    )
+                    rows = conn.execute(
+                        text("SELECT symbol, symbol_id FROM symbols WHERE symbol IN :symbols")
+                        .bindparams(bindparam('symbols', expanding=True)),
+                        {'symbols': missing}
+                    )
+                    self.symbol_ids.update({symbol: symbol_id for symbol, symbol_id in rows})
+            return {symbol: self.symbol_ids[symbol] for symbol in symbols}
+    
+    def plan_downloads(self, symbols=None):
+        """Genera la lista de trabajo de la ejecución antes de descargar nada.
+        
+        Carga la última fecha de todo el universo con una única consulta,
+        descarta los símbolos que ya están al día y los de la caché negativa
+        cuya próxima comprobación no ha llegado, y retorna una lista de
+        tareas {'symbol', 'start_date', 'last_date'} con la fecha de inicio
+        ya calculada. La fecha de inicio incluye las últimas
+        history_check_bars barras almacenadas, cuya suma de control se carga
+        para comprobarlas al terminar la descarga.
+        """
+        symbols = self.symbols if symbols is None else symbols
+        
+        try:
+            # En una carga repartida se planifica cada shard: solo se consultan sus símbolos
+            last_dates = self.load_last_dates(symbols if self.shards is not None else None)
+        except Exception as e:
+            # Mismo comportamiento que get_last_date_for_symbol: descargar desde el inicio
+            logger.error(f"Error al obtener las últimas fechas de los símbolos: {e}")
+            last_dates = {}
+        self.last_dates = last_dates
+        
+        tasks = []
+        up_to_date = 0
+        negative_cached = 0
+        current_date = datetime.now()
+        if self.negative_cache is not None:
+            try:
+                symbols, skipped = self.negative_cache.filter(symbols, current_date)
+                negative_cached = len(skipped)
+            except Exception as e:
+                logger.error(f"Error al consultar la caché negativa, se planifican todos los símbolos: {e}")
+        
+        check_windows = {}
+        self._history_checks = {}
+        for symbol in symbols:
+            date_info = get_download_window(last_dates.get(symbol), current_date, self.interval)
+            if not date_info['need_update']:
+                up_to_date += 1
+                continue
+            task = {
+                'symbol': symbol,
+                'start_date': date_info['start_date'],
+                'last_date': date_info['last_date']
+            }
+            window = get_history_check_window(date_info['last_date'], self.interval, self.history_check_bars)
+            if window is not None:
+                # Volver a pedir las últimas barras almacenadas para detectar un histórico reajustado
+                task['start_date'] = window[0]
+                check_windows[symbol] = window
+            tasks.append(task)
+        
+        if check_windows:
+            self.load_history_checks(check_windows)
+        
+        # Acumulados: en una carga repartida se planifica una vez por shard
+        self.stats["up_to_date_symbols"] += up_to_date
+        self.stats["negative_cached_symbols"] += negative_cached
+        self.stats["planned_downloads"] += len(tasks)
+        self.metrics.inc("negative_cache_skips", negative_cached)
+        logger.info(f"Planificación: {len(tasks)} símbolos por descargar, {up_to_date} ya actualizados, "
+                    f"{negative_cached} sin datos pendientes de recomprobación")
+        return tasks
+    
+    def load_history_checks(self, windows):
+        """Calcula la suma de control de las barras almacenadas en la ventana de comprobación de cada símbolo.
+        
+        Los símbolos se agrupan por ventana (con barras mensuales casi todos
+        comparten la misma) y se lanza una consulta por grupo. Los símbolos
+        sin barras en su ventana no se comprueban.
+        """
+        groups = {}
+        for symbol, window in windows.items():
+            groups.setdefault(window, []).append(symbol)
+        
+        stored = {}
+        try:
+            with self.metrics.timer("history_check"), self.engine.connect() as conn:
+                for (check_from, check_until), symbols in groups.items():
+                    rows = conn.execute(
+                        text(f"""
+                            SELECT s.symbol, p.date, p.close
+                            FROM {self.price_table} p
+                            JOIN symbols s ON s.symbol_id = p.symbol_id
+                            WHERE s.symbol IN :symbols AND p.date >= :check_from AND p.date < :check_until
+                            ORDER BY s.symbol, p.date
+                        """).bindparams(bindparam('symbols', expanding=True)),
+                        {'symbols': symbols, 'check_from': check_from, 'check_until': check_until}
+                    )
+                    for symbol, date, close in rows:
+                        dates, closes = stored.setdefault(symbol, ([], []))
+                        dates.append(date)
+                        closes.append(close)
+        except Exception as e:
+            # Sin sumas de control la carga sigue como antes, solo sin detectar reajustes
+            logger.warning(f"No se pudieron cargar las barras de comprobación del histórico: {e}")
+            return
+        
+        for symbol, (dates, closes) in stored.items():
+            check_from, check_until = windows[symbol]
+            self._history_checks[symbol] = {
+                'from': check_from,
+                'until': check_until,
+                'checksum': history_checksum(dates, closes)
+            }
+    
+    def history_changed(self, symbol, df):
+        """Compara las barras descargadas en la ventana de comprobación con las almacenadas.
+        
+        Retorna True si el proveedor ha reajustado el histórico del símbolo
+        (split o dividendo). Si la descarga no incluye barras de la ventana no
+        hay nada que comparar y se retorna False.
+        """
+        check = self._history_checks.pop(symbol, None)
+        if check is None:
+            return False
+        dates = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)
+        window = (dates >= check['from']) & (dates < check['until'])
+        if not window.any():
+            return False
+        return history_checksum(dates[window], df['close'][window]) != check['checksum']
+    
+    def take_refetches(self):
+        """Retorna y vacía las recargas completas pendientes."""
+        with self._pipeline_lock:
+            refetches, self._refetches = self._refetches, []
+        return refetches
+    
+    def load_priority_inputs(self, symbols=None):
+        """Retorna los candidatos válidos del analizador y el volumen negociado de la última barra de cada símbolo.
+        
+        Con ``symbols`` (las tareas de un shard) ambas consultas se limitan a esos símbolos.
+        """
+        params = {"valid": True}
+        candidate_filter = volume_filter = ""
+        if symbols is not None:
+            params["symbols"] = list(symbols)
+            candidate_filter = "AND symbol IN :symbols"
+            volume_filter = "WHERE symbol_id IN (SELECT symbol_id FROM symbols WHERE symbol IN :symbols)"
+        
+        def query(sql):
+            statement = text(sql)
+            if symbols is not None:
+                statement = statement.bindparams(bindparam('symbols', type_=String, expanding=True))
+            return statement
+        
+        with self.engine.connect() as conn:
+            candidates = set()
+            if inspect(conn).has_table('strategy_candidates'):
+                rows = conn.execute(query(f"SELECT symbol FROM strategy_candidates WHERE is_valid = :valid {candidate_filter}"),
+                                    params)
+                candidates = {row[0] for row in rows}
+            
+            rows = conn.execute(query(f"""
+                SELECT s.symbol, p.close * p.volume
+                FROM {self.price_table} p
+                JOIN (
+                    SELECT symbol_id, MAX(date) AS date
+                    FROM {self.price_table}
+                    {volume_filter}
+                    GROUP BY symbol_id
+                ) l ON l.symbol_id = p.symbol_id AND l.date = p.date
+                JOIN symbols s ON s.symbol_id = p.symbol_id
+            """), params)
+            volumes = {symbol: dollar_volume for symbol, dollar_volume in rows}
+        return candidates, volumes
+    
+    def schedule_tasks(self, tasks):
+        """Ordena las tareas por prioridad y aplica el presupuesto de peticiones.
+        
+        Los candidatos válidos de la estrategia van siempre primero, de modo
+        que se mantienen al día aunque el universo completo no quepa en el
+        presupuesto; el resto se ordena por priority_score. Con un presupuesto
+        de peticiones (un token del limitador por símbolo) las tareas que no
+        caben quedan para la siguiente ejecución. Los contadores se acumulan
+        entre llamadas, de modo que en una carga repartida el presupuesto es
+        el de todo el proceso y no el de cada shard.
+        """
+        schedule_stats = self.stats["schedule"]
+        
+        if self.priority:
+            try:
+                # En una carga repartida solo se consultan los símbolos de las tareas del shard
+                candidates, volumes = self.load_priority_inputs(
+                    [task['symbol'] for task in tasks] if self.shards is not None else None)
+            except Exception as e:
+                logger.warning(f"No se pudieron cargar los datos de prioridad, se usa solo la antigüedad: {e}")
+                candidates, volumes = set(), {}
+            
+            current_date = datetime.now()
+            tasks = sorted(tasks, key=lambda task: (
+                task['symbol'] not in candidates,
+                -priority_score(task['last_date'], volumes.get(task['symbol']), current_date, self.interval),
+                task['symbol']
+            ))
+            schedule_stats["candidates"] += sum(1 for task in tasks if task['symbol'] in candidates)
+        
+        if self.budget is not None and "requests" in self.budget:
+            remaining = max(0, self.budget["requests"] - schedule_stats["scheduled"])
+            deferred = max(0, len(tasks) - remaining)
+            tasks = tasks[:remaining]
+            schedule_stats["deferred"] += deferred
+            if deferred:
+                logger.info(f"Presupuesto de {self.budget['requests']} peticiones: "
+                            f"{deferred} símbolos quedan para la siguiente ejecución")
+        
+        schedule_stats["scheduled"] += len(tasks)
+        return tasks
+    
+    def budget_exhausted(self):
+        """Indica si se agotó el presupuesto de tiempo de la ejecución."""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+    
+    def budget_spent(self):
+        """Indica si se agotó el presupuesto de tiempo o de peticiones (no se deben planificar más tareas)."""
+        if self.budget is not None and "requests" in self.budget:
+            return self.stats["schedule"]["scheduled"] >= self.budget["requests"]
+        return self.budget_exhausted()
+    
+    def skip_for_budget(self, count):
+        """Registra las tareas que no se lanzan por agotarse el presupuesto de tiempo."""
+        with self._pipeline_lock:
+            self.stats["schedule"]["skipped_by_budget"] += count
+    
+    def resolve_from_cache(self, tasks):
+        """Resuelve las tareas planificadas con la caché de históricos.
+        
+        - Acierto completo: la caché cubre el hueco y está al día; sus barras
+          se escriben directamente en la base de datos sin ninguna petición.
+        - Acierto parcial: la caché cubre el hueco pero no está al día; la
+          tarea se reduce a descargar desde la última barra cacheada.
+        - Fallo: la tarea no cambia.
+        
+        Retorna las tareas que siguen necesitando descarga.
+        """
+        remaining = []
+        cached_frames = []
+        current_date = datetime.now()
+        
+        for task in tasks:
+            symbol = task['symbol']
+            entry = self.cache.coverage(symbol, self.interval)
+            pending = {'cached': None, 'requested_from': task['start_date']}
+            
+            # La entrada solo sirve si se descargó desde la fecha que necesita la tarea
+            covered = entry is not None and pd.Timestamp(entry['requested_from']) <= pd.Timestamp(task['start_date'])
+            cached = self.cache.get(symbol, self.interval, after=task['last_date']) if covered else None
+            if cached is None:
+                self.cache.stats["misses"] += 1
+                self._cache_pending[symbol] = pending
+                remaining.append(task)
+                continue
+            
+            cache_last = pd.Timestamp(entry['last_date'])
+            cache_last_utc = cache_last.tz_convert('UTC').tz_localize(None).to_pydatetime()
+            if not get_download_window(cache_last_utc, current_date, self.interval)['need_update']:
+                self.cache.stats["hits"] += 1
+                if not cached.empty:
+                    cached_frames.append(cached)
+                continue
+            
+            # Volver a pedir la última barra cacheada, que puede ser un mes incompleto
+            self.cache.stats["partial_hits"] += 1
+            pending['cached'] = cached
+            self._cache_pending[symbol] = pending
+            remaining.append(dict(task, start_date=cache_last.tz_localize(None).to_pydatetime()))
+        
+        logger.info(
+            f"Caché de históricos: {self.cache.stats['hits']} aciertos, "
+            f"{self.cache.stats['partial_hits']} parciales, {self.cache.stats['misses']} fallos"
+        )
+        self.write_frames(cached_frames)
+        return remaining
+    
+    def complete_download(self, symbol, df, seconds=None):
+        """Cierra la descarga de un símbolo: la registra en el diario, la guarda
+        en la caché y la une con su tramo cacheado.
+        
+        Todas las rutas de descarga (individual, multi-ticker y asíncrona)
+        pasan por aquí con el resultado final y su duración en segundos.
+        Si el histórico almacenado del símbolo ha cambiado, la descarga se
+        descarta (retorna None) y el símbolo queda en cola para una recarga
+        completa, también en el diario.
+        """
+        if df is not None and not df.empty and self.history_changed(symbol, df):
+            logger.info(f"El histórico ajustado de {symbol} ha cambiado (split o dividendo): "
+                        f"se recargará completo al final de la ejecución")
+            self.metrics.inc("history_changes")
+            self._cache_pending.pop(symbol, None)
+            with self._pipeline_lock:
+                self._refetches.append({
+                    'symbol': symbol,
+                    'start_date': DEFAULT_START_DATE,
+                    'last_date': self.last_dates.get(symbol)
+                })
+            if self.journal is not None:
+                # Con la fecha de la recarga: si la ejecución se interrumpe, se reanuda completa
+                self.journal.mark_failed(symbol, "histórico reajustado, recarga completa pendiente",
+                                         permanent=False, seconds=seconds, start_date=DEFAULT_START_DATE)
+            return None
+        
+        if df is not None and not df.empty and symbol in self._full_reloads:
+            self.delete_vanished_bars(symbol, df)
+        
+        if df is not None and not df.empty:
+            self.metrics.inc("symbols_downloaded")
+            self.metrics.inc("rows_downloaded", len(df))
+        else:
+            self.metrics.inc("symbols_failed")
+        
+        error = self._download_errors.pop(symbol, None)
+        failure_class = self._failure_classes.pop(symbol, None)
+        if self.negative_cache is not None:
+            if df is not None and not df.empty:
+                self.negative_cache.record_success(symbol)
+            elif error is None or failure_class is not None:
+                # Sin error, el proveedor respondió sin barras; los errores transitorios no se cachean
+                if self.negative_cache.record_failure(symbol, failure_class or FAILURE_EMPTY, error or "sin datos",
+                                                      last_date=self.last_dates.get(symbol)):
+                    self.metrics.inc("negative_cache_records")
+        
+        if self.journal is not None:
+            if df is not None and not df.empty:
+                self.journal.mark_downloaded(symbol, len(df), seconds)
+            elif error is not None:
+                self.journal.mark_failed(symbol, error, permanent=False, seconds=seconds)
+            else:
+                # El proveedor respondió sin datos: símbolo deslistado o inexistente
+                self.journal.mark_failed(symbol, "sin datos", permanent=True, seconds=seconds)
+        
+        pending = self._cache_pending.pop(symbol, None)
+        if pending is None:
+            return df
+        
+        if df is not None and not df.empty:
+            self.cache.put(symbol, self.interval, df, requested_from=pending['requested_from'])
+        
+        cached = pending['cached']
+        if cached is None or cached.empty:
+            return df
+        if df is None or df.empty:
+            # Si la descarga falla, al menos se escribe lo que ya estaba en caché
+            return cached
+        
+        combined = pd.concat([cached, df], ignore_index=True)
+        return combined.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+    
+    def start_full_reloads(self, tasks):
+        """Registra las tareas de recarga completa de símbolos con barras almacenadas.
+        
+        Son las recargas de históricos reajustados, también las reanudadas
+        desde el diario (desde DEFAULT_START_DATE con una última fecha
+        conocida). No pasan por la caché, cuyas barras son las del ajuste
+        anterior. Retorna las tareas que no son recargas completas.
+        """
+        remaining = []
+        for task in tasks:
+            if task['last_date'] is None or pd.Timestamp(task['start_date']) != pd.Timestamp(DEFAULT_START_DATE):
+                remaining.append(task)
+                continue
+            self._full_reloads.add(task['symbol'])
+            if self.cache is not None:
+                self._cache_pending[task['symbol']] = {'cached': None, 'requested_from': task['start_date']}
+        return remaining
+    
+    def delete_vanished_bars(self, symbol, df):
+        """Borra las barras almacenadas de un símbolo recargado completo que no están en la descarga.
+        
+        La escritura es un upsert: sin este borrado, las barras que el
+        proveedor ya no devuelve (fechas reajustadas o eliminadas) quedarían
+        en la base de datos con los precios del ajuste anterior.
+        """
+        self._full_reloads.discard(symbol)
+        dates = _datetime_column(pd.to_datetime(df['date'], utc=True).dt.tz_localize(None))
+        try:
+            symbol_id = self.resolve_symbol_ids([symbol])[symbol]
+            with self.engine.begin() as conn:
+                deleted = conn.execute(
+                    text(f"DELETE FROM {self.price_table} WHERE symbol_id = :symbol_id AND date NOT IN :dates")
+                    .bindparams(bindparam('dates', type_=DateTime, expanding=True)),
+                    {'symbol_id': symbol_id, 'dates': dates}
+                ).rowcount
+        except Exception as e:
+            logger.error(f"Error borrando las barras obsoletas de {symbol}: {e}")
+            return
+        if deleted:
+            logger.info(f"Borradas {deleted} barras de {symbol} que el proveedor ya no devuelve")
+            self.metrics.inc("rows_deleted", deleted)
+    
+    def write_frames(self, frames):
+        """Escribe una secuencia de DataFrames en volcados de WRITER_FLUSH_ROWS filas."""
+        buffer = BarBuffer(WRITER_FLUSH_ROWS)
+        for df in frames:
+            buffer.extend(df, self.flush_buffer)
+        if len(buffer):
+            self.flush_buffer(buffer)
+    
+    def flush_buffer(self, buffer):
+        """Escribe y vacía un buffer de barras acumulando las filas guardadas."""
+        self.stats["total_records"] += self.save_buffer(buffer)
+    
+    def rebuild_from_cache(self):
+        """Reconstruye la base de datos con todos los históricos de la caché, sin acceder a la red."""
+        symbols = 0
+        
+        def frames():
+            nonlocal symbols
+            for symbol, df in self.cache.iter_entries(self.interval):
+                symbols += 1
+                yield df
+        
+        logger.info(f"Reconstruyendo la base de datos desde la caché {self.cache.root}")
+        self.write_frames(frames())
+        self.stats["total_symbols"] = symbols
+        logger.info(f"Reconstrucción completada: {symbols} símbolos, {self.stats['total_records']} registros")
+    
     def save_to_db(self, dataframes):
-        """Guarda los datos en la base de datos TimescaleDB."""
+        """Guarda una lista de DataFrames en la base de datos en un único volcado."""
         if not dataframes:
             logger.warning("No hay datos para guardar en la base de datos")
             return 0
         
+        buffer = BarBuffer(sum(len(df) for df in dataframes))
+        for df in dataframes:
+            buffer.add(df)
+        return self.save_buffer(buffer)
+    
+    def save_buffer(self, buffer):
+        """Guarda el contenido de un buffer de barras en la base de datos y lo vacía.
+        
+        Solo se escriben las filas nuevas y las que cambian: las barras
+        solapadas idénticas a las guardadas no se reescriben (ni generan WAL).
+        Retorna el número de filas procesadas; el desglose en insertadas,
+        actualizadas y sin cambios se acumula en las estadísticas.
+        """
+        if not len(buffer):
+            logger.warning("No hay datos para guardar en la base de datos")
+            return 0
+        
         try:
-            # Concatenar todos los dataframes
-            combined_df = pd.concat(dataframes, ignore_index=True)
-            
-            # Asegurar que no hay filas duplicadas (misma fecha y símbolo)
-            combined_df = combined_df.drop_duplicates(subset=["symbol", "date"])
-            
-            records_saved = 0
-            
-            # Crear sesión de base de datos
-            session = self.session_maker()
+            symbols = list(buffer.symbols)
             
+            write_start = time.perf_counter()
             try:
-                # Usar inserción masiva para mejor rendimiento
-                total_rows = len(combined_df)
-                
-                for i in range(0, total_rows, BATCH_SIZE):
-                    batch = combined_df.iloc[i:i+BATCH_SIZE]
-                    
-                    # Ejecutar consulta directamente para upsert (actualizar o insertar)
-                    values = []
-                    for _, row in batch.iterrows():
-                        values.append({
-                            'symbol': row['symbol'],
-                            'date': row['date'],
-                            'open': row['open'],
-                            'high': row['high'],
-                            'low': row['low'],
-                            'close': row['close'],
-                            'volume': row['volume']
-                        })
-                    
-                    # Usar SQLAlchemy para el upsert
-                    insert_stmt = text("""
-                        INSERT INTO stock_prices_monthly 
-                        (symbol, date, open, high, low, close, volume)
-                        VALUES (:symbol, :date, :open, :high, :low, :close, :volume)
-                        ON CONFLICT (symbol, date) DO UPDATE SET
-                        open = EXCLUDED.open,
-                        high = EXCLUDED.high,
-                        low = EXCLUDED.low,
-                        close = EXCLUDED.close,
-                        volume = EXCLUDED.volume
-                    """)
-                    
-                    session.execute(insert_stmt, values)
-                    session.commit()
-                    
-                    records_saved += len(batch)
-                    logger.debug(f"Guardados {records_saved}/{total_rows} registros en la base de datos")
-            
+                # Sin duplicados (misma fecha y símbolo) y con el symbol_id de cada fila
+                combined_df = buffer.to_frame(self.resolve_symbol_ids(symbols))
+                if self.write_mode == "copy":
+                    counts = self.save_with_copy(combined_df)
+                else:
+                    counts = self.save_with_upsert(combined_df)
             except Exception as e:
-                session.rollback()
-                logger.error(f"Error al guardar datos en la base de datos: {e}")
+                self.metrics.inc("db_write_errors")
+                if self.journal is not None:
+                    for symbol in symbols:
+                        self.journal.mark_failed(symbol, f"error de escritura: {e}", permanent=False)
                 raise
+            write_seconds = time.perf_counter() - write_start
+            self.stats["db_write_seconds"] += write_seconds
+            self.metrics.observe("db_write", write_seconds)
+            self.metrics.inc("db_flushes")
+            records_saved = sum(counts.values())
+            for outcome, rows in counts.items():
+                self.stats[f"rows_{outcome}"] += rows
+                self.metrics.inc(f"rows_{outcome}", rows)
+            self.metrics.inc("rows_written", counts["inserted"] + counts["updated"])
             
-            finally:
-                session.close()
+            if self.journal is not None:
+                # Cada volcado es un punto de control: se confirma en el diario al momento. Un símbolo
+                # repartido entre varios volcados solo se confirma en el que contiene su última fila
+                self.journal.mark_written([symbol for symbol in symbols if symbol in buffer.completed], write_seconds)
+                self.journal.flush()
             
-            logger.info(f"Guardados {records_saved} registros en total en la base de datos")
+            logger.info(f"Guardados {records_saved} registros en la base de datos: {counts['inserted']} nuevos, "
+                        f"{counts['updated']} actualizados, {counts['unchanged']} sin cambios")
             return records_saved
         
         except Exception as e:
             logger.error(f"Error en save_to_db: {e}")
             return 0
+        
+        finally:
+            buffer.clear()
+    
+    def save_with_upsert(self, combined_df):
+        """Guarda un DataFrame con INSERT ... ON CONFLICT en lotes de BATCH_SIZE.
+        
+        El DO UPDATE solo se aplica a las filas cuyos valores cambian
+        (IS DISTINCT FROM EXCLUDED). Retorna el número de filas insertadas,
+        actualizadas y sin cambios.
+        """
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        table = self.price_model.__table__
+        postgres = self.engine.dialect.name == "postgresql"
+        
+        insert_stmt = (postgresql if postgres else sqlite).insert(table)
+        excluded = insert_stmt.excluded
+        insert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=['symbol_id', 'date'],
+            set_={column: excluded[column] for column in VALUE_COLUMNS},
+            where=or_(*(table.c[column].is_distinct_from(excluded[column]) for column in VALUE_COLUMNS))
+        )
+        # En PostgreSQL xmax = 0 distingue las filas insertadas de las actualizadas;
+        # las que no cambian no se devuelven
+        insert_stmt = insert_stmt.returning(literal_column("xmax = 0") if postgres else table.c.symbol_id)
+        existing_stmt = select(func.count()).select_from(table)\
+            .where(tuple_(table.c.symbol_id, table.c.date).in_(bindparam('keys', expanding=True)))
+        
+        # Crear sesión de base de datos
+        session = self.session_maker()
+        
+        try:
+            # Usar inserción masiva para mejor rendimiento
+            total_rows = len(combined_df)
+            
+            # Columnas convertidas a tipos de Python una sola vez, sin recorrer el DataFrame fila a fila.
+            # Las fechas son el mismo instante en UTC sin zona horaria que guarda la ruta copy
+            columns = {
+                'symbol_id': combined_df['symbol_id'].to_numpy(dtype=np.int64).tolist(),
+                'date': _datetime_column(pd.to_datetime(combined_df['date'], utc=True).dt.tz_localize(None)),
+                'open': _nullable_column(combined_df['open']),
+                'high': _nullable_column(combined_df['high']),
+                'low': _nullable_column(combined_df['low']),
+                'close': _nullable_column(combined_df['close']),
+                'volume': _nullable_column(combined_df['volume'], cast=lambda value: int(round(value)))
+            }
+            names = list(columns)
+            
+            for i in range(0, total_rows, BATCH_SIZE):
+                values = [dict(zip(names, row))
+                          for row in zip(*(column[i:i+BATCH_SIZE] for column in columns.values()))]
+                
+                if postgres:
+                    existing = None
+                else:
+                    # Sin xmax: las filas ya existentes se cuentan antes del upsert
+                    keys = [(value['symbol_id'], value['date']) for value in values]
+                    existing = session.execute(existing_stmt, {'keys': keys}).scalar()
+                
+                # SQLAlchemy agrupa el lote en un INSERT multi-fila (insertmanyvalues) con RETURNING
+                written = session.execute(insert_stmt, values).fetchall()
+                session.commit()
+                
+                inserted = sum(1 for row in written if row[0]) if postgres else len(values) - existing
+                counts["inserted"] += inserted
+                counts["updated"] += len(written) - inserted
+                counts["unchanged"] += len(values) - len(written)
+                logger.debug(f"Guardados {i + len(values)}/{total_rows} registros en la base de datos")
+        
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error al guardar datos en la base de datos: {e}")
+            raise
+        
+        finally:
+            session.close()
+        
+        return counts
+    
+    def save_with_copy(self, combined_df):
+        """Guarda un DataFrame con COPY a una tabla staging y un único upsert set-based.
+        
+        La tabla staging es temporal (por conexión y sin WAL), de modo que
+        varios cargadores pueden escribir a la vez sin mezclar sus filas.
+        Las filas idénticas a las guardadas se descartan en la staging antes
+        del upsert, de modo que no llegan a tocar la hypertable (ni sus chunks
+        comprimidos). Retorna el número de filas insertadas, actualizadas y
+        sin cambios.
+        """
+        if self.engine.dialect.name != "postgresql":
+            raise ValueError("El modo de escritura copy requiere PostgreSQL")
+        
+        columns = ['symbol_id', 'date', 'open', 'high', 'low', 'close', 'volume']
+        df = combined_df[columns].copy()
+        
+        # Mismo instante que guarda psycopg2 con fechas tz-aware en una sesión UTC
+        df['date'] = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)
+        # El volumen es BIGINT: sin decimales en el CSV y vacío (NULL) si falta
+        df['volume'] = df['volume'].round().astype('Int64')
+        
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            staging_table = f"{self.price_table}_staging"
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {staging_table}
+                (LIKE {self.price_table} INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS
+            """)
+            cursor.copy_expert(
+                f"COPY {staging_table} (symbol_id, date, open, high, low, close, volume) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            # Descartar las barras que ya están guardadas con los mismos valores
+            cursor.execute(f"""
+                DELETE FROM {staging_table} s
+                USING {self.price_table} p
+                WHERE p.symbol_id = s.symbol_id
+                AND p.date = s.date
+                AND (p.open, p.high, p.low, p.close, p.volume)
+                    IS NOT DISTINCT FROM (s.open, s.high, s.low, s.close, s.volume)
+            """)
+            unchanged = cursor.rowcount
+            cursor.execute(f"""
+                WITH written AS (
+                    INSERT INTO {self.price_table} AS p
+                    (symbol_id, date, open, high, low, close, volume)
+                    SELECT symbol_id, date, open, high, low, close, volume
+                    FROM {staging_table}
+                    ON CONFLICT (symbol_id, date) DO UPDATE SET
+                    open = EXCLUDED.open,
+                    high = EXCLUDED.high,
+                    low = EXCLUDED.low,
+                    close = EXCLUDED.close,
+                    volume = EXCLUDED.volume
+                    WHERE (p.open, p.high, p.low, p.close, p.volume)
+                        IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close, EXCLUDED.volume)
+                    RETURNING xmax = 0 AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+                FROM written
+            """)
+            inserted, updated = cursor.fetchone()
+            conn.commit()
+            return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
+        
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error al guardar datos con COPY: {e}")
+            raise
+        
+        finally:
+            conn.close()
     
-    def process_symbols_parallel(self, symbols):
-        """Procesa varios símbolos en paralelo o secuencialmente."""
+    def process_symbols_parallel(self, tasks):
+        """Procesa varias tareas de descarga en paralelo o secuencialmente.
+        
+        Cada DataFrame se copia al buffer columnar en cuanto llega y se
+        vuelca a la base de datos cada WRITER_FLUSH_ROWS filas, de modo que la
+        memoria no crece con el tamaño del lote.
+        """
         successful = 0
         failed = 0
-        dataframes = []
+        buffer = BarBuffer(WRITER_FLUSH_ROWS)
         
         # Mostrar progreso
-        with tqdm(total=len(symbols), desc="Descargando datos") as pbar:
+        with tqdm(total=len(tasks), desc="Descargando datos") as pbar:
+            # Modo por lotes (descargas multi-ticker)
+            if self.batch_download:
+                for symbol, df in self.download_batch(tasks):
+                    if df is not None and not df.empty:
+                        buffer.extend(df, self.flush_buffer)
+                        successful += 1
+                    else:
+                        failed += 1
+                    pbar.update(1)
+            
             # Modo secuencial (para mitigar problemas de rate limit)
-            if SEQUENTIAL_MODE:
-                for symbol in symbols:
+            elif SEQUENTIAL_MODE:
+                for task in tasks:
+                    symbol = task['symbol']
                     try:
-                        symbol, df = self.download_stock_data(symbol)
+                        symbol, df = self.download_stock_data(symbol, task['start_date'])
                         
                         if df is not None and not df.empty:
-                            dataframes.append(df)
+                            buffer.extend(df, self.flush_buffer)
                             successful += 1
                         else:
                             failed += 1
@@ -396,8 +1727,12 @@ class StockDataLoader:
             # Modo paralelo (con menos trabajadores para mitigar rate limit)
             else:
                 # Usar ThreadPoolExecutor para procesar en paralelo
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                    future_to_symbol = {executor.submit(self.download_stock_data, symbol): symbol for symbol in symbols}
+                # El limitador compartido decide cuántas peticiones hay realmente en vuelo
+                with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+                    future_to_symbol = {
+                        executor.submit(self.download_stock_data, task['symbol'], task['start_date']): task['symbol']
+                        for task in tasks
+                    }
                     
                     # Procesar resultados a medida que se completan
                     for future in as_completed(future_to_symbol):
@@ -406,7 +1741,7 @@ class StockDataLoader:
                             symbol, df = future.result()
                             
                             if df is not None and not df.empty:
-                                dataframes.append(df)
+                                buffer.extend(df, self.flush_buffer)
                                 successful += 1
                             else:
                                 failed += 1
@@ -422,30 +1757,340 @@ class StockDataLoader:
         self.stats["successful_downloads"] += successful
         self.stats["failed_downloads"] += failed
         
-        # Guardar lote en la base de datos
-        if dataframes:
-            records_saved = self.save_to_db(dataframes)
-            self.stats["total_records"] += records_saved
+        # Guardar el resto del lote en la base de datos
+        if len(buffer):
+            self.flush_buffer(buffer)
         
         return successful, failed
     
+    def build_download_units(self, tasks):
+        """Divide las tareas en unidades de descarga independientes.
+        
+        Cada unidad es una tupla (número de símbolos, función sin argumentos
+        que retorna un iterable de tuplas (símbolo, DataFrame o None)): un grupo
+        multi-ticker con la misma fecha de inicio en modo por lotes, o un único
+        símbolo en otro caso. Las unidades conservan el orden de prioridad de
+        las tareas.
+        """
+        if not self.batch_download:
+            return [
+                (1, lambda task=task: [self.download_stock_data(task['symbol'], task['start_date'])])
+                for task in tasks
+            ]
+        
+        groups = {}
+        for position, task in enumerate(tasks):
+            groups.setdefault(task['start_date'], []).append((position, task))
+        
+        # Cada grupo se ordena por la posición de su tarea más prioritaria
+        chunks = []
+        for group in groups.values():
+            for i in range(0, len(group), DOWNLOAD_GROUP_SIZE):
+                chunk = group[i:i+DOWNLOAD_GROUP_SIZE]
+                chunks.append((chunk[0][0], [task for _, task in chunk]))
+        chunks.sort(key=lambda item: item[0])
+        
+        return [(len(chunk), lambda chunk=chunk: self.download_batch(chunk)) for _, chunk in chunks]
+    
+    def process_pipelined(self, tasks):
+        """Procesa las tareas solapando descargas y escrituras.
+        
+        Los descargadores envían cada DataFrame a una cola acotada
+        (PIPELINE_QUEUE_SIZE) y se bloquean cuando está llena, de modo que la
+        memoria queda limitada por el tamaño de la cola. Un hilo escritor la
+        drena y vuelca a la base de datos al alcanzar WRITER_FLUSH_ROWS filas
+        o WRITER_FLUSH_SECONDS segundos.
+        """
+        frame_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        writer = threading.Thread(target=self.pipeline_writer, args=(frame_queue,), name="PipelineWriter")
+        writer.start()
+        
+        try:
+            with tqdm(total=len(tasks), desc="Descargando datos") as pbar:
+                if self.download_engine == "async":
+                    self.run_async_downloads(tasks, frame_queue, pbar)
+                else:
+                    self.run_threaded_downloads(tasks, frame_queue, pbar)
+        finally:
+            # Señal de fin para el escritor, que vuelca lo que quede en su buffer
+            frame_queue.put(None)
+            writer.join()
+        
+        pipeline_stats = self.stats["pipeline"]
+        logger.info(
+            f"Pipeline completado. Volcados: {pipeline_stats['flushes']}, "
+            f"profundidad máxima de cola: {pipeline_stats['max_queue_depth']}, "
+            f"espera descargadores: {pipeline_stats['producer_wait_seconds']:.1f}s, "
+            f"espera escritor: {pipeline_stats['writer_wait_seconds']:.1f}s"
+        )
+    
+    def run_threaded_downloads(self, tasks, frame_queue, pbar):
+        """Productor del pipeline con hilos: cada unidad de descarga envía sus DataFrames a la cola."""
+        def run_unit(size, unit):
+            if self.budget_exhausted():
+                self.skip_for_budget(size)
+                return 0, 0
+            successful = 0
+            failed = 0
+            for symbol, df in unit():
+                if df is None or df.empty:
+                    failed += 1
+                    continue
+                self.enqueue_frame(frame_queue, df)
+                successful += 1
+            return successful, failed
+        
+        units = self.build_download_units(tasks)
+        # Cada grupo multi-ticker ya se paraleliza dentro del proveedor
+        workers = 1 if (self.batch_download or SEQUENTIAL_MODE) else MAX_CONCURRENCY
+        logger.info(f"Iniciando pipeline: {len(units)} unidades de descarga, {workers} descargadores")
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_unit, size, unit) for size, unit in units]
+            for future in as_completed(futures):
+                try:
+                    successful, failed = future.result()
+                except Exception as e:
+                    logger.error(f"Error en unidad de descarga: {e}")
+                    continue
+                self.stats["successful_downloads"] += successful
+                self.stats["failed_downloads"] += failed
+                pbar.update(successful + failed)
+    
+    def run_async_downloads(self, tasks, frame_queue, pbar):
+        """Productor del pipeline con el motor asyncio: un único cliente HTTP para todas las peticiones."""
+        # Importación diferida: aiohttp solo es necesario con --engine async
+        from async_engine import AsyncDownloadEngine
+        
+        def on_result(symbol, df):
+            if symbol in engine.durations:
+                self.metrics.observe("http", engine.durations[symbol])
+            if df is not None and not df.empty:
+                with self.metrics.timer("transform"):
+                    df = self.format_history(symbol, df)
+            if symbol in engine.errors:
+                self._download_errors[symbol] = engine.errors[symbol]
+            if symbol in engine.failures:
+                self._failure_classes[symbol] = engine.failures[symbol]
+            df = self.complete_download(symbol, df, engine.durations.get(symbol))
+            if df is not None and not df.empty:
+                self.enqueue_frame(frame_queue, df)
+            with self._pipeline_lock:
+                if df is None or df.empty:
+                    self.stats["failed_downloads"] += 1
+                else:
+                    self.stats["successful_downloads"] += 1
+                pbar.update(1)
+        
+        logger.info(f"Iniciando pipeline asíncrono: {len(tasks)} símbolos")
+        engine = AsyncDownloadEngine(rate_limiter=self.rate_limiter, deadline=self.deadline)
+        self.metrics.register_gauge("async_requests_in_flight", lambda: engine.in_flight)
+        engine.run(tasks, on_result, interval=self.interval)
+        self.stats["async_engine"] = engine.stats
+        if engine.stats["skipped"]:
+            self.skip_for_budget(engine.stats["skipped"])
+        self.metrics.inc("http_requests", engine.stats["requests"])
+        self.metrics.inc("retries", engine.stats["retries"])
+        self.metrics.inc("throttled", engine.stats["throttled"])
+    
+    def enqueue_frame(self, frame_queue, df):
+        """Envía un DataFrame al escritor registrando la espera y la profundidad de la cola."""
+        wait_start = time.perf_counter()
+        frame_queue.put(df)
+        waited = time.perf_counter() - wait_start
+        depth = frame_queue.qsize()
+        self.metrics.set_gauge("queue_depth", depth)
+        self.metrics.observe("queue_put_wait", waited)
+        
+        with self._pipeline_lock:
+            pipeline_stats = self.stats["pipeline"]
+            pipeline_stats["producer_wait_seconds"] += waited
+            pipeline_stats["frames_queued"] += 1
+            pipeline_stats["max_queue_depth"] = max(pipeline_stats["max_queue_depth"], depth)
+            # Media incremental de la profundidad observada tras cada envío
+            pipeline_stats["avg_queue_depth"] += (depth - pipeline_stats["avg_queue_depth"]) / pipeline_stats["frames_queued"]
+    
+    def pipeline_writer(self, frame_queue):
+        """Hilo escritor: drena la cola y vuelca a la base de datos por umbral de filas o tiempo."""
+        pipeline_stats = self.stats["pipeline"]
+        buffer = BarBuffer(WRITER_FLUSH_ROWS)
+        last_flush = time.monotonic()
+        
+        def flush(buffer):
+            nonlocal last_flush
+            busy_start = time.perf_counter()
+            self.flush_buffer(buffer)
+            pipeline_stats["writer_busy_seconds"] += time.perf_counter() - busy_start
+            pipeline_stats["flushes"] += 1
+            self.metrics.set_gauge("writer_buffer_rows", 0)
+            last_flush = time.monotonic()
+        
+        while True:
+            timeout = max(0.0, WRITER_FLUSH_SECONDS - (time.monotonic() - last_flush))
+            wait_start = time.perf_counter()
+            try:
+                df = frame_queue.get(timeout=timeout)
+            except queue.Empty:
+                # Vencido el umbral de tiempo sin datos nuevos
+                df = False
+            pipeline_stats["writer_wait_seconds"] += time.perf_counter() - wait_start
+            self.metrics.set_gauge("queue_depth", frame_queue.qsize())
+            
+            if df is None:
+                break
+            
+            if df is not False:
+                # El buffer se vuelca solo al llenarse (WRITER_FLUSH_ROWS filas)
+                buffer.extend(df, flush)
+                self.metrics.set_gauge("writer_buffer_rows", len(buffer))
+            elif not len(buffer):
+                # Nada pendiente: reiniciar el temporizador y seguir esperando
+                last_flush = time.monotonic()
+                continue
+            
+            if len(buffer) and time.monotonic() - last_flush >= WRITER_FLUSH_SECONDS:
+                flush(buffer)
+        
+        if len(buffer):
+            flush(buffer)
+    
     def process_all_symbols(self):
         """Procesa todos los símbolos en lotes para gestión de memoria."""
-        total_symbols = len(self.symbols)
-        logger.info(f"Iniciando procesamiento de {total_symbols} símbolos en lotes de {BATCH_SIZE}")
+        tasks = None
+        if self.resume:
+            # Continuar solo con lo pendiente de la ejecución interrumpida
+            tasks = self.journal.resume_run()
+            if tasks is None:
+                logger.info("No hay ninguna ejecución sin terminar; se planifica una nueva")
+            else:
+                self.stats["planned_downloads"] = len(tasks)
+        
+        if self.budget is not None and "seconds" in self.budget:
+            self.deadline = self._started + self.budget["seconds"]
+        
+        if tasks is None:
+            # Planificar antes de descargar: descarta los símbolos ya actualizados
+            tasks = self.schedule_tasks(self.plan_downloads())
+            if self.journal is not None:
+                self.journal.start_run(tasks)
+        else:
+            tasks = self.schedule_tasks(tasks)
+        
+        if self.journal is not None:
+            self.stats["run_id"] = self.journal.run_id
+            self.stats["resumed"] = self.journal.resumed
+        
+        # Recargas completas reanudadas desde el diario: sin caché y borrando las barras obsoletas
+        remaining = self.start_full_reloads(tasks)
+        if self.cache is not None:
+            tasks = ([task for task in tasks if task['symbol'] in self._full_reloads]
+                     + self.resolve_from_cache(remaining))
+        self.download_tasks(tasks)
+        
+        # Recargas completas de los símbolos con el histórico reajustado: al final, con menor prioridad
+        refetches = self.take_refetches()
+        if refetches:
+            # Sus descargas incrementales descartadas no son fallos
+            self.stats["failed_downloads"] -= len(refetches)
+            self.stats["history_refetches"] += len(refetches)
+            refetches = self.schedule_tasks(refetches)
+            logger.info(f"Recargando completos {len(refetches)} símbolos con el histórico reajustado")
+            self.start_full_reloads(refetches)
+            self.download_tasks(refetches)
+    
+    def download_tasks(self, tasks):
+        """Descarga y escribe una lista de tareas con el pipeline o por lotes."""
+        total_tasks = len(tasks)
+        if self.pipeline:
+            self.process_pipelined(tasks)
+            return
+        
+        # En modo multi-ticker cada lote debe llenar al menos un grupo
+        batch_size = max(BATCH_SIZE, DOWNLOAD_GROUP_SIZE) if self.batch_download else BATCH_SIZE
+        logger.info(f"Iniciando procesamiento de {total_tasks} símbolos en lotes de {batch_size}")
         
         # Procesar en lotes para evitar problemas de memoria
-        for i in range(0, total_symbols, BATCH_SIZE):
-            batch = self.symbols[i:i+BATCH_SIZE]
-            logger.info(f"Procesando lote {i//BATCH_SIZE + 1}/{(total_symbols-1)//BATCH_SIZE + 1} ({len(batch)} símbolos)")
+        for i in range(0, total_tasks, batch_size):
+            if self.budget_exhausted():
+                self.skip_for_budget(total_tasks - i)
+                logger.warning(f"Presupuesto de tiempo agotado: {total_tasks - i} símbolos sin procesar")
+                break
+            batch = tasks[i:i+batch_size]
+            logger.info(f"Procesando lote {i//batch_size + 1}/{(total_tasks-1)//batch_size + 1} ({len(batch)} símbolos)")
             
             successful, failed = self.process_symbols_parallel(batch)
             logger.info(f"Lote completado. Éxito: {successful}, Fallos: {failed}")
     
+    def process_shards(self):
+        """Procesa los shards de una carga repartida hasta que no quede ninguno libre.
+        
+        Cada shard es un rango de símbolos consecutivos que se procesa con
+        process_all_symbols (planificación, prioridad y escritura incluidas)
+        mientras un latido mantiene su lease. Las consultas de planificación y
+        prioridad se limitan a los símbolos del shard, así que su coste no
+        crece con el universo. Un shard que el presupuesto deja
+        a medias se libera para que lo termine otro proceso; si este proceso
+        muere, su lease expira y el shard se reasigna.
+        """
+        universe = self.symbols
+        self.shards.create_shards(universe)
+        self.stats["total_symbols"] = 0
+        shard_stats = self.stats["shards"] = {
+            "run_name": self.shard_run,
+            "worker": self.shards.worker,
+            "completed": 0,
+            "released": 0,
+            "lost": 0  # Shards cuyo lease reclamó otro proceso antes de cerrarlos
+        }
+        
+        self.shards.start_heartbeat()
+        try:
+            while not self.budget_spent():
+                shard = self.shards.claim()
+                if shard is None:
+                    break
+                
+                before = {key: self.stats[key] for key in SHARD_STAT_KEYS}
+                schedule = self.stats["schedule"]
+                left_before = schedule["deferred"] + schedule["skipped_by_budget"]
+                
+                self.symbols = [symbol for symbol in universe
+                                if shard['first_symbol'] <= symbol <= shard['last_symbol']]
+                self.stats["total_symbols"] += len(self.symbols)
+                self.process_all_symbols()
+                if self.journal is not None:
+                    self.journal.finish_run("completed")
+                if self.negative_cache is not None:
+                    self.negative_cache.flush()
+                
+                delta = {key: self.stats[key] - before[key] for key in SHARD_STAT_KEYS}
+                if schedule["deferred"] + schedule["skipped_by_budget"] > left_before:
+                    outcome = "released" if self.shards.release(shard, delta) else "lost"
+                else:
+                    outcome = "completed" if self.shards.complete(shard, delta) else "lost"
+                shard_stats[outcome] += 1
+        finally:
+            self.shards.stop_heartbeat()
+            self.symbols = universe
+        
+        logger.info(f"Carga {self.shard_run}: {shard_stats['completed']} shards completados por este proceso"
+                    + (f", {shard_stats['lost']} con el lease perdido" if shard_stats['lost'] else ""))
+
     def save_stats(self):
         """Guarda estadísticas de la ejecución en un archivo JSON."""
         self.stats["end_time"] = datetime.now()
         self.stats["duration_seconds"] = (self.stats["end_time"] - self.stats["start_time"]).total_seconds()
+        self.stats["rate_limiter"] = self.rate_limiter.snapshot()
+        self.stats["metrics"] = self.metrics.snapshot()
+        if self.cache is not None:
+            self.stats["cache"] = dict(self.cache.stats)
+        if self.negative_cache is not None:
+            self.stats["negative_cache"] = dict(self.negative_cache.stats)
+        if self.stats["db_write_seconds"] > 0:
+            self.stats["rows_per_second"] = self.stats["total_records"] / self.stats["db_write_seconds"]
+        if self.shards is not None:
+            # Totales de la carga entre todos los procesos que la reparten hasta ahora
+            self.stats["shards"]["run"] = self.shards.summary()
         
         # Convertir datetime a string para JSON
         self.stats["start_time"] = self.stats["start_time"].isoformat()
@@ -453,13 +2098,20 @@ class StockDataLoader:
         
         # Guardar en archivo JSON
         stats_file = f"stock_data_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        if self.shards is not None:
+            # Varios procesos de la misma carga pueden terminar en el mismo segundo
+            stats_file = f"stock_data_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.json"
         with open(stats_file, "w") as f:
             json.dump(self.stats, f, indent=2)
         
         logger.info(f"Estadísticas guardadas en {stats_file}")
     
-    def run(self):
-        """Ejecuta el proceso completo de carga de datos."""
+    def run(self, rebuild_from_cache=False):
+        """Ejecuta el proceso completo de carga de datos.
+        
+        Con ``rebuild_from_cache`` no se descarga nada: la base de datos se
+        rellena con todo el contenido de la caché de históricos.
+        """
         logger.info("Iniciando proceso de carga de datos históricos de acciones")
         
         # 1. Conectar a la base de datos
@@ -467,14 +2119,46 @@ class StockDataLoader:
             logger.error("No se pudo conectar a la base de datos. Abortando.")
             return False
         
+        if self.use_journal:
+            self.journal = RunJournal(self.engine)
+        if self.use_negative_cache:
+            self.negative_cache = NegativeCache(self.engine, self.interval)
+        
+        if rebuild_from_cache and self.cache is None:
+            logger.error("La reconstrucción desde caché requiere la caché de históricos activa. Abortando.")
+            return False
+        
         # 2. Cargar símbolos
-        if not self.load_symbols():
+        if not rebuild_from_cache and not self.load_symbols():
             logger.error("No se pudieron cargar los símbolos. Abortando.")
             return False
         
+        # Exportar las métricas mientras dura la carga
+        if self.metrics_file is not None:
+            self.metrics.start_textfile_writer(self.metrics_file)
+        if self.metrics_port is not None:
+            self.metrics.start_http_server(self.metrics_port)
+        
         # 3. Procesar todos los símbolos
         try:
-            self.process_all_symbols()
+            if rebuild_from_cache:
+                self.rebuild_from_cache()
+            elif self.shard_run:
+                self.shards = ShardCoordinator(self.engine, self.shard_run)
+                self.process_shards()
+            else:
+                self.process_all_symbols()
+            
+            if self.interval == "1d":
+                self.refresh_daily_rollups()
+            
+            if self.cache is not None:
+                self.cache.close()
+            if self.journal is not None and not self.shard_run:
+                # En una carga repartida process_shards cierra la ejecución de cada shard
+                self.journal.finish_run("completed")
+            if self.negative_cache is not None:
+                self.negative_cache.flush()
             
             # 4. Guardar estadísticas
             self.save_stats()
@@ -485,16 +2169,79 @@ class StockDataLoader:
         except Exception as e:
             logger.error(f"Error en el proceso de carga: {e}")
             traceback.print_exc()
+            if self.journal is not None:
+                self.journal.finish_run("failed")
+            if self.negative_cache is not None:
+                self.negative_cache.flush()
             return False
+        
+        finally:
+            self.metrics.stop(self.metrics_file)
 
 
-def check_timescale_db():
+def default_db_url():
+    """URL de SQLAlchemy de la base de datos de DB_CONFIG."""
+    return f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+
+
+def _shard_worker(options):
+    """Proceso hijo de run_shard_processes: un cargador completo sobre la carga repartida."""
+    loader = StockDataLoader(**options)
+    if not loader.run():
+        sys.exit(1)
+
+
+def run_shard_processes(options, processes):
+    """Lanza ``processes`` cargadores en esta máquina sobre la misma carga repartida.
+    
+    Cada proceso tiene su propio intérprete (sin GIL compartido), su
+    limitador y su conexión, y reclama shards de loader_shards hasta que no
+    queda ninguno. Los exportadores de métricas usan un puerto y un archivo
+    por proceso. Retorna (procesos terminados sin error, resumen agregado de
+    la carga o None si no se pudo preparar la base de datos).
+    """
+    # El esquema se crea una sola vez antes de lanzar los procesos: varios
+    # create_all simultáneos sobre una base de datos vacía chocan entre sí
+    loader = StockDataLoader(**options)
+    if not loader.connect_db():
+        return 0, None
+    if loader.use_journal:
+        RunJournal(loader.engine)
+    if loader.use_negative_cache:
+        NegativeCache(loader.engine, loader.interval)
+    coordinator = ShardCoordinator(loader.engine, options["shard_run"])
+    
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for index in range(processes):
+        worker_options = dict(options)
+        if options.get("metrics_port") is not None:
+            worker_options["metrics_port"] = options["metrics_port"] + index
+        if options.get("metrics_file") is not None:
+            path = Path(options["metrics_file"])
+            worker_options["metrics_file"] = path.with_name(f"{path.stem}_{index}{path.suffix}")
+        process = context.Process(target=_shard_worker, args=(worker_options,), name=f"ShardWorker-{index}")
+        process.start()
+        workers.append(process)
+    
+    for process in workers:
+        process.join()
+    succeeded = sum(1 for process in workers if process.exitcode == 0)
+    
+    try:
+        summary = coordinator.summary()
+    finally:
+        loader.engine.dispose()
+    return succeeded, summary
+
+
+def check_timescale_db(db_url=None):
     """Verifica si TimescaleDB está accesible."""
     from sqlalchemy import inspect
     
     try:
         # Crear cadena de conexión
-        conn_string = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+        conn_string = db_url or default_db_url()
         
         # Intentar conectar
         engine = create_engine(conn_string)
@@ -527,9 +2274,39 @@ def print_summary(stats):
     success_rate = stats["successful_downloads"] / stats["total_symbols"] * 100 if stats["total_symbols"] > 0 else 0
     
     print(f"Total de símbolos procesados: {stats['total_symbols']}")
+    print(f"Símbolos ya actualizados: {stats['up_to_date_symbols']}")
+    if stats.get("negative_cached_symbols"):
+        print(f"Símbolos sin datos omitidos hasta su recomprobación: {stats['negative_cached_symbols']}")
     print(f"Descargas exitosas: {stats['successful_downloads']} ({success_rate:.1f}%)")
     print(f"Descargas fallidas: {stats['failed_downloads']}")
+    if stats.get("history_refetches"):
+        print(f"Recargas completas por histórico reajustado (splits, dividendos): {stats['history_refetches']}")
     print(f"Total de registros guardados: {stats['total_records']:,}")
+    if stats["total_records"]:
+        print(f"  Nuevos: {stats['rows_inserted']:,}, actualizados: {stats['rows_updated']:,}, "
+              f"sin cambios (no reescritos): {stats['rows_unchanged']:,}")
+    print(f"Escritura en DB ({stats['write_mode']}): {stats['rows_per_second']:,.0f} filas/s")
+    if stats["rate_limiter"]:
+        print(f"Tasa de peticiones: {stats['rate_limiter']['effective_rate']:.2f} req/s efectiva, "
+              f"{stats['rate_limiter']['final_rate']:.2f} req/s final "
+              f"({stats['rate_limiter']['throttle_events']} rate limits)")
+    schedule = stats.get("schedule", {})
+    if schedule.get("deferred") or schedule.get("skipped_by_budget"):
+        print(f"Presupuesto: {schedule['scheduled'] - schedule['skipped_by_budget']} símbolos procesados, "
+              f"{schedule['deferred'] + schedule['skipped_by_budget']} aplazados a la siguiente ejecución")
+    if schedule.get("candidates"):
+        print(f"Candidatos de la estrategia priorizados: {schedule['candidates']}")
+    if stats.get("metrics", {}).get("stages"):
+        print("Tiempo por etapa (total / p95):")
+        for stage, histogram in stats["metrics"]["stages"].items():
+            print(f"  {stage}: {histogram['total_seconds']:,.1f}s en {histogram['count']:,} "
+                  f"({histogram['p95_seconds']:.3f}s p95)")
+    if stats["cache"]:
+        print(f"Caché de históricos: {stats['cache']['hits']} aciertos, "
+              f"{stats['cache']['partial_hits']} parciales, {stats['cache']['misses']} fallos")
+    if stats.get("shards"):
+        print(f"Carga repartida {stats['shards']['run_name']}: {stats['shards']['completed']} shards "
+              f"completados por este proceso ({stats['shards']['worker']})")
     
     # Calcular duración
     if isinstance(stats["duration_seconds"], (int, float)):
@@ -540,8 +2317,184 @@ def print_summary(stats):
     print("=" * 60)
 
 
+def print_shard_summary(summary):
+    """Imprime el resumen agregado de una carga repartida entre varios procesos."""
+    totals = summary["totals"]
+    states = summary["states"]
+    print("\n" + "=" * 60)
+    print(f"RESUMEN DE LA CARGA REPARTIDA {summary['run_name']}")
+    print("=" * 60)
+    print(f"Shards: {states['done']}/{summary['shards']} completados, {states['leased']} en curso, "
+          f"{states['pending']} pendientes")
+    print(f"Procesos: {summary['workers']}")
+    print(f"Total de símbolos procesados: {totals.get('total_symbols', 0)}")
+    print(f"Símbolos ya actualizados: {totals.get('up_to_date_symbols', 0)}")
+    print(f"Símbolos sin datos omitidos hasta su recomprobación: {totals.get('negative_cached_symbols', 0)}")
+    print(f"Descargas exitosas: {totals.get('successful_downloads', 0)}")
+    print(f"Descargas fallidas: {totals.get('failed_downloads', 0)}")
+    print(f"Recargas completas por histórico reajustado: {totals.get('history_refetches', 0)}")
+    print(f"Total de registros guardados: {totals.get('total_records', 0):,}")
+    print(f"  Nuevos: {totals.get('rows_inserted', 0):,}, actualizados: {totals.get('rows_updated', 0):,}, "
+          f"sin cambios (no reescritos): {totals.get('rows_unchanged', 0):,}")
+    print(f"Ingesta: {summary['rows_per_second']:,.0f} filas/s en {summary['wall_seconds']:,.1f}s")
+    print("=" * 60)
+
+
+def parse_args(argv=None):
+    """Procesa los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Cargador de datos históricos de acciones en TimescaleDB")
+    parser.add_argument(
+        "--batch-download",
+        dest="batch_download",
+        action="store_true",
+        default=BATCH_DOWNLOAD_MODE,
+        help="Agrupar los símbolos en descargas multi-ticker (mismo número de peticiones que uno a uno)"
+    )
+    parser.add_argument(
+        "--no-batch-download",
+        dest="batch_download",
+        action="store_false",
+        help="Descargar cada símbolo por separado (por defecto)"
+    )
+    parser.add_argument(
+        "--write-mode",
+        choices=WRITE_MODES,
+        default=WRITE_MODE,
+        help="Ruta de escritura: upsert por lotes o COPY a tabla staging con merge set-based"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        default=PIPELINE_MODE,
+        help="Solapar descargas y escrituras con una cola acotada y un escritor dedicado"
+    )
+    parser.add_argument(
+        "--fixed-rate",
+        dest="adaptive_rate",
+        action="store_false",
+        default=ADAPTIVE_RATE_LIMIT,
+        help="Desactivar el ajuste automático de tasa y concurrencia (usa MAX_WORKERS y REQUEST_DELAY)"
+    )
+    parser.add_argument(
+        "--engine",
+        dest="download_engine",
+        choices=DOWNLOAD_ENGINES,
+        default=DOWNLOAD_ENGINE,
+        help="Motor de descarga: pool de hilos con yfinance o asyncio con un cliente HTTP compartido"
+    )
+    parser.add_argument(
+        "--provider",
+        choices=PROVIDERS,
+        default=DATA_PROVIDER,
+        help="Origen de los históricos: Yahoo Finance, un directorio de archivos o un generador sintético"
+    )
+    parser.add_argument(
+        "--provider-path",
+        type=Path,
+        help="Directorio con un archivo <SÍMBOLO>.parquet o <SÍMBOLO>.csv por símbolo (proveedor file)"
+    )
+    parser.add_argument(
+        "--interval",
+        choices=DOWNLOAD_INTERVALS,
+        default=DOWNLOAD_INTERVAL,
+        help="Barras mensuales (stock_prices_monthly) o diarias (stock_prices_daily con agregados semanal y mensual)"
+    )
+    parser.add_argument(
+        "--cache",
+        dest="history_cache",
+        action="store_true",
+        default=HISTORY_CACHE_ENABLED,
+        help="Usar la caché de históricos en disco y descargar solo el tramo que falta"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=CACHE_DIR,
+        help="Directorio de la caché de históricos"
+    )
+    parser.add_argument(
+        "--rebuild-from-cache",
+        action="store_true",
+        help="Rellenar la base de datos con todo el contenido de la caché, sin descargar (implica --cache)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Retomar la última ejecución sin terminar: solo los símbolos pendientes o con fallos transitorios"
+    )
+    parser.add_argument(
+        "--no-journal",
+        dest="run_journal",
+        action="store_false",
+        default=RUN_JOURNAL_ENABLED,
+        help="No registrar el estado de cada símbolo en las tablas loader_runs y loader_run_symbols"
+    )
+    parser.add_argument(
+        "--no-negative-cache",
+        dest="negative_cache",
+        action="store_false",
+        default=NEGATIVE_CACHE_ENABLED,
+        help="Desactivar la caché negativa (symbol_negative_cache): pedir todos los símbolos aunque no hayan devuelto datos"
+    )
+    parser.add_argument(
+        "--history-check-bars",
+        type=int,
+        default=HISTORY_CHECK_BARS,
+        help="Barras almacenadas que se vuelven a descargar para detectar splits y dividendos (0 = sin comprobación)"
+    )
+    parser.add_argument(
+        "--no-priority",
+        dest="priority",
+        action="store_false",
+        default=PRIORITY_SCHEDULING,
+        help="Procesar los símbolos en orden alfabético en lugar de por prioridad"
+    )
+    parser.add_argument(
+        "--budget",
+        type=parse_budget,
+        default=LOAD_BUDGET,
+        help="Presupuesto de la ejecución: tiempo (45s, 30m, 2h) o peticiones (500req); se gasta primero en lo más prioritario"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=METRICS_FILE,
+        help="Escribir las métricas en formato Prometheus en este archivo (textfile collector de node_exporter)"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="Servir las métricas en formato Prometheus en http://0.0.0.0:PUERTO/metrics durante la carga"
+    )
+    parser.add_argument(
+        "--shard-run",
+        help="Nombre de una carga repartida: todos los procesos (en esta u otras máquinas) con el mismo nombre "
+             "se reparten el universo por shards con leases en la tabla loader_shards"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=SHARD_PROCESSES,
+        help="Procesos cargadores a lanzar en esta máquina sobre la misma carga repartida (implica --shard-run)"
+    )
+    parser.add_argument(
+        "--db-url",
+        help="URL de SQLAlchemy de la base de datos (por defecto la de DB_CONFIG)"
+    )
+    parser.add_argument(
+        "--symbols-file",
+        type=Path,
+        default=SYMBOLS_FILE,
+        help="Archivo con un símbolo por línea"
+    )
+    return parser.parse_args(argv)
+
+
 def main():
     """Función principal."""
+    args = parse_args()
+    
     print("=" * 60)
     print("CARGADOR DE DATOS HISTÓRICOS DE ACCIONES")
     print("=" * 60)
@@ -551,15 +2504,54 @@ def main():
     
     # Verificar TimescaleDB antes de proceder
     print("Verificando conexión a TimescaleDB...")
-    if not check_timescale_db():
+    if not check_timescale_db(args.db_url):
         print("\n⚠️  TimescaleDB no está disponible.")
         print("Asegúrese de que el contenedor Docker esté en ejecución:")
         print("  docker-compose up -d")
         sys.exit(1)
     
-    print("\nProcesando datos históricos mensuales...")
-    loader = StockDataLoader()
-    success = loader.run()
+    if args.processes > 1 and not args.shard_run:
+        args.shard_run = f"carga_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    print(f"\nProcesando datos históricos {'diarios' if args.interval == '1d' else 'mensuales'}...")
+    options = dict(
+        batch_download=args.batch_download,
+        write_mode=args.write_mode,
+        pipeline=args.pipeline,
+        adaptive_rate=args.adaptive_rate,
+        download_engine=args.download_engine,
+        history_cache=args.history_cache or args.rebuild_from_cache,
+        cache_dir=args.cache_dir,
+        run_journal=args.run_journal,
+        resume=args.resume,
+        interval=args.interval,
+        provider=args.provider,
+        provider_path=args.provider_path,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port,
+        priority=args.priority,
+        budget=args.budget,
+        shard_run=args.shard_run,
+        db_url=args.db_url,
+        symbols_file=args.symbols_file,
+        negative_cache=args.negative_cache,
+        history_check_bars=args.history_check_bars
+    )
+    
+    if args.processes > 1:
+        print(f"Carga repartida {args.shard_run} con {args.processes} procesos")
+        succeeded, summary = run_shard_processes(options, args.processes)
+        if summary is None:
+            print("\n❌ No se pudo conectar a la base de datos. Revise los logs para más detalles.")
+            sys.exit(1)
+        print_shard_summary(summary)
+        if succeeded < args.processes:
+            print(f"\n❌ {args.processes - succeeded} procesos fallaron. Revise los logs para más detalles.")
+            sys.exit(1)
+        return
+    
+    loader = StockDataLoader(**options)
+    success = loader.run(rebuild_from_cache=args.rebuild_from_cache)
     
     if success:
         print_summary(loader.stats)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar el motor de descarga asíncrono sin acceso a red.
+
+Levanta un endpoint de chart falso en localhost que imita las respuestas de
+Yahoo (cookie, crumb, /v8/finance/chart) y ejecuta el motor contra él.
+"""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from async_engine import AsyncDownloadEngine, parse_chart_response
+
+FAKE_CRUMB = "fake-crumb"
+MONTH_TIMESTAMPS = [1704085200, 1706763600, 1709269200]  # 2024-01..03 a las 00:00 America/New_York
+
+
+def chart_payload(symbol):
+    """Respuesta de chart con tres barras mensuales y un ajuste por dividendos del 10%."""
+    return {
+        "chart": {
+            "result": [{
+                "meta": {"symbol": symbol, "exchangeTimezoneName": "America/New_York"},
+                "timestamp": MONTH_TIMESTAMPS,
+                "indicators": {
+                    "quote": [{
+                        "open": [10.0, 11.0, 12.0],
+                        "high": [12.0, 13.0, 14.0],
+                        "low": [9.0, 10.0, 11.0],
+                        "close": [11.0, 12.0, 13.0],
+                        "volume": [1000, 2000, 3000]
+                    }],
+                    "adjclose": [{"adjclose": [9.9, 10.8, 11.7]}]
+                }
+            }],
+            "error": None
+        }
+    }
+
+
+class FakeYahooHandler(BaseHTTPRequestHandler):
+    """Endpoint de Yahoo falso: cookie, crumb y chart."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers=None):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        with server.lock:
+            server.client_ports.add(self.client_address[1])
+
+        if url.path == "/cookie":
+            self.send_body(404, "", {"Set-Cookie": "A3=fake; Path=/"})
+            return
+
+        if url.path == "/v1/test/getcrumb":
+            has_cookie = "A3=fake" in (self.headers.get("Cookie") or "")
+            self.send_body(200 if has_cookie else 401, FAKE_CRUMB if has_cookie else "")
+            return
+
+        if url.path.startswith("/v8/finance/chart/"):
+            symbol = url.path.rsplit("/", 1)[-1]
+            params = parse_qs(url.query)
+            with server.lock:
+                server.chart_requests.append((symbol, params.get("crumb", [None])[0]))
+                attempts = server.attempts[symbol] = server.attempts.get(symbol, 0) + 1
+
+            if symbol == "MISSING":
+                self.send_body(404, json.dumps({"chart": {"result": None}}))
+            elif symbol == "THROTTLED" and attempts == 1:
+                self.send_body(429, "Too Many Requests")
+            else:
+                self.send_body(200, json.dumps(chart_payload(symbol)), {"Content-Type": "application/json"})
+            return
+
+        self.send_body(404, "")
+
+
+def start_fake_server():
+    """Arranca el endpoint falso en un puerto libre y retorna (servidor, url_base)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeYahooHandler)
+    server.lock = threading.Lock()
+    server.client_ports = set()
+    server.chart_requests = []
+    server.attempts = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_parse_chart_response():
+    """Prueba la conversión de la respuesta de chart al formato de Ticker.history."""
+    print("Probando conversión de respuesta de chart...")
+    df = parse_chart_response(chart_payload("AAA"))
+
+    assert list(df.columns) == ["Open", "High", "Low", "Close", "Volume"]
+    assert len(df) == 3
+    assert str(df.index[0]) == "2024-01-01 00:00:00-05:00"
+    # auto_adjust: OHLC escalados por adjclose / close
+    assert abs(df["Close"].iloc[0] - 9.9) < 1e-9
+    assert abs(df["Open"].iloc[0] - 10.0 * 0.9) < 1e-9
+    assert df["Volume"].iloc[2] == 3000
+    assert parse_chart_response({"chart": {"result": None}}) is None
+    print("✓ Conversión correcta")
+
+
+def test_engine_against_fake_endpoint():
+    """Prueba el motor completo contra el endpoint falso: crumb compartido, reintentos y keep-alive."""
+    print("Probando motor asíncrono contra endpoint local...")
+    server, base_url = start_fake_server()
+    try:
+        symbols = [f"S{i:03d}" for i in range(60)] + ["THROTTLED", "MISSING"]
+        tasks = [{"symbol": symbol, "start_date": "2024-01-01"} for symbol in symbols]
+        results = {}
+        lock = threading.Lock()
+
+        def on_result(symbol, df):
+            with lock:
+                results[symbol] = df
+
+        engine = AsyncDownloadEngine(base_url=base_url, cookie_url=f"{base_url}/cookie",
+                                     max_concurrency=20, retry_backoff=0.01)
+        engine.run(tasks, on_result)
+
+        assert set(results) == set(symbols)
+        assert results["MISSING"] is None
+        assert results["THROTTLED"] is not None and len(results["THROTTLED"]) == 3
+        assert all(results[symbol] is not None for symbol in symbols if symbol != "MISSING")
+
+        # Un único handshake: todas las peticiones de chart llevan el mismo crumb
+        assert engine.stats["crumb_refreshes"] == 1
+        assert all(crumb == FAKE_CRUMB for _, crumb in server.chart_requests)
+        assert engine.stats["retries"] == 1
+
+        # Conexiones reutilizadas: muchas menos conexiones que peticiones
+        assert len(server.client_ports) < len(server.chart_requests)
+        print(f"✓ {len(server.chart_requests)} peticiones sobre {len(server.client_ports)} conexiones")
+    finally:
+        server.shutdown()
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DEL MOTOR DE DESCARGA ASÍNCRONO")
+    print("=" * 60)
+
+    tests = [
+        ("Conversión de respuesta de chart", test_parse_chart_response),
+        ("Motor contra endpoint local", test_engine_against_fake_endpoint),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar el buffer columnar de barras.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from bar_buffer import BarBuffer
+from providers import SyntheticProvider
+from run_journal import RunJournal
+from stock_data_loader import StockDataLoader
+
+
+def history(symbol, months=24):
+    """Histórico sintético en el formato de format_history (fechas en America/New_York)."""
+    end = pd.Timestamp("2020-01-01") + pd.DateOffset(months=months - 1)
+    provider = SyntheticProvider(start_date="2020-01-01", current_date=end)
+    return StockDataLoader.format_history(symbol, provider.generate(symbol, "1mo"))
+
+
+def test_extend_flushes_at_capacity():
+    """Prueba que los DataFrames se reparten entre volcados sin superar la capacidad."""
+    print("Probando volcados por capacidad...")
+    buffer = BarBuffer(capacity=10)
+    flushed = []
+
+    def on_full(full_buffer):
+        flushed.append((len(full_buffer), list(full_buffer.symbols)))
+        full_buffer.clear()
+
+    buffer.extend(history("AAA", 7), on_full)
+    buffer.extend(history("BBB", 8), on_full)
+    buffer.extend(history("CCC", 12), on_full)
+
+    assert flushed == [(10, ["AAA", "BBB"]), (10, ["BBB", "CCC"])], flushed
+    assert len(buffer) == 7 and buffer.symbols == ["CCC"]
+    print("✓ 27 filas repartidas en volcados de 10, 10 y 7")
+
+
+def test_split_symbol_written_once_complete():
+    """Prueba que un símbolo repartido entre volcados solo se confirma en el diario con su última fila."""
+    print("Probando un símbolo repartido entre volcados...")
+    aaa = history("AAA", 24)
+    # Barra repetida al final con otro cierre: se conserva la primera, como en un único volcado
+    duplicate = aaa.iloc[[0]].assign(close=-1.0)
+    aaa = pd.concat([aaa, duplicate], ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as root:
+        loader = StockDataLoader(provider="synthetic", run_journal=False, negative_cache=False,
+                                 db_url=f"sqlite:///{root}/prices.db")
+        assert loader.connect_db()
+        loader.journal = RunJournal(loader.engine)
+        loader.journal.start_run([{'symbol': symbol, 'start_date': "2020-01-01", 'last_date': None}
+                                  for symbol in ("AAA", "BBB")])
+
+        completed = []
+
+        def flush(full_buffer):
+            completed.append(sorted(full_buffer.completed))
+            loader.flush_buffer(full_buffer)
+
+        buffer = BarBuffer(capacity=10)
+        buffer.extend(aaa, flush)
+        buffer.extend(history("BBB", 3), flush)
+        # Dos volcados con AAA a medias: si la ejecución se interrumpe aquí, AAA sigue pendiente
+        assert completed == [[], []], completed
+        assert [task['symbol'] for task in RunJournal(loader.engine).resume_run()] == ["AAA", "BBB"]
+
+        flush(buffer)
+        assert completed[-1] == ["AAA", "BBB"]
+        assert RunJournal(loader.engine).resume_run() == []
+        with loader.engine.connect() as conn:
+            rows = conn.execute(text("SELECT count(*), min(close) FROM stock_prices_monthly")).fetchone()
+        assert rows[0] == 24 + 3 and rows[1] > 0, rows
+        loader.engine.dispose()
+    print("✓ AAA confirmado solo en el volcado con su última fila y sin la barra repetida")
+
+
+def test_to_frame_matches_pandas():
+    """Prueba que el buffer produce las mismas filas que concat + drop_duplicates."""
+    print("Probando la equivalencia con pandas...")
+    frames = [history("AAA"), history("BBB"), history("AAA").tail(3)]
+    frames[0].loc[frames[0].index[2], 'volume'] = np.nan
+    # Un DataFrame con varios símbolos también se admite
+    frames.append(pd.concat([history("CCC", 5), history("DDD", 5)], ignore_index=True))
+
+    buffer = BarBuffer(capacity=200)
+    for df in frames:
+        buffer.add(df)
+    symbol_ids = {"AAA": 3, "BBB": 1, "CCC": 7, "DDD": 2}
+    result = buffer.to_frame(symbol_ids).sort_values(['symbol_id', 'date']).reset_index(drop=True)
+
+    expected = pd.concat(frames, ignore_index=True).drop_duplicates(subset=["symbol", "date"])
+    expected = pd.DataFrame({
+        'symbol_id': expected['symbol'].map(symbol_ids).to_numpy(),
+        'date': pd.to_datetime(expected['date'], utc=True).dt.tz_localize(None).to_numpy(),
+        'open': expected['open'].to_numpy(),
+        'high': expected['high'].to_numpy(),
+        'low': expected['low'].to_numpy(),
+        'close': expected['close'].to_numpy(),
+        'volume': expected['volume'].to_numpy(dtype=float)
+    }).sort_values(['symbol_id', 'date']).reset_index(drop=True)
+
+    assert len(result) == 24 * 2 + 5 * 2
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert result['volume'].isna().sum() == 1
+    print(f"✓ {len(result)} filas sin duplicados iguales a las de pandas")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DEL BUFFER DE BARRAS")
+    print("=" * 60)
+
+    tests = [
+        ("Volcados por capacidad", test_extend_flushes_at_capacity),
+        ("Símbolo repartido entre volcados", test_split_symbol_written_once_complete),
+        ("Equivalencia con pandas", test_to_frame_matches_pandas),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
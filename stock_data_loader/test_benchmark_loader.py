@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar el benchmark del cargador sobre SQLite.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from benchmark_loader import generate_universe, run_benchmark
+
+
+def test_generate_universe():
+    """Prueba que el universo sintético es determinista e incluye huecos y duplicados."""
+    print("Probando la generación del universo...")
+    frames = generate_universe(symbols=20, months=60, gap_rate=0.1, duplicate_rate=0.1,
+                               current_date="2024-06-15")
+    again = generate_universe(symbols=20, months=60, gap_rate=0.1, duplicate_rate=0.1,
+                              current_date="2024-06-15")
+
+    assert len(frames) == 20
+    assert all(df.equals(other) for df, other in zip(frames, again))
+    assert list(frames[0].columns) == ['symbol', 'date', 'open', 'high', 'low', 'close', 'volume']
+
+    unique_rows = sum(len(df.drop_duplicates(subset=['date'])) for df in frames)
+    total_rows = sum(len(df) for df in frames)
+    assert unique_rows < 20 * 60, "Debe haber huecos"
+    assert total_rows > unique_rows, "Debe haber duplicados"
+    assert all(df['date'].iloc[-1].strftime('%Y-%m') == "2024-06" for df in frames)
+    print(f"✓ {total_rows} filas generadas ({unique_rows} únicas)")
+
+
+def test_run_benchmark_sqlite():
+    """Prueba todas las etapas del benchmark sobre un SQLite temporal."""
+    print("Probando el benchmark sobre SQLite...")
+    with tempfile.TemporaryDirectory() as root:
+        result = run_benchmark(f"sqlite:///{root}/bench.db", "upsert", symbols=10, months=24)
+
+    assert set(result["stages"]) == {"generate", "write_initial", "write_overlap", "load_last_dates", "plan"}
+    assert result["stored_rows"] == result["unique_rows"]
+    assert result["written_rows"] == result["unique_rows"]
+    assert result["stages"]["write_overlap"]["rows"] == 10 * 3
+    assert result["stages"]["write_initial"]["inserted"] == result["unique_rows"]
+    # Las barras solapadas son idénticas: no se reescribe ninguna
+    assert result["stages"]["write_overlap"]["unchanged"] == 10 * 3
+    assert result["stages"]["write_overlap"]["updated"] == 0
+    assert result["stages"]["load_last_dates"]["rows"] == 10
+    assert all(stage["peak_rss_mb"] > 0 for stage in result["stages"].values())
+    print(f"✓ {result['stored_rows']} filas guardadas a "
+          f"{result['stages']['write_initial']['rows_per_second']:,.0f} filas/s")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DEL BENCHMARK DEL CARGADOR")
+    print("=" * 60)
+
+    tests = [
+        ("Universo sintético", test_generate_universe),
+        ("Benchmark sobre SQLite", test_run_benchmark_sqlite),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar la caché de históricos en disco.
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from data_cache import HistoryCache
+
+
+def monthly_frame(symbol, start, periods, close=1.0):
+    """Histórico mensual en el formato de stock_prices_monthly."""
+    dates = pd.date_range(start, periods=periods, freq='MS', tz='America/New_York')
+    return pd.DataFrame({
+        'symbol': symbol,
+        'date': dates,
+        'open': close,
+        'high': close,
+        'low': close,
+        'close': close,
+        'volume': 100.0
+    })
+
+
+def test_put_merges_and_get_filters():
+    """Prueba que put une tramos y get devuelve solo las barras posteriores a la fecha de la DB."""
+    print("Probando escritura y lectura de la caché...")
+    with tempfile.TemporaryDirectory() as root:
+        cache = HistoryCache(root)
+        cache.put("AAA", "1mo", monthly_frame("AAA", "2024-01-01", 6), requested_from="2000-01-01")
+        # El tramo nuevo solapa la última barra y la sustituye
+        cache.put("AAA", "1mo", monthly_frame("AAA", "2024-06-01", 3, close=2.0), requested_from="2024-06-01")
+
+        entry = cache.coverage("AAA", "1mo")
+        assert entry['rows'] == 8
+        assert entry['requested_from'] == "2000-01-01T00:00:00"
+        assert entry['last_date'].startswith("2024-08-01")
+
+        df = cache.get("AAA", "1mo")
+        assert df.loc[df['date'] == pd.Timestamp("2024-06-01", tz="America/New_York"), 'close'].item() == 2.0
+
+        # La DB guarda el instante en UTC sin zona horaria: 2024-04-01 00:00 EDT = 04:00 UTC
+        tail = cache.get("AAA", "1mo", after=pd.Timestamp("2024-04-01 04:00"))
+        assert len(tail) == 4
+        assert cache.get("BBB", "1mo") is None
+        print("✓ Tramos combinados y filtrados correctamente")
+
+
+def test_ttl_and_size_eviction():
+    """Prueba la expiración por TTL y el desalojo LRU por tamaño."""
+    print("Probando expiración y desalojo...")
+    with tempfile.TemporaryDirectory() as root:
+        cache = HistoryCache(root)
+        for symbol in ("OLD", "LRU", "NEW"):
+            cache.put(symbol, "1mo", monthly_frame(symbol, "2024-01-01", 12))
+        cache.entries[cache.entry_key("OLD", "1mo")]['fetched_at'] = "2000-01-01T00:00:00"
+        cache.entries[cache.entry_key("LRU", "1mo")]['accessed_at'] = "2001-01-01T00:00:00"
+        # Al cerrar se elimina la entrada caducada
+        cache.close()
+        assert cache.coverage("OLD", "1mo") is None
+        assert not Path(root, "1mo", "OLD.parquet").exists()
+
+        # Al reabrir con menos espacio sobra la entrada menos usada
+        entry_bytes = cache.entries[cache.entry_key("NEW", "1mo")]['bytes']
+        reopened = HistoryCache(root, max_bytes=entry_bytes + 1)
+        assert [symbol for symbol, _ in reopened.iter_entries("1mo")] == ["NEW"]
+        assert reopened.stats["evictions"] == 1
+
+        reopened.close()
+        with open(Path(root, "index.json")) as f:
+            assert list(json.load(f)) == ["1mo/NEW"]
+        print("✓ Entradas caducadas y sobrantes eliminadas")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DE LA CACHÉ DE HISTÓRICOS")
+    print("=" * 60)
+
+    tests = [
+        ("Escritura y lectura", test_put_merges_and_get_filters),
+        ("Expiración y desalojo", test_ttl_and_size_eviction),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar la detección de históricos reajustados (splits y dividendos).
+
+Usa un SQLite temporal en lugar de TimescaleDB.
+"""
+
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from run_journal import RunJournal
+from stock_data_loader import StockDataLoader, get_history_check_window, history_checksum
+
+
+def test_checksum_and_window():
+    """Prueba que la suma de control ignora la precisión de almacenamiento pero detecta reajustes."""
+    print("Probando la suma de control del histórico...")
+    dates = pd.date_range("2024-01-01", periods=3, freq="MS", tz="America/New_York")
+    closes = np.array([101.234567, 98.7654321, 120.5])
+    # Lo almacenado: fechas en UTC sin zona horaria y cierres en REAL
+    stored_dates = dates.tz_convert("UTC").tz_localize(None)
+    stored_closes = closes.astype(np.float32).astype(float)
+
+    assert history_checksum(dates, closes) == history_checksum(stored_dates, stored_closes)
+    assert history_checksum(dates, closes + 1e-9) == history_checksum(stored_dates, stored_closes)
+    # Un dividendo del 0,5% reajusta todos los cierres anteriores
+    assert history_checksum(dates, closes * 0.995) != history_checksum(stored_dates, stored_closes)
+    assert history_checksum(dates[:2], closes[:2]) != history_checksum(stored_dates, stored_closes)
+
+    # Ventana de las tres barras anteriores a la última, desde medianoche
+    check_from, check_until = get_history_check_window(datetime(2024, 12, 1, 5), "1mo", bars=3)
+    assert check_from == datetime(2024, 9, 1) and check_until == datetime(2024, 12, 1, 5)
+    check_from, _ = get_history_check_window(datetime(2024, 6, 14, 4), "1d", bars=3)
+    assert check_from == datetime(2024, 6, 11)
+    assert get_history_check_window(None) is None
+    assert get_history_check_window(datetime(2024, 6, 1), bars=0) is None
+    print("✓ Suma de control y ventana de comprobación correctas")
+
+
+def test_split_triggers_full_refetch():
+    """Prueba que un símbolo con el histórico reajustado se recarga completo y el resto no."""
+    print("Probando la recarga completa tras un split...")
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        loader = StockDataLoader(provider="synthetic", run_journal=False, negative_cache=False, db_url=db_url)
+        assert loader.connect_db()
+        loader.symbols = ["AAA", "BBB"]
+        loader.process_all_symbols()
+        expected = loader.stats["total_records"]
+
+        with loader.engine.begin() as conn:
+            # Las dos últimas barras faltan (los símbolos necesitan actualización) y
+            # AAA conserva sus precios anteriores a un split 2:1 que el proveedor ya aplica
+            for symbol_id in loader.symbol_ids.values():
+                conn.execute(text("""
+                    DELETE FROM stock_prices_monthly WHERE symbol_id = :symbol_id AND date IN (
+                        SELECT date FROM stock_prices_monthly WHERE symbol_id = :symbol_id
+                        ORDER BY date DESC LIMIT 2)
+                """), {"symbol_id": symbol_id})
+            conn.execute(text("UPDATE stock_prices_monthly SET close = close * 2 WHERE symbol_id = :symbol_id"),
+                         {"symbol_id": loader.symbol_ids["AAA"]})
+        loader.engine.dispose()
+
+        loader = StockDataLoader(provider="synthetic", run_journal=False, negative_cache=False, db_url=db_url)
+        assert loader.connect_db()
+        loader.symbols = ["AAA", "BBB"]
+        loader.process_all_symbols()
+
+        stats = loader.stats
+        assert stats["history_refetches"] == 1, stats
+        assert stats["successful_downloads"] == 2 and stats["failed_downloads"] == 0, stats
+        # BBB solo descarga la ventana de comprobación y las barras nuevas; AAA se reescribe entero
+        assert stats["rows_inserted"] == 4, stats
+        assert stats["rows_updated"] == expected // 2 - 2, stats
+        assert loader.metrics.counters["history_changes"] == 1
+
+        with loader.engine.connect() as conn:
+            count = conn.execute(text("SELECT count(*) FROM stock_prices_monthly")).scalar()
+        assert count == expected
+        loader.engine.dispose()
+    print("✓ Solo el símbolo reajustado se recarga completo")
+
+
+def test_resumed_refetch_reloads_full_history():
+    """Prueba que una recarga completa pendiente sobrevive a una interrupción y borra las barras obsoletas."""
+    print("Probando la reanudación de una recarga completa...")
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        loader = StockDataLoader(provider="synthetic", run_journal=False, negative_cache=False, db_url=db_url)
+        assert loader.connect_db()
+        loader.symbols = ["AAA"]
+        loader.process_all_symbols()
+        expected = loader.stats["total_records"]
+
+        symbol_id = loader.symbol_ids["AAA"]
+        with loader.engine.begin() as conn:
+            # Faltan las dos últimas barras, los cierres son anteriores a un split 2:1 y hay una
+            # barra antigua que el proveedor ya no devuelve
+            conn.execute(text("""
+                DELETE FROM stock_prices_monthly WHERE symbol_id = :symbol_id AND date IN (
+                    SELECT date FROM stock_prices_monthly WHERE symbol_id = :symbol_id
+                    ORDER BY date DESC LIMIT 2)
+            """), {"symbol_id": symbol_id})
+            conn.execute(text("UPDATE stock_prices_monthly SET close = close * 2 WHERE symbol_id = :symbol_id"),
+                         {"symbol_id": symbol_id})
+            conn.execute(text("INSERT INTO stock_prices_monthly (symbol_id, date, open, high, low, close, volume) "
+                              "VALUES (:symbol_id, :date, 1, 1, 1, 1, 1)"),
+                         {"symbol_id": symbol_id, "date": datetime(1995, 1, 1)})
+        loader.engine.dispose()
+
+        # La ejecución se interrumpe antes de la recarga completa
+        loader = StockDataLoader(provider="synthetic", run_journal=False, negative_cache=False, db_url=db_url)
+        assert loader.connect_db()
+        loader.symbols = ["AAA"]
+        loader.journal = RunJournal(loader.engine)
+        loader.take_refetches = lambda: []
+        loader.process_all_symbols()
+        loader.journal.flush()
+        assert loader.metrics.counters["history_changes"] == 1
+        loader.engine.dispose()
+
+        loader = StockDataLoader(provider="synthetic", run_journal=True, negative_cache=False, db_url=db_url,
+                                 resume=True)
+        assert loader.connect_db()
+        loader.symbols = ["AAA"]
+        loader.journal = RunJournal(loader.engine)
+        loader.process_all_symbols()
+        assert loader.stats["resumed"] and loader.stats["successful_downloads"] == 1, loader.stats
+        assert loader.metrics.counters["rows_deleted"] == 1
+
+        # El histórico queda igual que el del proveedor: mismas barras y sin los cierres anteriores al split
+        fresh = StockDataLoader(provider="synthetic", run_journal=False, negative_cache=False,
+                                db_url=f"sqlite:///{root}/fresh.db")
+        assert fresh.connect_db()
+        fresh.symbols = ["AAA"]
+        fresh.process_all_symbols()
+        query = text("SELECT date, close FROM stock_prices_monthly ORDER BY date")
+        with loader.engine.connect() as conn, fresh.engine.connect() as fresh_conn:
+            stored = conn.execute(query).fetchall()
+            assert stored == fresh_conn.execute(query).fetchall()
+        assert len(stored) == expected
+        loader.engine.dispose()
+        fresh.engine.dispose()
+    print("✓ Recarga completa reanudada desde el inicio y sin barras obsoletas")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DE LA COMPROBACIÓN DEL HISTÓRICO")
+    print("=" * 60)
+
+    tests = [
+        ("Suma de control del histórico", test_checksum_and_window),
+        ("Recarga completa tras un split", test_split_triggers_full_refetch),
+        ("Recarga completa reanudada", test_resumed_refetch_reloads_full_history),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
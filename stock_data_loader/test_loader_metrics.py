@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar las métricas del cargador.
+"""
+
+import sys
+import tempfile
+import urllib.request
+from pathlib import Path
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from loader_metrics import LoaderMetrics
+
+
+def test_snapshot_and_prometheus():
+    """Prueba histogramas, contadores y medidores en el resumen y en el formato de Prometheus."""
+    print("Probando el registro de métricas...")
+    metrics = LoaderMetrics(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.05, 0.5, 2.0):
+        metrics.observe("http", seconds)
+    with metrics.timer("transform"):
+        pass
+    metrics.inc("retries")
+    metrics.inc("rows_written", 250)
+    metrics.set_gauge("queue_depth", 4)
+    in_flight = [3]
+    metrics.register_gauge("requests_in_flight", lambda: in_flight[0])
+
+    snapshot = metrics.snapshot()
+    http = snapshot["stages"]["http"]
+    assert http["count"] == 4
+    assert http["total_seconds"] == 2.6
+    assert http["p50_seconds"] == 0.1
+    assert http["p95_seconds"] == 2.0  # Por encima del último bucket se usa el máximo
+    assert snapshot["stages"]["transform"]["count"] == 1
+    assert snapshot["counters"] == {"retries": 1, "rows_written": 250}
+    assert snapshot["gauges"] == {"queue_depth": 4, "requests_in_flight": 3}
+
+    in_flight[0] = 1
+    text = metrics.to_prometheus()
+    assert 'stock_loader_stage_seconds_bucket{stage="http",le="0.1"} 2' in text
+    assert 'stock_loader_stage_seconds_bucket{stage="http",le="1.0"} 3' in text
+    assert 'stock_loader_stage_seconds_bucket{stage="http",le="+Inf"} 4' in text
+    assert 'stock_loader_stage_seconds_count{stage="http"} 4' in text
+    assert "stock_loader_rows_written_total 250" in text
+    assert "stock_loader_requests_in_flight 1" in text
+    print("✓ Métricas resumidas y exportadas correctamente")
+
+
+def test_exporters():
+    """Prueba el archivo de métricas y el endpoint HTTP."""
+    print("Probando los exportadores...")
+    metrics = LoaderMetrics()
+    metrics.inc("http_requests", 7)
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root, "loader.prom")
+        metrics.start_textfile_writer(path, interval=60)
+        port = metrics.start_http_server(0, host="127.0.0.1")
+
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+        assert "stock_loader_http_requests_total 7" in body
+
+        metrics.inc("http_requests")
+        metrics.stop(path)
+        assert "stock_loader_http_requests_total 8" in path.read_text()
+        assert list(Path(root).iterdir()) == [path]
+    print("✓ Archivo y endpoint de métricas correctos")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DE LAS MÉTRICAS DEL CARGADOR")
+    print("=" * 60)
+
+    tests = [
+        ("Registro de métricas", test_snapshot_and_prometheus),
+        ("Exportadores", test_exporters),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
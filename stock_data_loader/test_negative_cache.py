@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar la caché negativa de símbolos sin datos.
+
+Usa un SQLite temporal en lugar de TimescaleDB.
+"""
+
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from negative_cache import (NegativeCache, classify_failure, backoff_days, FAILURE_EMPTY, FAILURE_NOT_FOUND,
+                            FAILURE_DELISTED, FAILURE_PARSE, NEGATIVE_CACHE_MAX_DAYS)
+from providers import SyntheticProvider
+from stock_data_loader import StockDataLoader
+
+
+def test_backoff_lifecycle():
+    """Prueba la clasificación de fallos, el backoff exponencial y la salida de la caché."""
+    print("Probando el backoff de la caché negativa...")
+    assert classify_failure(Exception("AAA: possibly delisted; no price data found")) == FAILURE_DELISTED
+    assert classify_failure(Exception("HTTP Error 404: Not Found")) == FAILURE_NOT_FOUND
+    assert classify_failure(ValueError("could not convert string to float")) == FAILURE_PARSE
+    assert classify_failure(Exception("Too Many Requests. Rate limited. HTTP 429")) is None
+    assert classify_failure(ConnectionError("Read timed out")) is None
+    assert [backoff_days(FAILURE_EMPTY, n) for n in (1, 2, 3)] == [1, 2, 4]
+    assert backoff_days(FAILURE_NOT_FOUND, 20) == NEGATIVE_CACHE_MAX_DAYS
+
+    with tempfile.TemporaryDirectory() as root:
+        engine = create_engine(f"sqlite:///{root}/prices.db")
+        now = datetime(2024, 6, 1)
+        cache = NegativeCache(engine, "1mo")
+        assert cache.record_failure("DEAD", FAILURE_EMPTY, now=now)
+        assert cache.record_failure("DEAD", FAILURE_EMPTY, now=now)
+        assert cache.record_failure("GONE", FAILURE_DELISTED, now=now)
+        # Una respuesta vacía con barras recientes no indica un símbolo muerto
+        assert not cache.record_failure("LIVE", FAILURE_EMPTY, last_date=now - timedelta(days=3), now=now)
+        cache.flush()
+
+        # Otra ejecución lee la caché de la DB
+        cache = NegativeCache(engine, "1mo")
+        assert cache.filter(["DEAD", "GONE", "LIVE"], now + timedelta(days=1)) == (["LIVE"], ["DEAD", "GONE"])
+        assert cache.filter(["DEAD", "GONE"], now + timedelta(days=3)) == (["DEAD"], ["GONE"])
+        assert cache.stats["rechecked"] == 1
+
+        # DEAD vuelve a fallar (tercer fallo) y GONE vuelve a tener datos
+        cache.record_failure("DEAD", FAILURE_EMPTY, now=now + timedelta(days=3))
+        cache.record_success("GONE")
+        cache.flush()
+        entries = NegativeCache(engine, "1mo").load()
+        assert set(entries) == {"DEAD"}
+        assert entries["DEAD"]["failures"] == 3
+        assert entries["DEAD"]["next_check_at"] == now + timedelta(days=3 + 4)
+        assert entries["DEAD"]["first_failed_at"] == now
+        # Cada intervalo tiene su propia caché
+        assert NegativeCache(engine, "1d").load() == {}
+        engine.dispose()
+    print("✓ Fallos registrados, recomprobados y retirados correctamente")
+
+
+def test_planner_skips_empty_symbols():
+    """Prueba que la planificación omite los símbolos sin datos de una ejecución anterior."""
+    print("Probando la planificación con la caché negativa...")
+    with tempfile.TemporaryDirectory() as root:
+        data_dir = Path(root, "data")
+        data_dir.mkdir()
+        provider = SyntheticProvider()
+        for symbol in ("AAA", "BBB"):
+            history = provider.generate(symbol, "1mo").tail(24).tz_localize(None)
+            history.rename_axis('date').rename(columns=str.lower).to_csv(data_dir.joinpath(f"{symbol}.csv"))
+        symbols = ["AAA", "BBB", "MISSING1", "MISSING2"]
+
+        runs = []
+        for _ in range(2):
+            loader = StockDataLoader(provider="file", provider_path=data_dir, run_journal=False,
+                                     db_url=f"sqlite:///{root}/prices.db")
+            assert loader.connect_db()
+            loader.symbols = symbols
+            loader.negative_cache = NegativeCache(loader.engine, loader.interval)
+            loader.process_all_symbols()
+            loader.negative_cache.flush()
+            runs.append(loader)
+            loader.engine.dispose()
+
+        first, second = runs
+        assert first.stats["planned_downloads"] == 4
+        assert first.stats["successful_downloads"] == 2 and first.stats["failed_downloads"] == 2
+        assert first.negative_cache.stats["recorded"] == 2
+        # En la segunda ejecución AAA y BBB están al día y los símbolos sin datos no se piden
+        assert second.stats["up_to_date_symbols"] == 2
+        assert second.stats["negative_cached_symbols"] == 2
+        assert second.stats["planned_downloads"] == 0
+        assert second.metrics.counters.get("http_requests", 0) == 0
+    print("✓ Símbolos sin datos omitidos hasta su recomprobación")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DE LA CACHÉ NEGATIVA")
+    print("=" * 60)
+
+    tests = [
+        ("Backoff de la caché negativa", test_backoff_lifecycle),
+        ("Planificación con la caché negativa", test_planner_skips_empty_symbols),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
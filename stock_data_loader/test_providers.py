@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar los proveedores de datos sin acceso a red.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import yfinance.data
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from providers import FileProvider, SyntheticProvider
+from stock_data_loader import StockDataLoader
+
+
+def test_synthetic_provider_is_deterministic():
+    """Prueba que el proveedor sintético genera siempre la misma serie por símbolo."""
+    print("Probando proveedor sintético...")
+    provider = SyntheticProvider(current_date="2024-12-31")
+
+    first = provider.fetch_history("AAA", "2000-01-01", "1mo")
+    again = SyntheticProvider(current_date="2024-12-31").fetch_history("AAA", "2000-01-01", "1mo")
+    other = provider.fetch_history("BBB", "2000-01-01", "1mo")
+
+    assert len(first) == 300
+    assert first.equals(again)
+    assert not first['Close'].equals(other['Close'])
+    assert (first['High'] >= first[['Open', 'Close']].max(axis=1)).all()
+    assert (first['Low'] <= first[['Open', 'Close']].min(axis=1)).all()
+
+    # Una fecha de inicio de la DB (instante UTC) incluye la barra de ese día
+    tail = provider.fetch_history("AAA", pd.Timestamp("2024-11-01 04:00"), "1mo")
+    assert [str(date.date()) for date in tail.index] == ["2024-11-01", "2024-12-01"]
+    assert len(provider.fetch_history("AAA", "2024-12-01", "1d")) == 22
+    print("✓ Series deterministas y coherentes")
+
+
+def test_file_provider_reads_csv_and_parquet():
+    """Prueba la lectura de archivos CSV y Parquet con nombres de columna libres."""
+    print("Probando proveedor de archivos...")
+    with tempfile.TemporaryDirectory() as directory:
+        pd.DataFrame({
+            'Date': ['2024-01-01', '2024-02-01', '2024-02-01', '2024-03-01'],
+            'OPEN': [1.0, 2.0, 2.5, 3.0],
+            'High': [2.0, 3.0, 3.5, 4.0],
+            'low': [0.5, 1.5, 2.0, 2.5],
+            'Close': [1.5, 2.5, 3.0, 3.5],
+            'Volume': [10, 20, 25, 30]
+        }).to_csv(Path(directory, "AAA.csv"), index=False)
+        pd.DataFrame({
+            'timestamp': pd.to_datetime(['2024-01-01', '2024-02-01']),
+            'open': [1.0, 2.0], 'high': [1.0, 2.0], 'low': [1.0, 2.0], 'close': [1.0, 2.0]
+        }).to_parquet(Path(directory, "BBB.parquet"), index=False)
+
+        provider = FileProvider(directory)
+        aaa = provider.fetch_history("AAA", "2024-02-01", "1mo")
+        assert list(aaa.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+        assert len(aaa) == 2 and aaa['Close'].iloc[0] == 3.0
+
+        bbb = provider.fetch_history("BBB", None, "1mo")
+        assert len(bbb) == 2 and bbb['Volume'].isna().all()
+
+        assert provider.fetch_history("ZZZ", None, "1mo").empty
+        assert set(provider.fetch_group(["AAA", "BBB", "ZZZ"], None, "1mo")) == {"AAA", "BBB"}
+        print("✓ Archivos leídos y filtrados correctamente")
+
+
+def test_yahoo_group_request_count():
+    """Prueba que una descarga multi-ticker reserva y cuenta las peticiones que yfinance hace de verdad."""
+    print("Probando el número de peticiones de yf.download...")
+    charts = []
+    original_get = yfinance.data.YfData.get
+
+    def offline_get(self, url, *args, **kwargs):
+        # Sin red: se registra la petición y falla como una conexión rechazada
+        if "/v8/finance/chart/" in url:
+            charts.append(url.rsplit("/", 1)[-1])
+        raise ConnectionError("offline")
+
+    yfinance.data.YfData.get = offline_get
+    try:
+        loader = StockDataLoader(run_journal=False, provider="yahoo", negative_cache=False)
+        symbols = ["AAA", "BBB", "CCC", "DDD", "EEE"]
+        assert loader.download_group(symbols, "2020-01-01") == {}
+    finally:
+        yfinance.data.YfData.get = original_get
+
+    # Una petición de chart por símbolo, no una por grupo
+    assert sorted(charts) == symbols, charts
+    assert loader.metrics.counters["http_requests"] == len(symbols)
+    assert loader.metrics.counters["http_group_requests"] == 1
+    assert loader.rate_limiter.requests == len(symbols)
+    assert loader.rate_limiter.in_flight == 0
+
+    # Los huecos de concurrencia de un grupo se limitan a la concurrencia del limitador
+    slots = loader.rate_limiter.acquire(cost=0, slots=100)
+    assert slots == loader.rate_limiter.concurrency == loader.rate_limiter.in_flight
+    loader.rate_limiter.release(slots=slots)
+    assert loader.rate_limiter.in_flight == 0
+    print(f"✓ {len(charts)} peticiones de chart para {len(symbols)} símbolos, todas reservadas y contadas")
+
+
+class FlakyProvider(SyntheticProvider):
+    """Proveedor sintético cuyas primeras peticiones fallan con el error indicado."""
+
+    def __init__(self, failures, error):
+        super().__init__(current_date="2024-12-31")
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def fetch_history(self, symbol, start_date, interval):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return super().fetch_history(symbol, start_date, interval)
+
+
+def test_download_retries():
+    """Prueba que los errores transitorios se reintentan y los permanentes no."""
+    print("Probando los reintentos de descarga...")
+    retrying = StockDataLoader.download_stock_data.retry
+    original_sleep = retrying.sleep
+    retrying.sleep = lambda seconds: None  # Sin las esperas exponenciales entre intentos
+    try:
+        # Dos timeouts y después datos: dos reintentos y la descarga completa
+        loader = StockDataLoader(run_journal=False, provider="synthetic", negative_cache=False)
+        loader.provider = FlakyProvider(2, ConnectionError("Read timed out"))
+        symbol, df = loader.download_stock_data("AAA", "2020-01-01")
+        assert symbol == "AAA" and df is not None and not df.empty
+        assert loader.provider.calls == 3
+        assert loader.metrics.counters["retries"] == 2
+        assert loader.metrics.counters["symbols_downloaded"] == 1
+
+        # Siempre transitorio: se abandona tras RETRY_ATTEMPTS intentos sin lanzar excepción
+        loader = StockDataLoader(run_journal=False, provider="synthetic", negative_cache=False)
+        loader.provider = FlakyProvider(10, ConnectionError("Read timed out"))
+        assert loader.download_stock_data("AAA", "2020-01-01") == ("AAA", None)
+        assert loader.provider.calls == 3
+        assert loader.metrics.counters["retries"] == 2
+        assert loader.metrics.counters["symbols_failed"] == 1
+
+        # Error permanente (404): no se reintenta
+        loader = StockDataLoader(run_journal=False, provider="synthetic", negative_cache=False)
+        loader.provider = FlakyProvider(1, Exception("HTTP Error 404: Not Found"))
+        assert loader.download_stock_data("AAA", "2020-01-01") == ("AAA", None)
+        assert loader.provider.calls == 1
+        assert loader.metrics.counters.get("retries", 0) == 0
+    finally:
+        retrying.sleep = original_sleep
+    print("✓ Errores transitorios reintentados y permanentes descartados al primer intento")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DE LOS PROVEEDORES DE DATOS")
+    print("=" * 60)
+
+    tests = [
+        ("Proveedor sintético", test_synthetic_provider_is_deterministic),
+        ("Proveedor de archivos", test_file_provider_reads_csv_and_parquet),
+        ("Peticiones de yf.download", test_yahoo_group_request_count),
+        ("Reintentos de descarga", test_download_retries),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
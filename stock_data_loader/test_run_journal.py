@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar el diario de ejecución sin una base de datos externa.
+
+Usa SQLite en memoria en lugar de TimescaleDB: el diario solo usa SQL estándar.
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from run_journal import RunJournal
+
+
+def memory_engine():
+    """Engine SQLite en memoria compartido por todas las conexiones."""
+    return create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+
+def test_resume_skips_finished_symbols():
+    """Prueba que al reanudar solo quedan los símbolos pendientes o con fallos transitorios."""
+    print("Probando reanudación de una ejecución interrumpida...")
+    engine = memory_engine()
+    journal = RunJournal(engine)
+    tasks = [
+        {'symbol': symbol, 'start_date': "2000-01-01", 'last_date': None}
+        for symbol in ("AAA", "BBB", "DEAD", "ERR", "TODO")
+    ]
+    tasks.append({'symbol': "OLD", 'start_date': datetime(2024, 2, 1), 'last_date': datetime(2024, 1, 1)})
+    journal.start_run(tasks)
+
+    journal.mark_downloaded("AAA", 12, seconds=0.5)
+    journal.mark_downloaded("BBB", 12, seconds=0.7)
+    journal.mark_written(["AAA"], seconds=0.1)
+    journal.mark_failed("DEAD", "sin datos", permanent=True)
+    journal.mark_failed("ERR", "HTTP 500", permanent=False)
+    journal.flush()
+    # La ejecución se interrumpe aquí, sin finish_run
+
+    resumed = RunJournal(engine)
+    pending = resumed.resume_run()
+    assert resumed.run_id == journal.run_id
+    assert [task['symbol'] for task in pending] == ["BBB", "ERR", "OLD", "TODO"]
+    assert pending[2]['start_date'] == datetime(2024, 2, 1)
+
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT state, rows, download_seconds, write_seconds FROM loader_run_symbols WHERE symbol = 'AAA'"
+        )).fetchone()
+    assert tuple(row) == ("written", 12, 0.5, 0.1)
+
+    resumed.finish_run("completed")
+    # Una ejecución ya cerrada no cambia de estado
+    resumed.finish_run("failed")
+    with engine.connect() as conn:
+        status = conn.execute(text("SELECT status FROM loader_runs WHERE run_id = :run_id"),
+                              {"run_id": resumed.run_id}).scalar()
+    assert status == "completed"
+    assert RunJournal(engine).resume_run() is None
+    print(f"✓ {len(pending)} símbolos pendientes tras la interrupción")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DEL DIARIO DE EJECUCIÓN")
+    print("=" * 60)
+
+    tests = [
+        ("Reanudación", test_resume_skips_finished_symbols),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar la prioridad y el presupuesto de las descargas.
+
+Usa un SQLite temporal en lugar de TimescaleDB.
+"""
+
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import text
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from stock_data_loader import PRIORITY_MAX_STALE_BARS, StockDataLoader, parse_budget, priority_score
+from providers import SyntheticProvider
+
+
+def test_priority_score_and_budget():
+    """Prueba la puntuación de prioridad y la interpretación de presupuestos."""
+    print("Probando priority_score y parse_budget...")
+    now = datetime(2024, 6, 15)
+    stale = priority_score(datetime(2024, 1, 1), 1e6, now)
+    recent = priority_score(datetime(2024, 4, 1), 1e6, now)
+    liquid = priority_score(datetime(2024, 4, 1), 1e9, now)
+
+    assert stale > recent, "Más barras pendientes debe puntuar más"
+    assert liquid > recent, "Más volumen negociado debe puntuar más"
+    assert priority_score(None, None, now) == PRIORITY_MAX_STALE_BARS
+    assert priority_score(datetime(1990, 1, 1), None, now) == PRIORITY_MAX_STALE_BARS
+
+    assert parse_budget("90") == {"seconds": 90.0}
+    assert parse_budget("30m") == {"seconds": 1800.0}
+    assert parse_budget("2h") == {"seconds": 7200.0}
+    assert parse_budget("500req") == {"requests": 500}
+    assert parse_budget(None) is None
+    try:
+        parse_budget("10 minutos")
+        assert False, "Debe rechazar unidades desconocidas"
+    except ValueError:
+        pass
+    print("✓ Puntuación y presupuestos correctos")
+
+
+def test_schedule_tasks():
+    """Prueba el orden (candidatos primero, luego antigüedad y volumen) y el presupuesto de peticiones."""
+    print("Probando la ordenación de tareas...")
+    with tempfile.TemporaryDirectory() as root:
+        loader = StockDataLoader(run_journal=False, provider="synthetic")
+        assert loader.connect_db(f"sqlite:///{root}/prices.db")
+
+        # STALE y LIQUID llevan 10 meses sin actualizar, pero LIQUID negocia mucho más
+        now = pd.Timestamp(datetime.now()).normalize()
+        frames = []
+        for symbol, months, volume in (("STALE", 10, 10), ("LIQUID", 10, 10**9),
+                                       ("RECENT", 2, 10**9), ("CAND", 2, 10)):
+            provider = SyntheticProvider(start_date="2020-01-01", current_date=now - pd.DateOffset(months=months))
+            df = loader.format_history(symbol, provider.generate(symbol, "1mo"))
+            df['close'] = 10.0
+            df['volume'] = volume
+            frames.append(df)
+        loader.save_to_db(frames)
+        with loader.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE strategy_candidates (symbol TEXT PRIMARY KEY, is_valid BOOLEAN)"))
+            conn.execute(text("INSERT INTO strategy_candidates VALUES ('CAND', 1), ('STALE', 0)"))
+
+        universe = ["CAND", "LIQUID", "NEW", "RECENT", "STALE"]
+        order = [task['symbol'] for task in loader.schedule_tasks(loader.plan_downloads(universe))]
+        assert order == ["CAND", "LIQUID", "STALE", "RECENT", "NEW"], order
+        assert loader.stats["schedule"]["candidates"] == 1
+
+        budgeted = StockDataLoader(run_journal=False, provider="synthetic", budget="2req")
+        budgeted.engine, budgeted.session_maker = loader.engine, loader.session_maker
+        order = [task['symbol'] for task in budgeted.schedule_tasks(budgeted.plan_downloads(universe))]
+        assert order == ["CAND", "LIQUID"], order
+        assert budgeted.stats["schedule"]["deferred"] == 3
+
+        unordered = StockDataLoader(run_journal=False, provider="synthetic", priority=False)
+        unordered.engine, unordered.session_maker = loader.engine, loader.session_maker
+        order = [task['symbol'] for task in unordered.schedule_tasks(unordered.plan_downloads(universe))]
+        assert order == universe, order
+        loader.engine.dispose()
+    print("✓ Tareas ordenadas y truncadas correctamente")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DE PRIORIDAD Y PRESUPUESTO")
+    print("=" * 60)
+
+    tests = [
+        ("Puntuación y presupuestos", test_priority_score_and_budget),
+        ("Ordenación de tareas", test_schedule_tasks),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar el reparto por shards sin una base de datos externa.
+
+Usa un SQLite temporal en lugar de PostgreSQL: SQLite ignora FOR UPDATE SKIP
+LOCKED, pero el ciclo de vida de los leases es el mismo.
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from shard_leases import ShardCoordinator, split_shards
+from stock_data_loader import StockDataLoader
+
+
+def test_lease_lifecycle():
+    """Prueba el reparto, la expiración de leases y la agregación de estadísticas."""
+    print("Probando el ciclo de vida de los leases...")
+    symbols = [f"S{i:03d}" for i in range(25)]
+    shards = split_shards(reversed(symbols), shard_size=10)
+    assert [(s['first_symbol'], s['last_symbol'], s['symbols_count']) for s in shards] == [
+        ("S000", "S009", 10), ("S010", "S019", 10), ("S020", "S024", 5)
+    ]
+
+    with tempfile.TemporaryDirectory() as root:
+        engine = create_engine(f"sqlite:///{root}/shards.db")
+        # lease_seconds=0: los leases de "dead" expiran en cuanto los reclama
+        dead = ShardCoordinator(engine, "nightly", worker="dead", lease_seconds=0)
+        alive = ShardCoordinator(engine, "nightly", worker="alive")
+        assert dead.create_shards(symbols, shard_size=10) == 3
+        assert alive.create_shards(symbols[:5], shard_size=10) == 1  # No cambia los shards existentes
+
+        first = dead.claim()
+        assert first['shard_id'] == 0
+        # El shard de "dead" ha expirado: "alive" lo retoma
+        retaken = alive.claim()
+        assert retaken['shard_id'] == 0 and retaken['attempts'] == 2
+        assert not dead.renew(), "Un lease reasignado no se puede renovar"
+        # "dead" termina tarde: sus filas ya están escritas, así que sus estadísticas se suman,
+        # pero el shard sigue siendo de "alive"
+        assert dead.complete(first, {"total_symbols": 10, "total_records": 10}) is False
+        assert alive.summary()["states"] == {"pending": 2, "leased": 1, "done": 0}
+
+        assert alive.release(retaken, {"total_symbols": 10, "total_records": 100})
+        stats = {"total_symbols": 10, "total_records": 50, "db_write_seconds": 0.5}
+        for _ in range(3):
+            shard = alive.claim()
+            alive.complete(shard, stats)
+        assert alive.claim() is None
+
+        summary = alive.summary()
+        assert summary["states"] == {"pending": 0, "leased": 0, "done": 3}
+        assert summary["workers"] == 1
+        # El shard liberado suma las estadísticas de sus tres intentos
+        assert summary["totals"] == {"total_symbols": 50, "total_records": 260, "db_write_seconds": 1.5}
+        engine.dispose()
+    print("✓ Leases reclamados, reasignados y cerrados correctamente")
+
+
+def test_process_shards():
+    """Prueba una carga repartida completa con el proveedor sintético."""
+    print("Probando una carga repartida...")
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        symbols = [f"SYN{i:02d}" for i in range(12)]
+        totals = []
+        for worker in ("a", "b"):
+            loader = StockDataLoader(provider="synthetic", run_journal=False, shard_run="test", db_url=db_url)
+            assert loader.connect_db()
+            loader.symbols = symbols
+            loader.shards = ShardCoordinator(loader.engine, "test", worker=worker)
+            loader.process_shards()
+            totals.append(loader.stats["shards"]["completed"])
+
+        # El primer proceso termina todos los shards; el segundo no encuentra ninguno libre
+        assert totals == [1, 0], totals
+        summary = loader.shards.summary()
+        assert summary["totals"]["total_symbols"] == 12
+        assert summary["totals"]["successful_downloads"] == 12
+        with loader.engine.connect() as conn:
+            stored = conn.execute(text("SELECT count(DISTINCT symbol_id) FROM stock_prices_monthly")).scalar()
+        assert stored == 12
+        loader.engine.dispose()
+
+        # Segunda carga en shards de 4 símbolos: cada planificación solo consulta los de su shard
+        loader = StockDataLoader(provider="synthetic", run_journal=False, shard_run="again", db_url=db_url)
+        assert loader.connect_db()
+        loader.symbols = symbols
+        loader.shards = ShardCoordinator(loader.engine, "again", worker="a")
+        loader.shards.create_shards(symbols, shard_size=4)
+        planned = []
+        load_last_dates = loader.load_last_dates
+        loader.load_last_dates = lambda shard=None: planned.append(load_last_dates(shard)) or planned[-1]
+        loader.process_shards()
+        assert [sorted(last_dates) for last_dates in planned] == [symbols[:4], symbols[4:8], symbols[8:]], planned
+        assert loader.load_priority_inputs(symbols[:2])[1].keys() == set(symbols[:2])
+        assert loader.stats["up_to_date_symbols"] == 12
+        loader.engine.dispose()
+    print("✓ Universo cargado por shards")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DEL REPARTO POR SHARDS")
+    print("=" * 60)
+
+    tests = [
+        ("Ciclo de vida de los leases", test_lease_lifecycle),
+        ("Carga repartida", test_process_shards),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -21,6 +21,8 @@ Autor: TradeStrategy Team
 import os
 import sys
 import logging
+import argparse
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
@@ -28,7 +30,8 @@ import json
 
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text, Column, String, Float, DateTime, Boolean, func
+from sqlalchemy import create_engine, text, bindparam, inspect, Column, Integer, BigInteger, String, Float, REAL, DateTime, Boolean, func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
@@ -59,26 +62,66 @@ MIN_YEARS_DATA = 2  # Mínimo de años de datos históricos
 RESISTANCE_PROXIMITY_PERCENT = 5.0  # Porcentaje de proximidad al máximo histórico
 REVIEW_INTERVAL_DAYS = 7  # Días antes de volver a revisar un símbolo
 
+# Origen de las barras mensuales: la tabla stock_prices_monthly (carga mensual, por defecto)
+# o el agregado continuo stock_prices_monthly_rollup (carga diaria con --interval 1d).
+# Ambos identifican el símbolo por symbols.symbol_id. El analizador y la API leen el mismo
+# valor de la variable de entorno MONTHLY_PRICES_SOURCE, así que el cambio no toca código
+MONTHLY_PRICES_SOURCES = ('stock_prices_monthly', 'stock_prices_monthly_rollup')
+MONTHLY_PRICES_TABLE = os.environ.get('MONTHLY_PRICES_SOURCE', 'stock_prices_monthly')
+if MONTHLY_PRICES_TABLE not in MONTHLY_PRICES_SOURCES:
+    raise ValueError(f"MONTHLY_PRICES_SOURCE no válido: {MONTHLY_PRICES_TABLE} "
+                     f"(use {' o '.join(MONTHLY_PRICES_SOURCES)})")
+
+# Modo de análisis: "vectorized" (todo el universo con una consulta y operaciones agrupadas
+# de NumPy), "sql" (los criterios se calculan en la base de datos y solo se escriben los
+# candidatos, sin traer el histórico) o "symbol" (una consulta y un análisis con pandas por símbolo)
+SCAN_MODE = "vectorized"
+SCAN_MODES = ("vectorized", "sql", "symbol")
+PANEL_FETCH_ROWS = 50000  # Filas por bloque al leer el panel de precios en modo vectorizado
+SAVE_BATCH_SIZE = 500  # Resultados por upsert en strategy_candidates (0 = un único upsert al final del análisis)
+# El modo vectorizado guarda en strategy_candidate_state un resumen de las barras ya procesadas
+# de cada símbolo y en las siguientes revisiones solo lee las barras posteriores
+INCREMENTAL_STATE = True
+STATE_CHECKSUM_TOLERANCE = 1e-9  # Diferencia relativa admitida en la suma de precios del estado (orden de la suma)
+
+# Símbolos pendientes de revisión (alias s de symbols): anti-join con las revisiones de los
+# últimos REVIEW_INTERVAL_DAYS días; los símbolos forzados se revisan siempre
+DUE_SYMBOLS_FILTER = """(
+    NOT EXISTS (
+        SELECT 1 FROM strategy_candidates c
+        WHERE c.symbol_id = s.symbol_id AND c.last_review_date > :cutoff
+    )
+    OR s.symbol IN :force_symbols
+)"""
+
 # Definir modelos SQLAlchemy
 Base = declarative_base()
 
+class Symbol(Base):
+    """Modelo para la dimensión de símbolos."""
+    __tablename__ = 'symbols'
+    
+    symbol_id = Column(Integer, primary_key=True, autoincrement=True)
+    symbol = Column(String, nullable=False, unique=True)
+
 class StockPrice(Base):
     """Modelo para datos mensuales de acciones."""
     __tablename__ = 'stock_prices_monthly'
     
-    symbol = Column(String, primary_key=True)
+    symbol_id = Column(Integer, primary_key=True)
     date = Column(DateTime, primary_key=True)
-    open = Column(Float)
-    high = Column(Float)
-    low = Column(Float)
-    close = Column(Float)
-    volume = Column(Float)
+    open = Column(REAL)
+    high = Column(REAL)
+    low = Column(REAL)
+    close = Column(REAL)
+    volume = Column(BigInteger)
 
 class StrategyCandidate(Base):
     """Modelo para candidatos de estrategia de ruptura."""
     __tablename__ = 'strategy_candidates'
     
-    symbol = Column(String, primary_key=True)
+    symbol_id = Column(Integer, primary_key=True)  # symbols.symbol_id
+    symbol = Column(String, nullable=False)  # Copia del nombre para mostrarlo sin join con symbols
     is_valid = Column(Boolean, default=False)
     last_review_date = Column(DateTime)
     historical_high = Column(Float)
@@ -91,12 +134,221 @@ class StrategyCandidate(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class CandidateState(Base):
+    """Modelo para el estado incremental del análisis de un símbolo.
+    
+    Resume las barras hasta last_date: la última barra del histórico no se
+    incluye porque el periodo en curso todavía puede cambiar.
+    """
+    __tablename__ = 'strategy_candidate_state'
+    
+    symbol_id = Column(Integer, primary_key=True)  # symbols.symbol_id
+    first_date = Column(DateTime)
+    last_date = Column(DateTime)  # Última barra procesada
+    last_close = Column(REAL)  # Cierre de la última barra procesada, para detectar históricos reajustados
+    max_high = Column(REAL)
+    max_high_date = Column(DateTime)
+    min_low = Column(REAL)  # Mínimo posterior al máximo
+    min_low_date = Column(DateTime)
+    bar_count = Column(Integer)  # Barras procesadas, para detectar barras añadidas o borradas
+    price_sum = Column(Float)  # Suma de high, low y close de las barras procesadas, para detectar precios reajustados
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def due_symbols_text(sql: str):
+    """text() de una consulta con DUE_SYMBOLS_FILTER y sus parámetros tipados."""
+    return text(sql).bindparams(bindparam('cutoff', type_=DateTime),
+                                bindparam('force_symbols', type_=String, expanding=True))
+
+
+def fold_price_panel(symbol_ids: np.ndarray, high: np.ndarray, low: np.ndarray) -> Dict[str, np.ndarray]:
+    """Localiza en cada símbolo de un panel las barras que usan los criterios de la estrategia.
+    
+    Las filas deben venir ordenadas por símbolo y fecha. Con operaciones
+    agrupadas de NumPy (reduceat sobre los tramos de cada símbolo) retorna
+    los índices de la primera y la última barra, de la primera barra con el
+    high máximo (como idxmax, sin contar NaN) y de la primera con el low
+    mínimo posterior. Si un símbolo no tiene alguna de ellas su índice es
+    len(symbol_ids).
+    """
+    n = len(symbol_ids)
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return {'first': empty, 'last': empty, 'high': empty, 'low': empty}
+    
+    rows = np.arange(n)
+    starts = np.flatnonzero(np.r_[True, symbol_ids[1:] != symbol_ids[:-1]])
+    ends = np.r_[starts[1:], n]
+    group = np.repeat(np.arange(len(starts)), ends - starts)
+    
+    # Máximo histórico: primera barra con el high máximo
+    high_valid = ~np.isnan(high)
+    group_high = np.maximum.reduceat(np.where(high_valid, high, -np.inf), starts)
+    high_idx = np.minimum.reduceat(np.where(high_valid & (high == group_high[group]), rows, n), starts)
+    
+    # Mínimo posterior: primera barra con el low mínimo después del máximo
+    low_valid = (rows > high_idx[group]) & ~np.isnan(low)
+    group_low = np.minimum.reduceat(np.where(low_valid, low, np.inf), starts)
+    low_idx = np.minimum.reduceat(np.where(low_valid & (low == group_low[group]), rows, n), starts)
+    
+    return {'first': starts, 'last': ends - 1, 'high': high_idx, 'low': low_idx}
+
+
+def scan_price_panel(symbol_ids: np.ndarray, dates: np.ndarray, high: np.ndarray,
+                     low: np.ndarray, close: np.ndarray) -> pd.DataFrame:
+    """Aplica los criterios de analyze_symbol_pattern a todos los símbolos de un panel a la vez.
+    
+    Las filas deben venir ordenadas por símbolo y fecha (una fila por barra).
+    Cada criterio se calcula sobre las barras que localiza fold_price_panel
+    en lugar de con máscaras de pandas por símbolo. Retorna un DataFrame con
+    una fila por símbolo con patrón y las mismas columnas que el resultado
+    de analyze_symbol_pattern (symbol_id en lugar de symbol).
+    """
+    columns = ['symbol_id', 'years_of_data', 'historical_high', 'historical_high_date', 'subsequent_low',
+               'subsequent_low_date', 'current_price', 'resistance_distance_percent', 'is_valid_candidate']
+    n = len(symbol_ids)
+    if n == 0:
+        return pd.DataFrame(columns=columns)
+    
+    bars = fold_price_panel(symbol_ids, high, low)
+    
+    # Años de datos: días completos entre la primera y la última barra
+    years_of_data = ((dates[bars['last']] - dates[bars['first']]) // np.timedelta64(1, 'D')) / 365.25
+    
+    found = (years_of_data >= MIN_YEARS_DATA) & (bars['high'] < n) & (bars['low'] < n)
+    first, last = bars['first'][found], bars['last'][found]
+    high_idx, low_idx = bars['high'][found], bars['low'][found]
+    
+    historical_high = high[high_idx]
+    current_price = close[last]
+    resistance_distance_percent = ((historical_high - current_price) / historical_high) * 100
+    return pd.DataFrame({
+        'symbol_id': symbol_ids[first],
+        'years_of_data': years_of_data[found],
+        'historical_high': historical_high,
+        'historical_high_date': dates[high_idx],
+        'subsequent_low': low[low_idx],
+        'subsequent_low_date': dates[low_idx],
+        'current_price': current_price,
+        'resistance_distance_percent': resistance_distance_percent,
+        'is_valid_candidate': resistance_distance_percent <= RESISTANCE_PROXIMITY_PERCENT
+    }, columns=columns)
+
+
+def merge_state_rows(panel: Dict[str, np.ndarray], states: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Añade al panel las barras equivalentes al estado incremental de cada símbolo.
+    
+    Cada estado se convierte en hasta cuatro barras con NaN en el resto de
+    valores: la primera fecha, el máximo, el mínimo posterior y la última
+    barra procesada con su cierre. Van delante de las barras nuevas del
+    símbolo (todas posteriores a last_date), así que fold_price_panel y
+    scan_price_panel dan el mismo resultado que con el histórico completo.
+    """
+    if states.empty:
+        return panel
+    
+    parts = [dict(panel, kind=np.full(len(panel['symbol_id']), 4))]
+    nan = np.full(len(states), np.nan)
+    for kind, date_column, prices in ((0, 'first_date', {}),
+                                      (1, 'max_high_date', {'high': 'max_high'}),
+                                      (2, 'min_low_date', {'low': 'min_low'}),
+                                      (3, 'last_date', {'close': 'last_close'})):
+        present = states[date_column].notna().to_numpy()
+        part = {'symbol_id': states['symbol_id'].to_numpy(dtype=np.int64),
+                'date': states[date_column].to_numpy(dtype='datetime64[ns]'),
+                'kind': np.full(len(states), kind)}
+        for column in ('high', 'low', 'close'):
+            part[column] = states[prices[column]].to_numpy(dtype=np.float64) if column in prices else nan
+        parts.append({column: values[present] for column, values in part.items()})
+    
+    merged = {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}
+    order = np.lexsort((merged.pop('kind'), merged['date'], merged['symbol_id']))
+    return {column: values[order] for column, values in merged.items()}
+
+
+def next_candidate_states(panel: Dict[str, np.ndarray], new_bars: Optional[Dict[str, np.ndarray]] = None,
+                          states: Optional[pd.DataFrame] = None, price_dtype=np.float64) -> pd.DataFrame:
+    """Estado incremental de cada símbolo del panel sin su última barra (el periodo en curso).
+    
+    panel es el panel analizado (con merge_state_rows si había estado).
+    bar_count y price_sum no se pueden sacar de las barras equivalentes al
+    estado: se acumulan los del estado anterior (states) y los de las
+    barras leídas (new_bars, el panel antes de merge_state_rows) salvo la
+    última de cada símbolo. Los precios se suman con la precisión de la
+    columna REAL (price_dtype) para coincidir con la suma en la base de datos.
+    """
+    def processed_bars(bars):
+        symbol_ids = bars['symbol_id']
+        return np.r_[symbol_ids[1:] == symbol_ids[:-1], False] if len(symbol_ids) else np.empty(0, dtype=bool)
+    
+    processed = processed_bars(panel)
+    symbol_ids, dates = panel['symbol_id'][processed], panel['date'][processed]
+    high, low, close = panel['high'][processed], panel['low'][processed], panel['close'][processed]
+    
+    bars = fold_price_panel(symbol_ids, high, low)
+    n = len(symbol_ids)
+    has_high, has_low = bars['high'] < n, bars['low'] < n
+    high_idx, low_idx = np.where(has_high, bars['high'], 0), np.where(has_low, bars['low'], 0)
+    result = pd.DataFrame({
+        'symbol_id': symbol_ids[bars['first']],
+        'first_date': dates[bars['first']],
+        'last_date': dates[bars['last']],
+        'last_close': close[bars['last']],
+        'max_high': np.where(has_high, high[high_idx], np.nan),
+        'max_high_date': np.where(has_high, dates[high_idx], np.datetime64('NaT')),
+        'min_low': np.where(has_low, low[low_idx], np.nan),
+        'min_low_date': np.where(has_low, dates[low_idx], np.datetime64('NaT'))
+    })
+    
+    # Suma de comprobación: barras procesadas y suma de high, low y close (NaN cuenta como 0)
+    new_bars = panel if new_bars is None else new_bars
+    processed = processed_bars(new_bars)
+    new_ids, inverse = np.unique(new_bars['symbol_id'][processed], return_inverse=True)
+    prices = sum(np.nan_to_num(new_bars[column][processed]).astype(price_dtype).astype(np.float64)
+                 for column in ('high', 'low', 'close'))
+    symbols = result['symbol_id']
+    bar_count = symbols.map(pd.Series(np.bincount(inverse), index=new_ids)).fillna(0)
+    price_sum = symbols.map(pd.Series(np.bincount(inverse, weights=prices), index=new_ids)).fillna(0.0)
+    if states is not None and not states.empty:
+        previous = states.set_index('symbol_id')
+        bar_count += symbols.map(previous['bar_count']).fillna(0)
+        price_sum += symbols.map(previous['price_sum']).fillna(0.0)
+    result['bar_count'] = bar_count.astype(np.int64)
+    result['price_sum'] = price_sum
+    return result
+
 
 class BreakoutAnalyzer:
     """Analizador de estrategia de ruptura de resistencia."""
     
-    def __init__(self):
-        """Inicializa el analizador."""
+    def __init__(self, scan_mode: str = SCAN_MODE, db_url: Optional[str] = None,
+                 force_symbols: Optional[List[str]] = None, save_batch_size: int = SAVE_BATCH_SIZE,
+                 incremental: bool = INCREMENTAL_STATE, full_rebuild: bool = False):
+        """Inicializa el analizador.
+        
+        Args:
+            scan_mode: "vectorized" para analizar todo el universo a la vez,
+                "sql" para analizarlo en la base de datos o "symbol" para
+                analizar símbolo a símbolo.
+            db_url: URL de SQLAlchemy alternativa a DB_CONFIG.
+            force_symbols: Símbolos que se analizan aunque se hayan revisado
+                en los últimos REVIEW_INTERVAL_DAYS días.
+            save_batch_size: Resultados acumulados por cada upsert en
+                strategy_candidates (0 = uno solo al final del análisis).
+            incremental: En modo vectorizado, leer solo las barras posteriores
+                al estado guardado de cada símbolo.
+            full_rebuild: Descartar el estado guardado de los símbolos
+                pendientes y reconstruirlo con el histórico completo.
+        """
+        if scan_mode not in SCAN_MODES:
+            raise ValueError(f"Modo de análisis no válido: {scan_mode}")
+        self.scan_mode = scan_mode
+        self.db_url = db_url
+        self.force_symbols = sorted(set(force_symbols or []))
+        self.save_batch_size = save_batch_size
+        self._pending_results = []
+        self.incremental = incremental
+        self.full_rebuild = full_rebuild
         self.engine = None
         self.session_maker = None
         self.symbols = []
@@ -107,13 +359,17 @@ class BreakoutAnalyzer:
             'skipped_recent_review': 0,
             'insufficient_data': 0,
             'no_pattern_found': 0,
-            'errors': 0
+            'errors': 0,
+            'save_flushes': [],  # Un {'rows', 'seconds'} por cada upsert de resultados
+            'panel_bars': 0,  # Barras leídas en modo vectorizado
+            'incremental_symbols': 0,  # Símbolos analizados a partir de su estado guardado
+            'state_rebuilds': 0  # Estados descartados porque el histórico cambió
         }
     
     def connect_to_database(self) -> bool:
         """Establece conexión con la base de datos."""
         try:
-            connection_string = (
+            connection_string = self.db_url or (
                 f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}"
                 f"@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
             )
@@ -133,22 +389,60 @@ class BreakoutAnalyzer:
             return False
     
     def create_strategy_table(self):
-        """Crea la tabla de candidatos de estrategia si no existe."""
+        """Crea la tabla de candidatos de estrategia si no existe.
+        
+        Una tabla strategy_candidates anterior, con clave symbol, se copia a
+        la nueva clave symbols.symbol_id y se elimina.
+        """
         try:
+            schema = inspect(self.engine)
+            if (schema.has_table('strategy_candidates') and 'symbol_id' not in
+                    [column['name'] for column in schema.get_columns('strategy_candidates')]):
+                self.convert_strategy_table()
+            if (schema.has_table('strategy_candidate_state') and 'price_sum' not in
+                    [column['name'] for column in schema.get_columns('strategy_candidate_state')]):
+                # Estado sin suma de comprobación: se descarta y se reconstruye en el próximo análisis
+                CandidateState.__table__.drop(self.engine)
+                logger.info("Tabla strategy_candidate_state anterior descartada")
             Base.metadata.create_all(self.engine)
             logger.info("Tabla strategy_candidates creada/verificada exitosamente")
         except Exception as e:
             logger.error(f"Error creando tabla strategy_candidates: {e}")
             raise
     
+    def convert_strategy_table(self):
+        """Pasa una tabla strategy_candidates con clave symbol a la clave symbol_id.
+        
+        Copia y sustitución en una transacción: la tabla anterior se renombra,
+        se crea la nueva y se copian las filas con el symbol_id de symbols.
+        """
+        columns = [column.name for column in StrategyCandidate.__table__.columns if column.name != 'symbol_id']
+        with self.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE strategy_candidates RENAME TO strategy_candidates_old"))
+            if self.engine.dialect.name == "postgresql":
+                conn.execute(text("ALTER INDEX IF EXISTS strategy_candidates_pkey RENAME TO strategy_candidates_old_pkey"))
+            StrategyCandidate.__table__.create(conn)
+            copied = conn.execute(text(f"""
+                INSERT INTO strategy_candidates (symbol_id, {', '.join(columns)})
+                SELECT s.symbol_id, {', '.join('c.' + column for column in columns)}
+                FROM strategy_candidates_old c
+                JOIN symbols s ON s.symbol = c.symbol
+            """)).rowcount
+            conn.execute(text("DROP TABLE strategy_candidates_old"))
+        logger.info(f"Tabla strategy_candidates convertida a la clave symbol_id ({copied} candidatos)")
+    
     def get_all_symbols(self) -> List[str]:
         """Obtiene todos los símbolos disponibles en la base de datos."""
         try:
             with self.engine.connect() as conn:
-                result = conn.execute(text("""
-                    SELECT DISTINCT symbol 
-                    FROM stock_prices_monthly 
-                    ORDER BY symbol
+                # Un sondeo por símbolo sobre la clave (symbol_id, date) en lugar de un DISTINCT de toda la tabla
+                result = conn.execute(text(f"""
+                    SELECT s.symbol
+                    FROM symbols s
+                    WHERE EXISTS (
+                        SELECT 1 FROM {MONTHLY_PRICES_TABLE} p WHERE p.symbol_id = s.symbol_id
+                    )
+                    ORDER BY s.symbol
                 """))
                 symbols = [row[0] for row in result]
             
@@ -159,39 +453,52 @@ class BreakoutAnalyzer:
             logger.error(f"Error obteniendo símbolos: {e}")
             return []
     
-    def should_analyze_symbol(self, symbol: str) -> bool:
-        """Verifica si un símbolo debe ser analizado (no revisado recientemente)."""
+    def due_params(self, now: Optional[datetime] = None) -> Dict:
+        """Parámetros de DUE_SYMBOLS_FILTER: fecha de corte de la revisión y símbolos forzados."""
+        now = now or datetime.utcnow()
+        return {'cutoff': now - timedelta(days=REVIEW_INTERVAL_DAYS), 'force_symbols': self.force_symbols}
+    
+    def get_due_symbols(self) -> Tuple[List[str], int]:
+        """Obtiene los símbolos pendientes de revisión con un único anti-join.
+        
+        Los símbolos revisados en los últimos REVIEW_INTERVAL_DAYS días
+        (salvo los forzados) se excluyen en la base de datos con
+        DUE_SYMBOLS_FILTER y no llegan al analizador. Retorna (símbolos
+        pendientes, total de símbolos con datos).
+        """
         try:
-            session = self.session_maker()
-            
-            candidate = session.query(StrategyCandidate).filter_by(symbol=symbol).first()
-            
-            if candidate is None:
-                return True  # Nunca ha sido analizado
-            
-            # Verificar si ha pasado suficiente tiempo desde la última revisión
-            if candidate.last_review_date:
-                days_since_review = (datetime.utcnow() - candidate.last_review_date).days
-                if days_since_review < REVIEW_INTERVAL_DAYS:
-                    return False
+            with self.engine.connect() as conn:
+                total = conn.execute(text(f"""
+                    SELECT COUNT(*)
+                    FROM symbols s
+                    WHERE EXISTS (SELECT 1 FROM {MONTHLY_PRICES_TABLE} p WHERE p.symbol_id = s.symbol_id)
+                """)).scalar()
+                result = conn.execute(due_symbols_text(f"""
+                    SELECT s.symbol
+                    FROM symbols s
+                    WHERE EXISTS (SELECT 1 FROM {MONTHLY_PRICES_TABLE} p WHERE p.symbol_id = s.symbol_id)
+                      AND {DUE_SYMBOLS_FILTER}
+                    ORDER BY s.symbol
+                """), self.due_params())
+                symbols = [row[0] for row in result]
             
-            return True
+            logger.info(f"Encontrados {total} símbolos en la base de datos, {len(symbols)} pendientes de revisión")
+            return symbols, total
             
         except Exception as e:
-            logger.error(f"Error verificando si analizar símbolo {symbol}: {e}")
-            return True
-        finally:
-            session.close()
+            logger.error(f"Error obteniendo símbolos pendientes de revisión: {e}")
+            return [], 0
     
     def get_symbol_data(self, symbol: str) -> Optional[pd.DataFrame]:
         """Obtiene datos históricos de un símbolo."""
         try:
             with self.engine.connect() as conn:
-                query = text("""
-                    SELECT symbol, date, open, high, low, close, volume
-                    FROM stock_prices_monthly
-                    WHERE symbol = :symbol
-                    ORDER BY date ASC
+                query = text(f"""
+                    SELECT s.symbol_id, s.symbol, p.date, p.open, p.high, p.low, p.close, p.volume
+                    FROM {MONTHLY_PRICES_TABLE} p
+                    JOIN symbols s ON s.symbol_id = p.symbol_id
+                    WHERE s.symbol = :symbol
+                    ORDER BY p.date ASC
                 """)
                 
                 df = pd.read_sql(query, conn, params={'symbol': symbol})
@@ -259,109 +566,446 @@ class BreakoutAnalyzer:
             return None
     
     def save_analysis_result(self, analysis_result: Dict):
-        """Guarda el resultado del análisis en la base de datos."""
+        """Añade el resultado del análisis al buffer de escritura.
+        
+        Los resultados se escriben con flush_results cada save_batch_size
+        resultados y al final del análisis, en lugar de una consulta y un
+        commit por símbolo. Un lote completo se escribe al añadir el siguiente
+        resultado, de modo que todos sus resultados ya están contados en
+        analysis_stats si la escritura falla.
+        """
+        if self.save_batch_size and len(self._pending_results) >= self.save_batch_size:
+            self.flush_results()
+        now = datetime.utcnow()
+        self._pending_results.append({
+            'symbol_id': analysis_result['symbol_id'],
+            'symbol': analysis_result['symbol'],
+            'is_valid': analysis_result['is_valid_candidate'],
+            'last_review_date': now,
+            'historical_high': analysis_result['historical_high'],
+            'historical_high_date': analysis_result['historical_high_date'],
+            'subsequent_low': analysis_result['subsequent_low'],
+            'subsequent_low_date': analysis_result['subsequent_low_date'],
+            'current_price': analysis_result['current_price'],
+            'resistance_distance_percent': analysis_result['resistance_distance_percent'],
+            'years_of_data': analysis_result['years_of_data'],
+            'created_at': now,
+            'updated_at': now
+        })
+    
+    def flush_results(self):
+        """Escribe los resultados pendientes con un upsert multi-fila en una sola transacción.
+        
+        INSERT ... ON CONFLICT (symbol_id) DO UPDATE conserva created_at de los
+        candidatos existentes. La duración de cada escritura se añade a
+        analysis_stats['save_flushes']. Si la escritura falla, sus resultados
+        pasan de analizados (y candidatos válidos) a errores.
+        """
+        rows, self._pending_results = self._pending_results, []
+        if not rows:
+            return
+        
+        table = StrategyCandidate.__table__
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['symbol_id'],
+            set_={column: stmt.excluded[column] for column in rows[0] if column not in ('symbol_id', 'created_at')}
+        )
+        
+        started = time.perf_counter()
         try:
-            session = self.session_maker()
+            with self.engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception as e:
+            logger.error(f"Error guardando {len(rows)} resultados: {e}")
+            self.analysis_stats['analyzed_symbols'] -= len(rows)
+            self.analysis_stats['valid_candidates'] -= sum(1 for row in rows if row['is_valid'])
+            self.analysis_stats['errors'] += len(rows)
+            return
+        
+        seconds = time.perf_counter() - started
+        self.analysis_stats['save_flushes'].append({'rows': len(rows), 'seconds': round(seconds, 4)})
+        logger.debug(f"{len(rows)} resultados guardados en {seconds:.3f}s")
+    
+    def load_price_panel(self, incremental: bool = False) -> Tuple[Dict[int, str], Dict[str, np.ndarray]]:
+        """Lee las barras de los símbolos pendientes con una sola consulta ordenada por símbolo y fecha.
+        
+        El resultado se recorre en bloques de PANEL_FETCH_ROWS filas (cursor
+        de servidor en PostgreSQL) y cada bloque se convierte a columnas de
+        NumPy. Con incremental=True los símbolos con estado en
+        strategy_candidate_state solo leen las barras posteriores a su
+        last_date. Retorna (symbol_id -> símbolo, columnas symbol_id, date,
+        high, low y close).
+        """
+        state_join = state_filter = ""
+        if incremental:
+            state_join = "LEFT JOIN strategy_candidate_state st ON st.symbol_id = p.symbol_id"
+            state_filter = "AND (st.symbol_id IS NULL OR p.date > st.last_date)"
+        with self.engine.connect() as conn:
+            names = dict(conn.execute(text("SELECT symbol_id, symbol FROM symbols")).fetchall())
             
-            # Buscar si ya existe el registro
-            candidate = session.query(StrategyCandidate).filter_by(
-                symbol=analysis_result['symbol']
-            ).first()
+            result = conn.execution_options(stream_results=True, yield_per=PANEL_FETCH_ROWS).execute(
+                due_symbols_text(f"""
+                    SELECT p.symbol_id, p.date, p.high, p.low, p.close
+                    FROM {MONTHLY_PRICES_TABLE} p
+                    JOIN symbols s ON s.symbol_id = p.symbol_id
+                    {state_join}
+                    WHERE {DUE_SYMBOLS_FILTER} {state_filter}
+                    ORDER BY p.symbol_id, p.date
+                """), self.due_params())
+            chunks = {'symbol_id': [], 'date': [], 'high': [], 'low': [], 'close': []}
+            for rows in result.partitions(PANEL_FETCH_ROWS):
+                symbol_ids, dates, highs, lows, closes = zip(*rows)
+                chunks['symbol_id'].append(np.array(symbol_ids, dtype=np.int64))
+                chunks['date'].append(pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]'))
+                for column, values in (('high', highs), ('low', lows), ('close', closes)):
+                    chunks[column].append(np.array(values, dtype=np.float64))
+        
+        if not chunks['symbol_id']:
+            empty = {'symbol_id': np.empty(0, dtype=np.int64), 'date': np.empty(0, dtype='datetime64[ns]')}
+            empty.update({column: np.empty(0) for column in ('high', 'low', 'close')})
+            return names, empty
+        return names, {column: np.concatenate(values) for column, values in chunks.items()}
+    
+    def load_candidate_states(self) -> pd.DataFrame:
+        """Lee el estado incremental de los símbolos pendientes y borra el que ya no es válido.
+        
+        Un estado deja de ser válido si el histórico cambió después de
+        calcularlo: una barra añadida o borrada dentro del tramo procesado
+        (p. ej. al rellenar un hueco) cambia el número de barras, y un
+        reajuste de precios (un split o un dividendo) cambia la suma de
+        high, low y close de ese tramo. También si la primera barra ya no
+        coincide o no quedan barras posteriores a last_date. Se comprueba
+        con un único agregado por símbolo. Con full_rebuild se descartan
+        todos. Los símbolos sin estado se leen completos y lo recuperan al
+        final del análisis.
+        """
+        if self.engine.dialect.name == "postgresql":
+            # REAL de 4 bytes ampliado a DOUBLE PRECISION sin pasar por texto (ver real_dtype); NaN cuenta como 0
+            price = "COALESCE(CAST(NULLIF(p.{0}, 'NaN') AS DOUBLE PRECISION), 0)"
+        else:
+            price = "COALESCE(p.{0}, 0)"
+        prices = " + ".join(price.format(column) for column in ('high', 'low', 'close'))
+        processed = "p.date <= st.last_date"
+        with self.engine.begin() as conn:
+            states = pd.read_sql(due_symbols_text(f"""
+                SELECT st.symbol_id, st.first_date, st.last_date, st.last_close,
+                       st.max_high, st.max_high_date, st.min_low, st.min_low_date, st.bar_count, st.price_sum,
+                       CASE WHEN MIN(p.date) = st.first_date AND MAX(p.date) > st.last_date
+                             AND COUNT(CASE WHEN {processed} THEN 1 END) = st.bar_count
+                             AND ABS(COALESCE(SUM(CASE WHEN {processed} THEN {prices} END), 0) - st.price_sum)
+                                 <= {STATE_CHECKSUM_TOLERANCE!r} * ABS(st.price_sum)
+                       THEN 1 ELSE 0 END AS is_valid
+                FROM strategy_candidate_state st
+                JOIN symbols s ON s.symbol_id = st.symbol_id
+                LEFT JOIN {MONTHLY_PRICES_TABLE} p ON p.symbol_id = st.symbol_id
+                WHERE {DUE_SYMBOLS_FILTER}
+                GROUP BY st.symbol_id
+            """), conn, params=self.due_params())
             
-            if candidate:
-                # Actualizar registro existente
-                candidate.is_valid = analysis_result['is_valid_candidate']
-                candidate.last_review_date = datetime.utcnow()
-                candidate.historical_high = analysis_result['historical_high']
-                candidate.historical_high_date = analysis_result['historical_high_date']
-                candidate.subsequent_low = analysis_result['subsequent_low']
-                candidate.subsequent_low_date = analysis_result['subsequent_low_date']
-                candidate.current_price = analysis_result['current_price']
-                candidate.resistance_distance_percent = analysis_result['resistance_distance_percent']
-                candidate.years_of_data = analysis_result['years_of_data']
-                candidate.updated_at = datetime.utcnow()
-            else:
-                # Crear nuevo registro
-                candidate = StrategyCandidate(
-                    symbol=analysis_result['symbol'],
-                    is_valid=analysis_result['is_valid_candidate'],
-                    last_review_date=datetime.utcnow(),
-                    historical_high=analysis_result['historical_high'],
-                    historical_high_date=analysis_result['historical_high_date'],
-                    subsequent_low=analysis_result['subsequent_low'],
-                    subsequent_low_date=analysis_result['subsequent_low_date'],
-                    current_price=analysis_result['current_price'],
-                    resistance_distance_percent=analysis_result['resistance_distance_percent'],
-                    years_of_data=analysis_result['years_of_data']
+            stale = states if self.full_rebuild else states[states['is_valid'] == 0]
+            if not stale.empty:
+                conn.execute(
+                    text("DELETE FROM strategy_candidate_state WHERE symbol_id IN :symbol_ids")
+                    .bindparams(bindparam('symbol_ids', expanding=True)),
+                    {'symbol_ids': stale['symbol_id'].tolist()}
                 )
-                session.add(candidate)
-            
-            session.commit()
-            logger.debug(f"Resultado guardado para {analysis_result['symbol']}")
-            
+                logger.info(f"{len(stale)} estados incrementales descartados; esos símbolos se leen completos")
+        
+        self.analysis_stats['state_rebuilds'] += len(stale)
+        states = states.drop(index=stale.index).drop(columns='is_valid')
+        for column in ('first_date', 'last_date', 'max_high_date', 'min_low_date'):
+            states[column] = pd.to_datetime(states[column])
+        return states
+    
+    def real_dtype(self):
+        """Tipo de NumPy con la precisión de las columnas REAL (4 bytes en PostgreSQL, 8 en SQLite)."""
+        return np.float32 if self.engine.dialect.name == "postgresql" else np.float64
+    
+    def save_candidate_states(self, states: pd.DataFrame):
+        """Guarda el estado incremental de los símbolos analizados con un upsert multi-fila."""
+        if states.empty:
+            return
+        
+        table = CandidateState.__table__
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['symbol_id'],
+            set_={column: stmt.excluded[column] for column in states.columns if column != 'symbol_id'}
+        )
+        states = states.assign(updated_at=datetime.utcnow())
+        rows = states.astype(object).where(states.notna(), None).to_dict('records')
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(stmt, rows)
         except Exception as e:
-            logger.error(f"Error guardando resultado para {analysis_result['symbol']}: {e}")
-            session.rollback()
+            # Sin estado el siguiente análisis de esos símbolos lee el histórico completo
+            logger.error(f"Error guardando el estado incremental de {len(rows)} símbolos: {e}")
+    
+    def scan_all_symbols(self):
+        """Analiza todo el universo a la vez con scan_price_panel.
+        
+        Sustituye las cuatro consultas por símbolo del análisis individual
+        por una lectura del panel de los símbolos pendientes; los resultados
+        y las estadísticas son los mismos. En modo incremental los símbolos
+        con estado solo leen sus barras nuevas y el estado se actualiza al
+        final, así que el coste de cada revisión depende de las barras
+        nuevas y no del histórico completo.
+        """
+        started = datetime.now()
+        self.symbols, total = self.get_due_symbols()
+        self.analysis_stats['total_symbols'] = total
+        if not total:
+            logger.error("No se encontraron símbolos para analizar")
+            return
+        self.analysis_stats['skipped_recent_review'] += total - len(self.symbols)
+        
+        states = self.load_candidate_states() if self.incremental else None
+        names, panel = self.load_price_panel(incremental=self.incremental)
+        self.analysis_stats['panel_bars'] += len(panel['symbol_id'])
+        new_bars = panel
+        if states is not None:
+            self.analysis_stats['incremental_symbols'] += len(states)
+            panel = merge_state_rows(panel, states)
+        
+        results = scan_price_panel(panel['symbol_id'], panel['date'], panel['high'], panel['low'], panel['close'])
+        logger.info(f"Panel de {self.analysis_stats['panel_bars']:,} barras de {len(self.symbols)} símbolos "
+                    f"({self.analysis_stats['incremental_symbols']} desde su estado) analizado en "
+                    f"{(datetime.now() - started).total_seconds():.1f}s")
+        
+        results['symbol'] = results['symbol_id'].map(names)
+        results = results.sort_values('symbol')
+        self.analysis_stats['insufficient_data'] += len(self.symbols) - len(results)
+        
+        try:
+            for row in tqdm(results.itertuples(index=False), total=len(results), desc="Guardando resultados"):
+                analysis_result = {
+                    'symbol_id': int(row.symbol_id),
+                    'symbol': row.symbol,
+                    'years_of_data': float(row.years_of_data),
+                    'historical_high': float(row.historical_high),
+                    'historical_high_date': row.historical_high_date,
+                    'subsequent_low': float(row.subsequent_low),
+                    'subsequent_low_date': row.subsequent_low_date,
+                    'current_price': float(row.current_price),
+                    'resistance_distance_percent': float(row.resistance_distance_percent),
+                    'is_valid_candidate': bool(row.is_valid_candidate),
+                    'pattern_found': True
+                }
+                self.save_analysis_result(analysis_result)
+                
+                self.analysis_stats['analyzed_symbols'] += 1
+                if analysis_result['is_valid_candidate']:
+                    self.analysis_stats['valid_candidates'] += 1
+                    logger.info(f"✓ Candidato válido encontrado: {row.symbol} "
+                                f"(distancia: {analysis_result['resistance_distance_percent']:.2f}%)")
         finally:
-            session.close()
+            # Los resultados acumulados se escriben aunque el bucle se interrumpa
+            self.flush_results()
+        if self.incremental:
+            self.save_candidate_states(next_candidate_states(panel, new_bars, states, self.real_dtype()))
+    
+    def build_pushdown_query(self):
+        """Construye el INSERT ... SELECT ... ON CONFLICT del modo "sql".
+        
+        Aplica los criterios de analyze_symbol_pattern con funciones de
+        ventana: ROW_NUMBER() por símbolo elige la primera barra con el high
+        máximo y la primera con el low mínimo posterior, y el cierre actual
+        se lee por la clave (symbol_id, date) de la última barra. Los
+        símbolos revisados recientemente se excluyen con DUE_SYMBOLS_FILTER. Solo
+        devuelve (RETURNING) el símbolo, la validez y la distancia de cada
+        candidato escrito.
+        """
+        if self.engine.dialect.name == "postgresql":
+            days = "FLOOR(EXTRACT(EPOCH FROM MAX(p.date) - MIN(p.date)) / 86400)"
+            # REAL admite NaN, que PostgreSQL ordena por encima de cualquier número
+            valid = "p.{0} IS NOT NULL AND p.{0} <> 'NaN'"
+            # El mismo valor que lee el driver del REAL (su representación decimal), no su ampliación binaria
+            price = "CAST(CAST({0} AS TEXT) AS DOUBLE PRECISION)"
+        else:
+            days = ("(CAST(strftime('%s', MAX(p.date)) AS INTEGER) "
+                    "- CAST(strftime('%s', MIN(p.date)) AS INTEGER)) / 86400")
+            valid = "p.{0} IS NOT NULL"
+            price = "{0}"
+        
+        return due_symbols_text(f"""
+            INSERT INTO strategy_candidates (
+                symbol_id, symbol, is_valid, last_review_date, historical_high, historical_high_date,
+                subsequent_low, subsequent_low_date, current_price, resistance_distance_percent,
+                years_of_data, created_at, updated_at
+            )
+            WITH due AS (
+                SELECT s.symbol_id, s.symbol
+                FROM symbols s
+                WHERE {DUE_SYMBOLS_FILTER}
+            ),
+            spans AS (
+                SELECT p.symbol_id, MAX(p.date) AS last_date,
+                       CAST({days} AS DOUBLE PRECISION) / CAST(365.25 AS DOUBLE PRECISION) AS years_of_data
+                FROM {MONTHLY_PRICES_TABLE} p
+                JOIN due d ON d.symbol_id = p.symbol_id
+                GROUP BY p.symbol_id
+            ),
+            highs AS (
+                SELECT p.symbol_id, p.date, p.high,
+                       ROW_NUMBER() OVER (PARTITION BY p.symbol_id ORDER BY p.high DESC, p.date) AS rn
+                FROM {MONTHLY_PRICES_TABLE} p
+                JOIN spans sp ON sp.symbol_id = p.symbol_id
+                WHERE sp.years_of_data >= :min_years AND {valid.format('high')}
+            ),
+            lows AS (
+                SELECT p.symbol_id, p.date, p.low,
+                       ROW_NUMBER() OVER (PARTITION BY p.symbol_id ORDER BY p.low, p.date) AS rn
+                FROM {MONTHLY_PRICES_TABLE} p
+                JOIN highs h ON h.symbol_id = p.symbol_id AND h.rn = 1
+                WHERE p.date > h.date AND {valid.format('low')}
+            ),
+            metrics AS (
+                SELECT d.symbol_id, d.symbol, sp.years_of_data,
+                       {price.format('h.high')} AS historical_high, h.date AS historical_high_date,
+                       {price.format('l.low')} AS subsequent_low, l.date AS subsequent_low_date,
+                       {price.format('c.close')} AS current_price
+                FROM spans sp
+                JOIN due d ON d.symbol_id = sp.symbol_id
+                JOIN highs h ON h.symbol_id = sp.symbol_id AND h.rn = 1
+                JOIN lows l ON l.symbol_id = sp.symbol_id AND l.rn = 1
+                JOIN {MONTHLY_PRICES_TABLE} c ON c.symbol_id = sp.symbol_id AND c.date = sp.last_date
+            ),
+            distances AS (
+                SELECT m.*, ((m.historical_high - m.current_price) / m.historical_high) * 100
+                       AS resistance_distance_percent
+                FROM metrics m
+            )
+            SELECT symbol_id, symbol,
+                   CASE WHEN resistance_distance_percent <= :proximity THEN TRUE ELSE FALSE END,
+                   :now, historical_high, historical_high_date, subsequent_low, subsequent_low_date,
+                   current_price, resistance_distance_percent, years_of_data, :now, :now
+            FROM distances
+            WHERE TRUE
+            ON CONFLICT (symbol_id) DO UPDATE SET
+                symbol = excluded.symbol,
+                is_valid = excluded.is_valid,
+                last_review_date = excluded.last_review_date,
+                historical_high = excluded.historical_high,
+                historical_high_date = excluded.historical_high_date,
+                subsequent_low = excluded.subsequent_low,
+                subsequent_low_date = excluded.subsequent_low_date,
+                current_price = excluded.current_price,
+                resistance_distance_percent = excluded.resistance_distance_percent,
+                years_of_data = excluded.years_of_data,
+                updated_at = excluded.updated_at
+            RETURNING symbol, is_valid, resistance_distance_percent
+        """).bindparams(bindparam('now', type_=DateTime))
+    
+    def pushdown_all_symbols(self):
+        """Analiza y guarda todo el universo con una sola sentencia en la base de datos.
+        
+        El histórico de precios no sale de la base de datos: solo se leen
+        los recuentos del universo y las filas de los candidatos escritos,
+        así que el tiempo y la memoria del analizador no dependen de la
+        longitud del histórico. Los resultados y las estadísticas son los
+        mismos que en los otros modos.
+        """
+        started = datetime.now()
+        now = datetime.utcnow()
+        params = self.due_params(now)
+        
+        with self.engine.begin() as conn:
+            # Recuentos antes de escribir: la escritura actualiza last_review_date
+            total, skipped = conn.execute(due_symbols_text(f"""
+                SELECT COUNT(*), COALESCE(SUM(CASE WHEN {DUE_SYMBOLS_FILTER} THEN 0 ELSE 1 END), 0)
+                FROM symbols s
+                WHERE EXISTS (SELECT 1 FROM {MONTHLY_PRICES_TABLE} p WHERE p.symbol_id = s.symbol_id)
+            """), params).one()
+        
+            self.analysis_stats['total_symbols'] = total
+            if not total:
+                logger.error("No se encontraron símbolos para analizar")
+                return
+        
+            candidates = conn.execute(self.build_pushdown_query(), {
+                **params,
+                'now': now,
+                'min_years': MIN_YEARS_DATA,
+                'proximity': RESISTANCE_PROXIMITY_PERCENT
+            }).fetchall()
+        
+        logger.info(f"{len(candidates)} de {total} símbolos analizados y guardados en la base de datos en "
+                    f"{(datetime.now() - started).total_seconds():.1f}s")
+        self.analysis_stats['skipped_recent_review'] += skipped
+        self.analysis_stats['insufficient_data'] += total - skipped - len(candidates)
+        self.analysis_stats['analyzed_symbols'] += len(candidates)
+        for symbol, is_valid, resistance_distance_percent in sorted(candidates):
+            if is_valid:
+                self.analysis_stats['valid_candidates'] += 1
+                logger.info(f"✓ Candidato válido encontrado: {symbol} "
+                            f"(distancia: {resistance_distance_percent:.2f}%)")
     
     def analyze_all_symbols(self):
         """Analiza todos los símbolos disponibles."""
         logger.info("Iniciando análisis de todos los símbolos...")
         
-        self.symbols = self.get_all_symbols()
-        self.analysis_stats['total_symbols'] = len(self.symbols)
+        if self.scan_mode == "vectorized":
+            self.scan_all_symbols()
+            return
+        if self.scan_mode == "sql":
+            self.pushdown_all_symbols()
+            return
+        
+        self.symbols, total = self.get_due_symbols()
+        self.analysis_stats['total_symbols'] = total
         
-        if not self.symbols:
+        if not total:
             logger.error("No se encontraron símbolos para analizar")
             return
+        self.analysis_stats['skipped_recent_review'] += total - len(self.symbols)
         
         # Procesar cada símbolo
-        with tqdm(total=len(self.symbols), desc="Analizando símbolos") as pbar:
-            for symbol in self.symbols:
-                try:
-                    pbar.set_description(f"Analizando {symbol}")
-                    
-                    # Verificar si debe ser analizado
-                    if not self.should_analyze_symbol(symbol):
-                        self.analysis_stats['skipped_recent_review'] += 1
-                        pbar.update(1)
-                        continue
-                    
-                    # Obtener datos del símbolo
-                    df = self.get_symbol_data(symbol)
-                    if df is None or df.empty:
-                        self.analysis_stats['insufficient_data'] += 1
-                        pbar.update(1)
-                        continue
-                    
-                    # Analizar patrón
-                    analysis_result = self.analyze_symbol_pattern(symbol, df)
-                    
-                    if analysis_result is None:
-                        self.analysis_stats['insufficient_data'] += 1
-                        pbar.update(1)
-                        continue
-                    
-                    if not analysis_result.get('pattern_found', False):
-                        self.analysis_stats['no_pattern_found'] += 1
-                        pbar.update(1)
-                        continue
-                    
-                    # Guardar resultado
-                    self.save_analysis_result(analysis_result)
-                    
-                    self.analysis_stats['analyzed_symbols'] += 1
-                    if analysis_result['is_valid_candidate']:
-                        self.analysis_stats['valid_candidates'] += 1
-                        logger.info(f"✓ Candidato válido encontrado: {symbol} "
-                                  f"(distancia: {analysis_result['resistance_distance_percent']:.2f}%)")
+        try:
+            with tqdm(total=len(self.symbols), desc="Analizando símbolos") as pbar:
+                for symbol in self.symbols:
+                    try:
+                        pbar.set_description(f"Analizando {symbol}")
+                        
+                        # Obtener datos del símbolo
+                        df = self.get_symbol_data(symbol)
+                        if df is None or df.empty:
+                            self.analysis_stats['insufficient_data'] += 1
+                            pbar.update(1)
+                            continue
+                        
+                        # Analizar patrón
+                        analysis_result = self.analyze_symbol_pattern(symbol, df)
+                        
+                        if analysis_result is None:
+                            self.analysis_stats['insufficient_data'] += 1
+                            pbar.update(1)
+                            continue
+                        analysis_result['symbol_id'] = int(df['symbol_id'].iloc[0])
+                        
+                        if not analysis_result.get('pattern_found', False):
+                            self.analysis_stats['no_pattern_found'] += 1
+                            pbar.update(1)
+                            continue
+                        
+                        # Guardar resultado
+                        self.save_analysis_result(analysis_result)
+                        
+                        self.analysis_stats['analyzed_symbols'] += 1
+                        if analysis_result['is_valid_candidate']:
+                            self.analysis_stats['valid_candidates'] += 1
+                            logger.info(f"✓ Candidato válido encontrado: {symbol} "
+                                      f"(distancia: {analysis_result['resistance_distance_percent']:.2f}%)")
+                        
+                    except Exception as e:
+                        logger.error(f"Error procesando símbolo {symbol}: {e}")
+                        self.analysis_stats['errors'] += 1
                     
-                except Exception as e:
-                    logger.error(f"Error procesando símbolo {symbol}: {e}")
-                    self.analysis_stats['errors'] += 1
-                
-                pbar.update(1)
+                    pbar.update(1)
+        finally:
+            self.flush_results()
     
     def print_summary(self):
         """Imprime un resumen del análisis."""
@@ -375,6 +1019,15 @@ class BreakoutAnalyzer:
         logger.info(f"Datos insuficientes: {self.analysis_stats['insufficient_data']}")
         logger.info(f"Sin patrón encontrado: {self.analysis_stats['no_pattern_found']}")
         logger.info(f"Errores: {self.analysis_stats['errors']}")
+        if self.analysis_stats['panel_bars']:
+            logger.info(f"Barras leídas: {self.analysis_stats['panel_bars']} "
+                        f"({self.analysis_stats['incremental_symbols']} símbolos desde su estado, "
+                        f"{self.analysis_stats['state_rebuilds']} estados reconstruidos)")
+        flushes = self.analysis_stats['save_flushes']
+        if flushes:
+            logger.info(f"Escrituras de resultados: {len(flushes)} "
+                        f"({sum(flush['rows'] for flush in flushes)} filas en "
+                        f"{sum(flush['seconds'] for flush in flushes):.2f}s)")
         logger.info("="*50)
         
         # Guardar estadísticas en archivo JSON
@@ -445,9 +1098,50 @@ class BreakoutAnalyzer:
         return True
 
 
+def parse_args(argv=None):
+    """Procesa los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description="Analizador de la estrategia de ruptura de resistencia")
+    parser.add_argument(
+        "--scan-mode",
+        choices=SCAN_MODES,
+        default=SCAN_MODE,
+        help="Analizar todo el universo a la vez (vectorized), en la base de datos (sql) o símbolo a símbolo (symbol)"
+    )
+    parser.add_argument(
+        "--force-symbols",
+        nargs="+",
+        metavar="SYMBOL",
+        help="Símbolos que se analizan aunque se hayan revisado en los últimos REVIEW_INTERVAL_DAYS días"
+    )
+    parser.add_argument(
+        "--save-batch-size",
+        type=int,
+        default=SAVE_BATCH_SIZE,
+        help="Resultados por upsert en strategy_candidates (0 = un único upsert al final del análisis)"
+    )
+    parser.add_argument(
+        "--no-incremental",
+        action="store_true",
+        help="Leer el histórico completo de cada símbolo sin usar ni guardar su estado incremental"
+    )
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="Descartar el estado incremental de los símbolos pendientes y reconstruirlo"
+    )
+    parser.add_argument(
+        "--db-url",
+        help="URL de SQLAlchemy de la base de datos (por defecto la de DB_CONFIG)"
+    )
+    return parser.parse_args(argv)
+
+
 def main():
     """Función principal."""
-    analyzer = BreakoutAnalyzer()
+    args = parse_args()
+    analyzer = BreakoutAnalyzer(scan_mode=args.scan_mode, db_url=args.db_url, force_symbols=args.force_symbols,
+                                save_batch_size=args.save_batch_size, incremental=not args.no_incremental,
+                                full_rebuild=args.full_rebuild)
     
     try:
         success = analyzer.run_analysis()
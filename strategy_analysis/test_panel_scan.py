@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Test script para verificar que los análisis vectorizado y en SQL coinciden con el análisis por símbolo.
+
+Usa un SQLite temporal en lugar de TimescaleDB.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Añadir el directorio actual al path para importar el módulo
+sys.path.append(str(Path(__file__).parent))
+
+from breakout_analyzer import BreakoutAnalyzer, scan_price_panel
+
+
+def synthetic_panel(symbols=80, seed=7):
+    """Panel mensual aleatorio con historiales cortos, huecos (NaN) y máximos en la última barra."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for symbol_id in range(1, symbols + 1):
+        months = int(rng.integers(1, 72))
+        dates = pd.date_range("2018-01-01", periods=months, freq="MS") + pd.Timedelta(hours=5)
+        close = 50 * np.exp(np.cumsum(rng.normal(0.01, 0.08, months)))
+        high = close * (1 + np.abs(rng.normal(0, 0.03, months)))
+        low = close * (1 - np.abs(rng.normal(0, 0.03, months)))
+        if symbol_id % 7 == 0:
+            high[-1] = high.max() * 1.1  # Máximo en la última barra: sin mínimo posterior
+        if symbol_id % 5 == 0:
+            high[rng.integers(0, months)] = np.nan
+            low[rng.integers(0, months)] = np.nan
+        if symbol_id % 11 == 0:
+            high[min(3, months - 1)] = np.nanmax(high)  # Máximo repetido: cuenta el primero
+        frames.append(pd.DataFrame({'symbol_id': symbol_id, 'date': dates, 'high': high,
+                                    'low': low, 'close': close.astype(np.float32).astype(float)}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def connect(db_url, panel=None, **kwargs):
+    """Analizador conectado a la base de datos de prueba, sin candidatos y con el panel si se indica."""
+    analyzer = BreakoutAnalyzer(db_url=db_url, **kwargs)
+    assert analyzer.connect_to_database()
+    analyzer.create_strategy_table()
+    with analyzer.engine.begin() as conn:
+        conn.execute(text("DELETE FROM strategy_candidates"))
+        conn.execute(text("DELETE FROM strategy_candidate_state"))
+        if panel is not None:
+            conn.execute(text("INSERT INTO symbols (symbol_id, symbol) VALUES (:symbol_id, :symbol)"),
+                         [{'symbol_id': i, 'symbol': f"S{i:03d}"} for i in panel['symbol_id'].unique().tolist()])
+            panel.assign(date=panel['date'].dt.to_pydatetime()).to_sql(
+                'stock_prices_monthly', conn, if_exists='append', index=False)
+    return analyzer
+
+
+def review_all(db_url, symbols, **kwargs):
+    """Revisión forzada de todos los símbolos en modo vectorizado; retorna (candidatos, estadísticas)."""
+    analyzer = BreakoutAnalyzer(scan_mode="vectorized", db_url=db_url, force_symbols=symbols, **kwargs)
+    assert analyzer.connect_to_database()
+    analyzer.analyze_all_symbols()
+    with analyzer.engine.connect() as conn:
+        candidates = pd.read_sql(text(
+            "SELECT symbol, is_valid, historical_high, historical_high_date, subsequent_low, "
+            "subsequent_low_date, current_price, resistance_distance_percent, years_of_data "
+            "FROM strategy_candidates ORDER BY symbol"), conn)
+    analyzer.engine.dispose()
+    return candidates, analyzer.analysis_stats
+
+
+def test_scan_matches_symbol_analysis():
+    """Prueba que scan_price_panel da el mismo resultado que analyze_symbol_pattern para cada símbolo."""
+    print("Probando scan_price_panel frente a analyze_symbol_pattern...")
+    panel = synthetic_panel()
+    analyzer = BreakoutAnalyzer(scan_mode="symbol")
+    scanned = scan_price_panel(panel['symbol_id'].to_numpy(), panel['date'].to_numpy(), panel['high'].to_numpy(),
+                               panel['low'].to_numpy(), panel['close'].to_numpy()).set_index('symbol_id')
+
+    found = 0
+    for symbol_id, df in panel.groupby('symbol_id'):
+        expected = analyzer.analyze_symbol_pattern(str(symbol_id), df.reset_index(drop=True))
+        if expected is None:
+            assert symbol_id not in scanned.index, f"{symbol_id} no debería tener patrón"
+            continue
+        found += 1
+        row = scanned.loc[symbol_id]
+        for key in ('years_of_data', 'historical_high', 'subsequent_low', 'current_price',
+                    'resistance_distance_percent', 'historical_high_date', 'subsequent_low_date'):
+            assert row[key] == expected[key], (symbol_id, key, row[key], expected[key])
+        assert bool(row['is_valid_candidate']) == expected['is_valid_candidate']
+
+    assert found == len(scanned) and 0 < found < panel['symbol_id'].nunique()
+    print(f"✓ {found} símbolos con patrón idénticos en ambos análisis")
+
+
+def test_scan_modes_write_same_candidates():
+    """Prueba que los tres modos de analyze_all_symbols guardan los mismos candidatos y estadísticas."""
+    print("Probando los tres modos de análisis sobre la base de datos...")
+    panel = synthetic_panel(symbols=40, seed=11)
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        results = {}
+        for scan_mode in ("symbol", "vectorized", "sql"):
+            analyzer = connect(db_url, panel if scan_mode == "symbol" else None, scan_mode=scan_mode)
+            analyzer.analyze_all_symbols()
+            with analyzer.engine.connect() as conn:
+                results[scan_mode] = pd.read_sql(text(
+                    "SELECT symbol, is_valid, historical_high, historical_high_date, subsequent_low, "
+                    "subsequent_low_date, current_price, resistance_distance_percent, years_of_data "
+                    "FROM strategy_candidates ORDER BY symbol"), conn)
+            # Las duraciones de las escrituras cambian en cada ejecución (y el modo sql no tiene);
+            # solo el modo vectorizado lee el panel
+            results[scan_mode + "_stats"] = dict(analyzer.analysis_stats, save_flushes=None, panel_bars=None)
+
+        for scan_mode in ("vectorized", "sql"):
+            pd.testing.assert_frame_equal(results["symbol"], results[scan_mode])
+            assert results["symbol_stats"] == results[scan_mode + "_stats"], results
+        assert results["vectorized_stats"]["analyzed_symbols"] == len(results["vectorized"]) > 0
+
+        # Inmediatamente después, todos los símbolos analizados están revisados recientemente
+        for scan_mode in ("vectorized", "sql"):
+            analyzer = BreakoutAnalyzer(scan_mode=scan_mode, db_url=db_url)
+            assert analyzer.connect_to_database()
+            analyzer.analyze_all_symbols()
+            assert analyzer.analysis_stats["skipped_recent_review"] == len(results["vectorized"])
+            assert analyzer.analysis_stats["analyzed_symbols"] == 0
+            analyzer.engine.dispose()
+    print("✓ Mismos candidatos y estadísticas en los tres modos")
+
+
+def test_force_symbols():
+    """Prueba que solo se recorren los símbolos pendientes y que los forzados se revisan siempre."""
+    print("Probando el filtro de revisiones recientes y los símbolos forzados...")
+    panel = synthetic_panel(symbols=30, seed=3)
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel, scan_mode="sql")
+        analyzer.analyze_all_symbols()
+        with analyzer.engine.connect() as conn:
+            reviewed = [row[0] for row in conn.execute(text("SELECT symbol FROM strategy_candidates ORDER BY symbol"))]
+        analyzer.engine.dispose()
+        assert len(reviewed) > 2
+        # Dos símbolos revisados, uno sin patrón (nunca revisado) y uno inexistente
+        unreviewed = next(f"S{i:03d}" for i in range(1, 31) if f"S{i:03d}" not in reviewed)
+        forced = [reviewed[0], reviewed[-1], unreviewed, "NOPE"]
+
+        for scan_mode in ("symbol", "vectorized", "sql"):
+            analyzer = BreakoutAnalyzer(scan_mode=scan_mode, db_url=db_url, force_symbols=forced)
+            assert analyzer.connect_to_database()
+            # Sin revisión reciente solo quedan los símbolos sin patrón, más los forzados
+            due, total = analyzer.get_due_symbols()
+            assert total == 30 and reviewed[0] in due and reviewed[1] not in due and "NOPE" not in due
+            analyzer.analyze_all_symbols()
+            stats = analyzer.analysis_stats
+            assert stats["skipped_recent_review"] == len(reviewed) - 2, (scan_mode, stats)
+            assert stats["analyzed_symbols"] == 2, (scan_mode, stats)
+            assert stats["insufficient_data"] == 30 - len(reviewed), (scan_mode, stats)
+            analyzer.engine.dispose()
+    print("✓ Solo se analizan los símbolos pendientes y los forzados")
+
+
+def test_batched_saves():
+    """Prueba que los resultados se escriben con un upsert por lote y que se conserva created_at."""
+    print("Probando la escritura de resultados por lotes...")
+    panel = synthetic_panel(symbols=40, seed=11)
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel, scan_mode="symbol", save_batch_size=4)
+        analyzer.analyze_all_symbols()
+        analyzed = analyzer.analysis_stats["analyzed_symbols"]
+        flushes = analyzer.analysis_stats["save_flushes"]
+        assert analyzed > 8 and len(flushes) == -(-analyzed // 4), (analyzed, flushes)
+        assert [flush["rows"] for flush in flushes[:-1]] == [4] * (len(flushes) - 1)
+        assert sum(flush["rows"] for flush in flushes) == analyzed
+        assert all(flush["seconds"] >= 0 for flush in flushes)
+        with analyzer.engine.connect() as conn:
+            before = dict(conn.execute(text("SELECT symbol, created_at FROM strategy_candidates")).fetchall())
+        analyzer.engine.dispose()
+        assert len(before) == analyzed
+
+        # Revisión forzada de todos los candidatos con un único upsert al final
+        analyzer = BreakoutAnalyzer(scan_mode="vectorized", db_url=db_url, force_symbols=list(before),
+                                    save_batch_size=0)
+        assert analyzer.connect_to_database()
+        analyzer.analyze_all_symbols()
+        assert [flush["rows"] for flush in analyzer.analysis_stats["save_flushes"]] == [analyzed]
+        with analyzer.engine.connect() as conn:
+            rows = conn.execute(text("SELECT symbol, created_at, updated_at FROM strategy_candidates")).fetchall()
+        analyzer.engine.dispose()
+        assert len(rows) == analyzed
+        assert all(created_at == before[symbol] and updated_at > created_at for symbol, created_at, updated_at in rows)
+    print("✓ Resultados escritos por lotes sin perder created_at")
+
+
+def test_failed_save():
+    """Prueba que un lote que no se puede escribir pasa de analizados a errores en las estadísticas."""
+    print("Probando un fallo al escribir un lote de resultados...")
+    panel = synthetic_panel(symbols=40, seed=11)
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel, scan_mode="sql")
+        analyzer.analyze_all_symbols()
+        with analyzer.engine.connect() as conn:
+            reviewed = [row[0] for row in conn.execute(text("SELECT symbol FROM strategy_candidates ORDER BY symbol"))]
+        analyzer.engine.dispose()
+        assert len(reviewed) > 8
+
+        for scan_mode in ("symbol", "vectorized"):
+            analyzer = connect(db_url, scan_mode=scan_mode, save_batch_size=4)
+            # El segundo lote (resultados 5 a 8) falla al escribir el sexto símbolo
+            with analyzer.engine.begin() as conn:
+                conn.execute(text(f"CREATE TRIGGER fail_save BEFORE INSERT ON strategy_candidates "
+                                  f"WHEN NEW.symbol = '{reviewed[5]}' BEGIN SELECT RAISE(ABORT, 'fallo'); END"))
+            analyzer.analyze_all_symbols()
+            stats = analyzer.analysis_stats
+            with analyzer.engine.begin() as conn:
+                saved, valid = conn.execute(text(
+                    "SELECT COUNT(*), COALESCE(SUM(is_valid), 0) FROM strategy_candidates")).fetchone()
+                conn.execute(text("DROP TRIGGER fail_save"))
+            analyzer.engine.dispose()
+            assert stats["errors"] == 4 and saved == len(reviewed) - 4, (scan_mode, stats, saved)
+            assert stats["analyzed_symbols"] == saved and stats["valid_candidates"] == valid, (scan_mode, stats)
+            assert sum(flush["rows"] for flush in stats["save_flushes"]) == saved
+    print("✓ Estadísticas coherentes con las filas escritas")
+
+
+def test_incremental_state():
+    """Prueba que el análisis incremental lee solo las barras nuevas y coincide con el análisis completo."""
+    print("Probando el estado incremental con barras nuevas...")
+    panel = synthetic_panel(symbols=40, seed=11)
+    # Se retienen entre 1 y 3 barras por símbolo (dejando al menos una); en algunos marcan un
+    # nuevo máximo o un nuevo mínimo
+    position = panel.groupby('symbol_id').cumcount(ascending=False)
+    size = panel.groupby('symbol_id')['symbol_id'].transform('size')
+    held = (position < 1 + panel['symbol_id'] % 3) & (position < size - 1)
+    maximum = panel.groupby('symbol_id')['high'].transform('max')
+    panel.loc[held & (panel['symbol_id'] % 4 == 0) & (position == 1), 'high'] = maximum * 1.5
+    panel.loc[held & (panel['symbol_id'] % 4 == 1), 'low'] = panel['low'] / 3
+    symbols = [f"S{i:03d}" for i in range(1, 41)]
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel[~held].reset_index(drop=True), scan_mode="vectorized")
+        analyzer.analyze_all_symbols()
+        assert analyzer.analysis_stats["panel_bars"] == (~held).sum()
+        assert analyzer.analysis_stats["incremental_symbols"] == 0
+        with analyzer.engine.begin() as conn:
+            states = conn.execute(text("SELECT COUNT(*) FROM strategy_candidate_state")).scalar()
+            new_bars = panel[held].reset_index(drop=True)
+            new_bars.assign(date=new_bars['date'].dt.to_pydatetime()).to_sql(
+                'stock_prices_monthly', conn, if_exists='append', index=False)
+        analyzer.engine.dispose()
+        # Los símbolos con una sola barra no tienen barras procesadas
+        assert states == (panel[~held].groupby('symbol_id').size() > 1).sum() > 30
+
+        incremental, incremental_stats = review_all(db_url, symbols)
+        full, full_stats = review_all(db_url, symbols, incremental=False)
+        pd.testing.assert_frame_equal(incremental, full)
+        assert incremental_stats["incremental_symbols"] == states and incremental_stats["state_rebuilds"] == 0
+        for key in ("analyzed_symbols", "valid_candidates", "insufficient_data", "errors"):
+            assert incremental_stats[key] == full_stats[key], key
+        # Cada símbolo vuelve a leer su última barra procesada (o la única) más las retenidas
+        assert incremental_stats["panel_bars"] == held.sum() + 40
+        assert full_stats["panel_bars"] == len(panel)
+
+        # Una segunda revisión sin barras nuevas solo lee la última barra de cada símbolo
+        again, again_stats = review_all(db_url, symbols)
+        pd.testing.assert_frame_equal(again, full)
+        assert again_stats["panel_bars"] == 40
+    print(f"✓ {incremental_stats['panel_bars']} barras leídas frente a {full_stats['panel_bars']} "
+          f"con el mismo resultado")
+
+
+def test_state_rebuild():
+    """Prueba que un histórico reajustado (split) descarta el estado del símbolo."""
+    print("Probando la reconstrucción del estado tras un reajuste del histórico...")
+    panel = synthetic_panel(symbols=30, seed=3)
+    symbols = [f"S{i:03d}" for i in range(1, 31)]
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel, scan_mode="vectorized")
+        analyzer.analyze_all_symbols()
+        # Split 2:1 en el histórico del símbolo más largo
+        split = int(panel.groupby('symbol_id').size().idxmax())
+        with analyzer.engine.begin() as conn:
+            states = conn.execute(text("SELECT COUNT(*) FROM strategy_candidate_state")).scalar()
+            conn.execute(text("UPDATE stock_prices_monthly SET high = high / 2, low = low / 2, close = close / 2 "
+                              "WHERE symbol_id = :symbol_id"), {'symbol_id': split})
+        analyzer.engine.dispose()
+
+        incremental, incremental_stats = review_all(db_url, symbols)
+        full, _ = review_all(db_url, symbols, incremental=False)
+        pd.testing.assert_frame_equal(incremental, full)
+        assert incremental_stats["state_rebuilds"] == 1
+        assert incremental_stats["incremental_symbols"] == states - 1
+
+        rebuilt, rebuilt_stats = review_all(db_url, symbols, full_rebuild=True)
+        pd.testing.assert_frame_equal(rebuilt, full)
+        assert rebuilt_stats["state_rebuilds"] == states and rebuilt_stats["incremental_symbols"] == 0
+        assert rebuilt_stats["panel_bars"] == len(panel)
+    print("✓ Estado descartado solo para el símbolo reajustado")
+
+
+def test_backfilled_bar():
+    """Prueba que una barra añadida o corregida dentro del tramo procesado descarta el estado."""
+    print("Probando la reconstrucción del estado tras rellenar un hueco del histórico...")
+    panel = synthetic_panel(symbols=30, seed=3)
+    symbols = [f"S{i:03d}" for i in range(1, 31)]
+    sizes = panel.groupby('symbol_id').size().sort_values()
+    backfilled, corrected = int(sizes.index[-1]), int(sizes.index[-2])
+    # Hueco a mitad del histórico con un nuevo máximo que se rellena después del análisis
+    gap = panel.index[panel['symbol_id'] == backfilled][sizes.iloc[-1] // 2]
+    bar = panel.loc[[gap]].assign(high=panel['high'].max() * 2).reset_index(drop=True)
+    interior = panel.loc[panel['symbol_id'] == corrected, 'high'].iloc[1:-2].reset_index(drop=True)
+    correction = 1 + int(interior.idxmin())  # Posición de la barra en el histórico del símbolo
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel.drop(index=gap).reset_index(drop=True), scan_mode="vectorized")
+        analyzer.analyze_all_symbols()
+        with analyzer.engine.begin() as conn:
+            states = conn.execute(text("SELECT COUNT(*) FROM strategy_candidate_state")).scalar()
+            bar.assign(date=bar['date'].dt.to_pydatetime()).to_sql(
+                'stock_prices_monthly', conn, if_exists='append', index=False)
+            # Barra intermedia corregida por el proveedor: ni la primera, ni la última procesada, ni el máximo
+            conn.execute(text("""
+                UPDATE stock_prices_monthly SET high = high * 1.01
+                WHERE symbol_id = :symbol_id AND date = (
+                    SELECT date FROM stock_prices_monthly WHERE symbol_id = :symbol_id
+                    ORDER BY date LIMIT 1 OFFSET :position
+                )
+            """), {'symbol_id': corrected, 'position': correction})
+        analyzer.engine.dispose()
+
+        incremental, incremental_stats = review_all(db_url, symbols)
+        full, _ = review_all(db_url, symbols, incremental=False)
+        pd.testing.assert_frame_equal(incremental, full)
+        assert incremental_stats["state_rebuilds"] == 2
+        assert incremental_stats["incremental_symbols"] == states - 2
+        high = incremental.loc[incremental['symbol'] == f"S{backfilled:03d}", 'historical_high'].item()
+        assert np.isclose(high, bar['high'].item(), rtol=1e-6)
+    print("✓ Estado descartado para la barra añadida y la barra corregida")
+
+
+def test_symbol_id_key():
+    """Prueba que una tabla strategy_candidates con clave symbol se convierte a la clave symbol_id."""
+    print("Probando la conversión de strategy_candidates a la clave symbol_id...")
+    panel = synthetic_panel(symbols=30, seed=3)
+    with tempfile.TemporaryDirectory() as root:
+        db_url = f"sqlite:///{root}/prices.db"
+        analyzer = connect(db_url, panel, scan_mode="sql")
+        analyzer.analyze_all_symbols()
+        with analyzer.engine.begin() as conn:
+            before = conn.execute(text("SELECT symbol, created_at FROM strategy_candidates ORDER BY symbol")).fetchall()
+            # Tabla anterior: clave symbol y sin symbol_id
+            conn.execute(text("ALTER TABLE strategy_candidates RENAME TO current_candidates"))
+            conn.execute(text("CREATE TABLE strategy_candidates (symbol VARCHAR PRIMARY KEY, is_valid BOOLEAN, "
+                              "last_review_date DATETIME, historical_high FLOAT, historical_high_date DATETIME, "
+                              "subsequent_low FLOAT, subsequent_low_date DATETIME, current_price FLOAT, "
+                              "resistance_distance_percent FLOAT, years_of_data FLOAT, created_at DATETIME, "
+                              "updated_at DATETIME)"))
+            conn.execute(text("INSERT INTO strategy_candidates SELECT symbol, is_valid, last_review_date, "
+                              "historical_high, historical_high_date, subsequent_low, subsequent_low_date, "
+                              "current_price, resistance_distance_percent, years_of_data, created_at, updated_at "
+                              "FROM current_candidates"))
+            conn.execute(text("DROP TABLE current_candidates"))
+        analyzer.engine.dispose()
+        assert len(before) > 2
+
+        analyzer = BreakoutAnalyzer(scan_mode="sql", db_url=db_url)
+        assert analyzer.connect_to_database()
+        analyzer.create_strategy_table()
+        with analyzer.engine.connect() as conn:
+            rows = conn.execute(text("SELECT c.symbol_id, s.symbol_id, c.symbol, c.created_at FROM strategy_candidates c "
+                                     "JOIN symbols s ON s.symbol = c.symbol ORDER BY c.symbol")).fetchall()
+        assert [(symbol, created_at) for _, _, symbol, created_at in rows] == before
+        assert all(symbol_id == expected for symbol_id, expected, _, _ in rows)
+        # Las revisiones convertidas siguen contando como recientes
+        analyzer.analyze_all_symbols()
+        assert analyzer.analysis_stats["skipped_recent_review"] == len(before)
+        assert analyzer.analysis_stats["analyzed_symbols"] == 0
+        analyzer.engine.dispose()
+    print("✓ Candidatos copiados a la clave symbol_id")
+
+
+def test_monthly_prices_source():
+    """Prueba que el origen de las barras mensuales se elige con MONTHLY_PRICES_SOURCE."""
+    print("Probando la variable de entorno MONTHLY_PRICES_SOURCE...")
+    script = (f"import sys; sys.path.insert(0, {str(Path(__file__).parent)!r}); "
+              "import breakout_analyzer; print(breakout_analyzer.MONTHLY_PRICES_TABLE)")
+
+    def import_with(source):
+        # Directorio temporal: el analizador crea su log en el directorio de trabajo
+        with tempfile.TemporaryDirectory() as root:
+            return subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True,
+                                  env=dict(os.environ, MONTHLY_PRICES_SOURCE=source), timeout=60)
+
+    rollup = import_with("stock_prices_monthly_rollup")
+    assert rollup.returncode == 0 and rollup.stdout.strip() == "stock_prices_monthly_rollup", rollup.stderr
+    invalid = import_with("stock_prices_monthly; DROP TABLE symbols")
+    assert invalid.returncode != 0 and "MONTHLY_PRICES_SOURCE no válido" in invalid.stderr
+    print("✓ Origen configurable y validado")
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    print("=" * 60)
+    print("PRUEBAS DEL ANÁLISIS VECTORIZADO")
+    print("=" * 60)
+
+    tests = [
+        ("Análisis del panel", test_scan_matches_symbol_analysis),
+        ("Modos de análisis", test_scan_modes_write_same_candidates),
+        ("Símbolos forzados", test_force_symbols),
+        ("Escritura por lotes", test_batched_saves),
+        ("Fallo al escribir un lote", test_failed_save),
+        ("Estado incremental", test_incremental_state),
+        ("Reajuste del histórico", test_state_rebuild),
+        ("Barra añadida al histórico", test_backfilled_bar),
+        ("Clave symbol_id de los candidatos", test_symbol_id_key),
+        ("Origen de las barras mensuales", test_monthly_prices_source),
+    ]
+
+    passed = 0
+    total = len(tests)
+
+    for test_name, test_func in tests:
+        print(f"\n{test_name}:")
+        print("-" * 40)
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ Comprobación fallida: {e}")
+        except Exception as e:
+            print(f"✗ Error inesperado: {e}")
+
+    print("\n" + "=" * 60)
+    print(f"RESULTADO: {passed}/{total} pruebas pasaron")
+    print("=" * 60)
+    return passed == total
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)